@@ -1,16 +1,21 @@
 import re
 from urllib.parse import urlparse, urljoin, urldefrag
 from lxml import html
-from nltk.tokenize import word_tokenize
 import sys
 import signal
 import json
 import os
 import hashlib
 
+# Shared text analysis (tokenizer, stopwords) installed from inverted-index-engine
+from text_analysis import get_analyzer, stopwords
+
 # GLOBAL VAR for minimum words for a website to be useful
 MIN_WORDS = 100
 
+# Word tokenizer for page analytics: "nltk" or the faster "regex" (see text_analysis.TOKENIZERS)
+ANALYTICS_TOKENIZER = "nltk"
+
 # Allowed domains for crawling - updated for current crawler target
 ALLOWED_DOMAINS = [
     "www.aljazeera.com",
@@ -20,29 +25,6 @@ ALLOWED_DOMAINS = [
 # Base directory for storing downloaded pages
 DATA_STORAGE_DIR = "data/downloaded_pages"
 
-# common stop words provided in write-up
-stopwords = {
-    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and",
-    "any", "are", "aren't", "as", "at", "be", "because", "been", "before", "being",
-    "below", "between", "both", "but", "by", "can't", "cannot", "could", "couldn't",
-    "did", "didn't", "do", "does", "doesn't", "doing", "don't", "down", "during",
-    "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't",
-    "have", "haven't", "having", "he", "he'd", "he'll", "he's", "her", "here",
-    "here's", "hers", "herself", "him", "himself", "his", "how", "how's", "i",
-    "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", "it", "it's",
-    "its", "itself", "let's", "me", "more", "most", "mustn't", "my", "myself", "no",
-    "nor", "not", "of", "off", "on", "once", "only", "or", "other", "ought", "our",
-    "ours", "ourselves", "out", "over", "own", "same", "shan't", "she", "she'd",
-    "she'll", "she's", "should", "shouldn't", "so", "some", "such", "than", "that",
-    "that's", "the", "their", "theirs", "them", "themselves", "then", "there",
-    "there's", "these", "they", "they'd", "they'll", "they're", "they've", "this",
-    "those", "through", "to", "too", "under", "until", "up", "very", "was",
-    "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", "what",
-    "what's", "when", "when's", "where", "where's", "which", "while", "who",
-    "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't", "you",
-    "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves",
-}
-
 analytics = {
     # set of the unique pages found
     "unique_pages": set(),
@@ -368,7 +350,7 @@ def process_page_analytics(clean_url, tree):
         text = extract_text_from_tree(tree)
         
         # Tokenize using imported tokenizer module
-        words = word_tokenize(text)
+        words = get_analyzer(ANALYTICS_TOKENIZER).tokenize(text)
         
         word_count = len(words)
         # will skip pages with minimal content (groupmate's logic)
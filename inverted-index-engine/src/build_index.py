@@ -1,13 +1,43 @@
 import os
+import sys
 import json
 import re
 import hashlib
+import argparse
+import heapq
+import shutil
+import time
+from array import array
 from pathlib import Path
+from contextlib import ExitStack
+from itertools import groupby, islice
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from bs4 import BeautifulSoup
-from typing import List, Optional, Dict, Tuple, Set
-from collections import Counter, defaultdict
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
+from typing import Iterator, List, Optional, Dict, Tuple, Set
+from collections import Counter, defaultdict, deque
+import numpy as np
+from postings import (CHAMPIONS_FILE, CHAMPIONS_LEXICON_FILE, FIELDS_FILE, IMPORTANT_TF_WEIGHT, INDEX_FILES,
+                      INDEX_FORMATS, POSITIONS_FILE, encode_fields, encode_impact_postings, encode_positions,
+                      encode_postings, format_text_postings, load_index_manifest, parse_text_postings,
+                      write_index_manifest)
+from index_the_index import format_lexicon_line, lexicon_header, tf_stats
+from text_analysis import (TOKENIZERS, Analyzer, NgramPolicy, format_cache_stats, get_analyzer, is_ngram,
+                           tokenizer_parity)
+from build_profile import BuildProfiler, format_stage_table
+from checkpoint import checkpoint_path, clear_checkpoint, load_checkpoint, write_checkpoint
+from partitions import (PARTITIONS_DIR, install_partition, load_partition_merge, partition_dir,
+                        partition_inputs_digest, partition_run_file, term_partition, write_partition_merge)
+from doc_store import COLD_FILE, LEGACY_METADATA_FILE, OFFSETS_FILE, DocStoreWriter
+from segments import (SEGMENTED_FORMAT, SEGMENTS_DIR, SegmentReader, load_segment_catalog, write_segment_catalog,
+                      write_tombstones)
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml is only needed for the "lxml" parser backend
+    etree = None
+    lxml_html = None
 
 """
 Plan:
@@ -39,24 +69,120 @@ we should map our has function to the correct partition and then write to the fi
 """
 
 
+# Default locations of the crawled pages and of the index
+DEFAULT_DATA_ROOT = Path(__file__).parent.parent.parent / "current_crawler" / "web_crawler" / "data" / "downloaded_pages"
+DEFAULT_INDEX_DIR = Path(__file__).parent.parent / "index"
+
+# Bigrams and trigrams, stopwords included, no pruning
+DEFAULT_NGRAM_POLICY = NgramPolicy()
+
+# Postings per term in the champion tier of text and binary indexes
+DEFAULT_CHAMPION_LIST_SIZE = 64
+
+# Token hashes for SimHash: BLAKE2b by default, MD5 for fingerprints compatible with earlier builds
+SIMHASH_TOKEN_HASHES = ("blake2b", "md5")
+
+# Fingerprints of an index directory: a magic header, then little-endian
+# (doc_id, fingerprint) uint64 pairs in doc_id order
+FINGERPRINTS_FILE = "fingerprints.bin"
+FINGERPRINTS_MAGIC = b"SIMHASH1"
+# Text fingerprints ("doc_id:fingerprint" lines) written by earlier builds
+LEGACY_FINGERPRINTS_FILE = "fingerprints.txt"
+FINGERPRINT_RECORD = np.dtype([('doc_id', '<u8'), ('fingerprint', '<u8')])
+
+# Document ID assignment modes: polynomial URL hash, or sequential 0..N-1
+DOC_ID_MODES = ("hash", "dense")
+
+# URLs of exact copies of indexed pages, as "doc_id:url" lines (doc_id of the indexed copy)
+URL_ALIASES_FILE = "url_aliases.txt"
+# Content digests of a build in progress (checkpoints only): 16-byte digest, little-endian uint64 doc_id
+CONTENT_DIGESTS_FILE = "content_digests.bin"
+CONTENT_DIGEST_RECORD = np.dtype([('digest', 'V16'), ('doc_id', '<u8')])
+
+
+def read_url_lines(mapping_file: Path) -> Iterator[Tuple[int, str]]:
+    """Yield the (doc_id, url) pairs of a file of "doc_id:url" lines"""
+    with open(mapping_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or ':' not in line:
+                continue
+            doc_id_str, url = line.split(':', 1)
+            yield int(doc_id_str), url
+
+
 class URLMapper:
     """Manages bidirectional mapping between URLs and document IDs"""
     
-    def __init__(self):
+    def __init__(self, id_mode: str = "hash"):
+        if id_mode not in DOC_ID_MODES:
+            raise ValueError(f"Unknown doc id mode '{id_mode}', expected one of {DOC_ID_MODES}")
+        self.id_mode = id_mode
         self.url_to_id = {}
         self.id_to_url = {}
+        self.next_id = 0  # next dense ID
+        # URLs of exact copies of an indexed page -> the doc ID of that page (they get no ID of their own)
+        self.aliases = {}
+        # URLs of a previous build -> their IDs, handed out again if the URLs are seen (see reserve)
+        self.reserved = {}
+    
+    @classmethod
+    def load(cls, mapping_file: Path, id_mode: str = "hash", aliases_file: Optional[Path] = None) -> "URLMapper":
+        """
+        Restore a mapping saved by InvertedIndex.save_url_mapping.
+        
+        Known URLs keep their IDs; in dense mode new URLs continue after the
+        highest saved ID, so IDs stay stable across builds.
+        
+        Args:
+            mapping_file: url_mapping.txt with one "doc_id:url" per line
+            id_mode: ID assignment mode for new URLs
+            aliases_file: url_aliases.txt in the same format, to restore the aliases too
+        """
+        mapper = cls(id_mode)
+        for doc_id, url in read_url_lines(mapping_file):
+            mapper.url_to_id[url] = doc_id
+            mapper.id_to_url[doc_id] = url
+        if aliases_file is not None and Path(aliases_file).exists():
+            for doc_id, url in read_url_lines(aliases_file):
+                mapper.aliases[url] = doc_id
+        mapper.next_id = max(mapper.id_to_url, default=-1) + 1
+        return mapper
+    
+    def reserve(self, mapping_file: Path):
+        """
+        Keep the IDs of a previous build's URLs for when they are seen again.
+        
+        A reserved URL only enters the mapping once get_id is asked for it, so
+        URLs that are gone from the crawl are not carried over; new URLs are
+        numbered after every reserved ID.
+        
+        Args:
+            mapping_file: url_mapping.txt of the previous build
+        """
+        for doc_id, url in read_url_lines(mapping_file):
+            if url not in self.url_to_id:
+                self.reserved[url] = doc_id
+            self.next_id = max(self.next_id, doc_id + 1)
     
     def get_id(self, url: str) -> int:
         """Get document ID for URL, creating new one if needed"""
         if url in self.url_to_id:
             return self.url_to_id[url]
         
-        # Create new ID using simple hash
-        new_id = self._simple_hash(url)
-        
-        # Handle hash collisions by incrementing
-        while new_id in self.id_to_url:
-            new_id += 1
+        if url in self.reserved:
+            new_id = self.reserved.pop(url)
+        elif self.id_mode == "dense":
+            # Next sequential ID
+            new_id = self.next_id
+            self.next_id += 1
+        else:
+            # Create new ID using simple hash
+            new_id = self._simple_hash(url)
+            
+            # Handle hash collisions by incrementing
+            while new_id in self.id_to_url:
+                new_id += 1
         
         # Store bidirectional mapping
         self.url_to_id[url] = new_id
@@ -68,6 +194,22 @@ class URLMapper:
         """Reverse lookup: get URL from document ID"""
         return self.id_to_url.get(doc_id, None)
     
+    def add_alias(self, url: str, doc_id: int):
+        """Record url as another URL of the document doc_id, without giving it an ID"""
+        self.aliases[url] = doc_id
+    
+    def resolve(self, url: str) -> Optional[int]:
+        """Document ID a URL is indexed under, directly or as an alias; None for an unknown (or only reserved) URL"""
+        doc_id = self.url_to_id.get(url)
+        return self.aliases.get(url) if doc_id is None else doc_id
+    
+    def remove(self, url: str) -> Optional[int]:
+        """Forget a URL so that it gets a fresh ID if seen again; returns its old ID"""
+        doc_id = self.url_to_id.pop(url, None)
+        if doc_id is not None:
+            del self.id_to_url[doc_id]
+        return doc_id
+    
     def _simple_hash(self, url: str) -> int:
         """Simple hash function for creating document IDs"""
         hash_value = 0
@@ -83,35 +225,174 @@ class URLMapper:
         return len(self.url_to_id)
 
 
+# HTML parser backends available to Document / parse_html_content
+HTML_PARSERS = ("html.parser", "lxml")
+
+# Tags whose text counts as important (title, headings h1-h3, bold)
+IMPORTANT_TAGS = {"title", "h1", "h2", "h3", "b", "strong"}
+
+# Tags whose text is never indexed
+SKIPPED_TAGS = {"script", "style"}
+
+# What of a page is indexed: all of its text, or only its main content (article body and headline)
+CONTENT_MODES = ("page", "main")
+
+# Containers of a page's article body, tried in order (as by the crawler's extract_article_text)
+MAIN_CONTENT_SELECTORS = (".rich-text", ".article-content", "[data-content-type='article-body']", "article")
+
+
+def clean_text(text_str: str) -> str:
+    """Collapse the whitespace of extracted page text into single spaces"""
+    lines = (line.strip() for line in text_str.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def extract_text_lxml(html_content: str) -> Tuple[str, str, str]:
+    """
+    Extract (normal_text, important_text, title_text) from HTML with lxml in a single tree walk.
+    
+    Produces the same text as the BeautifulSoup path: all text outside
+    script/style for the normal text, and the first title followed by every
+    h1-h3 heading and then every b/strong element for the important text.
+    
+    Args:
+        html_content: Raw HTML string
+        
+    Returns:
+        Tuple of (normal_text, important_text, title_text), whitespace not yet cleaned
+    """
+    if lxml_html is None:
+        raise ImportError("The 'lxml' parser backend requires the lxml package")
+    
+    try:
+        root = lxml_html.document_fromstring(html_content)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        root = lxml_html.document_fromstring(html_content.encode("utf-8"),
+                                             parser=lxml_html.HTMLParser(encoding="utf-8"))
+    
+    text_parts = []
+    titles, headings, bolds = [], [], []
+    open_important = []  # text buffers of important elements currently being walked
+    skip_depth = 0
+    
+    def emit(text):
+        if text:
+            text_parts.append(text)
+            for buffer in open_important:
+                buffer.append(text)
+    
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag if isinstance(element.tag, str) else None  # None for comments / PIs
+        
+        if event == "start":
+            if skip_depth or tag is None or tag in SKIPPED_TAGS:
+                skip_depth += 1
+                continue
+            if tag in IMPORTANT_TAGS:
+                buffer = []
+                if tag == "title":
+                    titles.append(buffer)
+                elif tag in ("b", "strong"):
+                    bolds.append(buffer)
+                else:
+                    headings.append(buffer)
+                open_important.append(buffer)
+            emit(element.text)
+        else:
+            if skip_depth:
+                skip_depth -= 1
+                if not skip_depth:
+                    emit(element.tail)
+                continue
+            if tag in IMPORTANT_TAGS:
+                open_important.pop()
+            emit(element.tail)
+    
+    important_text = ' '.join(''.join(buffer) for buffer in titles[:1] + headings + bolds)
+    title_text = ''.join(titles[0]) if titles else ""
+    return ''.join(text_parts), important_text, title_text
+
+
+def extract_main_text(soup: BeautifulSoup) -> Optional[str]:
+    """
+    Extract the article body of a parsed page: the paragraphs of the first
+    MAIN_CONTENT_SELECTORS container that has any.
+    
+    Returns:
+        The paragraphs' text, or None if the page has no such container
+    """
+    for selector in MAIN_CONTENT_SELECTORS:
+        container = soup.select_one(selector)
+        if container is None:
+            continue
+        paragraphs = [text for text in (p.get_text(" ", strip=True) for p in container.find_all("p")) if text]
+        if paragraphs:
+            return ' '.join(paragraphs)
+    return None
+
+
 class Document:
     """Represents a single document in the corpus"""
     
-    def __init__(self, url: str, content: str,image:str, encoding: str = "utf-8", stemmer: Optional[PorterStemmer] = None, headline: str = "", article: str = ""):
+    def __init__(self, url: str, content: str,image:str, encoding: str = "utf-8", analyzer: Optional[Analyzer] = None, headline: str = "", article: str = "",
+                 parser: str = "html.parser", content_mode: str = "page"):
+        if parser not in HTML_PARSERS:
+            raise ValueError(f"Unknown HTML parser '{parser}', expected one of {HTML_PARSERS}")
+        if content_mode not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode '{content_mode}', expected one of {CONTENT_MODES}")
         self.url = self._clean_url(url)
         self.raw_content = content
         self.headline = headline
         self.article = article
         self.encoding = encoding
-        self.stemmer = stemmer or PorterStemmer()
-        self.parsed_text, self.important_text = self._parse_content()
+        self.analyzer = analyzer or get_analyzer()
+        self.parser = parser
+        self.content_mode = content_mode
+        self.content_source = "page"  # where the indexed text came from: "article", "extracted" or "page"
+        self.parsed_text, self.important_text, self.title_text = self._parse_content()
         self.tokens = {}  # Maps stemmed token -> (normal_count, important_count)
+        self.positions = {}  # Maps stemmed token -> token positions (positional tokenization only)
+        self.field_tfs = {}  # Maps stemmed token -> (headline_count, important_count) (field tokenization only)
         self.image = image
         self.doc_id = None  # Will be set by the index when needed
     
-    def _clean_url(self, url: str) -> str:
+    @staticmethod
+    def _clean_url(url: str) -> str:
         """Remove fragment part from URL as specified in requirements"""
         return url.split('#')[0]
     
-    def _parse_content(self) -> Tuple[str, str]:
+    def _parse_content(self) -> Tuple[str, str, str]:
         """Parse HTML content and extract clean text, handling broken HTML.
-        Returns tuple of (normal_text, important_text) where important_text
-        contains words from bold, headings (h1-h3), and title tags."""
+        Returns tuple of (normal_text, important_text, title_text) where important_text
+        contains words from bold, headings (h1-h3), and title tags, starting with the title.
+        
+        In the main content mode, the normal text is only the article body (the crawler's
+        extracted article, else the article container of the page) and the important and
+        title text only the headline; a page without either falls back to its full text."""
+        if self.content_mode == "main" and self.article and self.article.strip():
+            self.content_source = "article"
+            return self._main_content(self.article)
         if not self.raw_content or not self.raw_content.strip():
-            return "", ""
+            return "", "", ""
         
         try:
+            soup = None
+            if self.content_mode == "main":
+                soup = BeautifulSoup(self.raw_content, self.parser)
+                main_text = extract_main_text(soup)
+                if main_text:
+                    self.content_source = "extracted"
+                    return self._main_content(main_text)
+            
+            if self.parser == "lxml":
+                normal_text, important_text, title_text = extract_text_lxml(self.raw_content)
+                return clean_text(normal_text), clean_text(important_text), clean_text(title_text)
+            
             # BeautifulSoup can handle broken/malformed HTML gracefully
-            soup = BeautifulSoup(self.raw_content, 'html.parser')
+            if soup is None:
+                soup = BeautifulSoup(self.raw_content, 'html.parser')
             
             # Remove script and style elements
             for script in soup(["script", "style"]):
@@ -122,8 +403,9 @@ class Document:
             
             # Get title
             title_tag = soup.find('title')
+            title_text = title_tag.get_text() if title_tag else ""
             if title_tag:
-                important_parts.append(title_tag.get_text())
+                important_parts.append(title_text)
             
             # Get headings h1, h2, h3
             for heading in soup.find_all(['h1', 'h2', 'h3']):
@@ -140,56 +422,39 @@ class Document:
             text = soup.get_text()
             
             # Clean up whitespace
-            def clean_text(text_str):
-                lines = (line.strip() for line in text_str.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                return ' '.join(chunk for chunk in chunks if chunk)
-            
             clean_normal = clean_text(text)
             clean_important = clean_text(important_text)
             
-            return clean_normal, clean_important
+            return clean_normal, clean_important, clean_text(title_text)
         except Exception as e:
             print(f"Error parsing HTML for {self.url}: {e}")
-            return "", ""
+            return "", "", ""
     
-    def _should_preserve_token(self, token: str, original_token: str = None) -> bool:
-        """
-        Determine if a token should be preserved without stemming.
-        Preserves: short acronyms (2-3 chars, all caps), very short tokens (< 3 chars)
-        
-        Args:
-            token: Lowercase token to check
-            original_token: Original token before lowercasing (for case checking)
-            
-        Returns:
-            True if token should be preserved, False if should be stemmed
-        """
-        if original_token:
-            # Preserve short acronyms (2-3 characters, all uppercase)
-            if len(original_token) <= 3 and original_token.isupper() and original_token.isalpha():
-                return True
-        # Preserve very short tokens to avoid over-stemming
-        if len(token) < 3:
-            return True
-        return False
+    def _main_content(self, body: str) -> Tuple[str, str, str]:
+        """(normal_text, important_text, title_text) of the main content mode: the body, then the headline twice"""
+        headline = clean_text(self.headline) if self.headline else ""
+        return clean_text(body), headline, headline
+    
+    @property
+    def main_content_missing(self) -> bool:
+        """Whether a document of the main content mode fell back to its full page text"""
+        return self.content_mode == "main" and self.content_source == "page"
     
-    def _smart_stem(self, token: str, original_token: str = None) -> str:
+    @staticmethod
+    def _ngrams(terms: List[str], n: int, stopword_flags: Optional[List[bool]] = None):
         """
-        Apply stemming with smart preservation of acronyms and short tokens.
+        Yield n-grams of a stemmed token stream in "word1_word2" format.
         
-        Args:
-            token: Lowercase token to stem
-            original_token: Original token before lowercasing
-            
-        Returns:
-            Stemmed token, or original if should be preserved
+        With stopword_flags, n-grams that contain a stopword are left out.
         """
-        if self._should_preserve_token(token, original_token):
-            return token.lower()
-        return self.stemmer.stem(token)
+        grams = zip(*(terms[i:] for i in range(n)))
+        if stopword_flags is None:
+            return map('_'.join, grams)
+        flags = zip(*(stopword_flags[i:] for i in range(n)))
+        return ('_'.join(gram) for gram, gram_flags in zip(grams, flags) if not any(gram_flags))
     
-    def tokenize(self) -> Dict[str, Tuple[int, int]]:
+    def tokenize(self, positional: bool = False, ngram_policy: Optional[NgramPolicy] = None,
+                 fields: bool = False) -> Dict[str, Tuple[int, int]]:
         """
         Tokenize the document text using NLTK word tokenizer and Porter stemming.
         Important words (bold, headings, titles) are tracked separately.
@@ -199,85 +464,58 @@ class Document:
         - No stop words (use all words)
         - Porter stemming using NLTK implementation (with smart preservation)
         
+        Each field is tokenized and stemmed once; unigrams and n-grams are all
+        counted from that single stemmed stream.
+        
+        Args:
+            positional: Index unigrams only and record each one's positions in
+                self.positions, for phrase queries instead of n-grams. The
+                important text is numbered on after the body text, one position
+                apart, so phrases never span the two.
+            ngram_policy: Which n-grams to index (default: bigrams and trigrams, stopwords included)
+            fields: Also split each token's important occurrences into headline (title)
+                and other important ones, in self.field_tfs (not with positional)
+        
         Returns:
             Dictionary mapping stemmed_token -> (normal_count, important_count)
         """
-        self.tokens = {}
-        
-        # Tokenize normal text
-        if self.parsed_text:
-            # Get original tokens before lowercasing to preserve case info
-            original_tokens = word_tokenize(self.parsed_text)
-            normal_tokens = word_tokenize(self.parsed_text.lower())
-            for orig_token, token in zip(original_tokens, normal_tokens):
-                # Keep only alphanumeric tokens (filter out punctuation)
-                if token.isalnum() and len(token) >= 1:
-                    stemmed = self._smart_stem(token, orig_token)  # Smart stemming with preservation
-                    if stemmed not in self.tokens:
-                        self.tokens[stemmed] = (0, 0)
-                    normal_count, important_count = self.tokens[stemmed]
-                    self.tokens[stemmed] = (normal_count + 1, important_count)
-        
-        # Tokenize important text (with higher weight)
-        if self.important_text:
-            original_important_tokens = word_tokenize(self.important_text)
-            important_tokens = word_tokenize(self.important_text.lower())
-            for orig_token, token in zip(original_important_tokens, important_tokens):
-                # Keep only alphanumeric tokens (filter out punctuation)
-                if token.isalnum() and len(token) >= 1:
-                    stemmed = self._smart_stem(token, orig_token)  # Smart stemming with preservation
-                    if stemmed not in self.tokens:
-                        self.tokens[stemmed] = (0, 0)
-                    normal_count, important_count = self.tokens[stemmed]
-                    # Important words get 2x weight
-                    self.tokens[stemmed] = (normal_count, important_count + 2)
-        
-        # Generate 2-grams and 3-grams from normal text
-        if self.parsed_text:
-            original_normal_tokens = word_tokenize(self.parsed_text)
-            normal_tokens_lower = word_tokenize(self.parsed_text.lower())
-            normal_tokens = [self._smart_stem(t, orig) for orig, t in zip(original_normal_tokens, normal_tokens_lower) if t.isalnum() and len(t) >= 1]
-            
-            # Generate 2-grams (bigrams) from normal text
-            for i in range(len(normal_tokens) - 1):
-                bigram = f"{normal_tokens[i]}_{normal_tokens[i+1]}"
-                if bigram not in self.tokens:
-                    self.tokens[bigram] = (0, 0)
-                normal_count, important_count = self.tokens[bigram]
-                self.tokens[bigram] = (normal_count + 1, important_count)
-            
-            # Generate 3-grams (trigrams) from normal text
-            for i in range(len(normal_tokens) - 2):
-                trigram = f"{normal_tokens[i]}_{normal_tokens[i+1]}_{normal_tokens[i+2]}"
-                if trigram not in self.tokens:
-                    self.tokens[trigram] = (0, 0)
-                normal_count, important_count = self.tokens[trigram]
-                self.tokens[trigram] = (normal_count + 1, important_count)
-        
-        # Generate 2-grams and 3-grams from important text (with higher weight)
-        if self.important_text:
-            original_important_tokens = word_tokenize(self.important_text)
-            important_tokens_lower = word_tokenize(self.important_text.lower())
-            important_tokens = [self._smart_stem(t, orig) for orig, t in zip(original_important_tokens, important_tokens_lower) if t.isalnum() and len(t) >= 1]
-            
-            # Generate 2-grams (bigrams) from important text
-            for i in range(len(important_tokens) - 1):
-                bigram = f"{important_tokens[i]}_{important_tokens[i+1]}"
-                if bigram not in self.tokens:
-                    self.tokens[bigram] = (0, 0)
-                normal_count, important_count = self.tokens[bigram]
-                # Important n-grams get 2x weight
-                self.tokens[bigram] = (normal_count, important_count + 2)
-            
-            # Generate 3-grams (trigrams) from important text
-            for i in range(len(important_tokens) - 2):
-                trigram = f"{important_tokens[i]}_{important_tokens[i+1]}_{important_tokens[i+2]}"
-                if trigram not in self.tokens:
-                    self.tokens[trigram] = (0, 0)
-                normal_count, important_count = self.tokens[trigram]
-                # Important n-grams get 2x weight
-                self.tokens[trigram] = (normal_count, important_count + 2)
-        
+        ngram_policy = ngram_policy or DEFAULT_NGRAM_POLICY
+        normal_counts = Counter()
+        important_counts = Counter()
+        headline_counts = Counter()
+        self.positions = {}
+        next_position = 0
+        
+        streams = [(self.parsed_text, normal_counts), (self.important_text, important_counts)]
+        if fields:
+            streams.append((self.title_text, headline_counts))
+        for text, counts in streams:
+            if not text:
+                continue
+            stopword_flags = None if ngram_policy.span_stopwords or positional else []
+            terms = self.analyzer.analyze(text, stopword_flags)
+            counts.update(terms)
+            if positional:
+                for position, term in enumerate(terms, start=next_position):
+                    self.positions.setdefault(term, []).append(position)
+                next_position += len(terms) + 1
+                continue
+            # Generate 2-grams up to max_n-grams from the same stemmed stream
+            for n in range(2, ngram_policy.max_n + 1):
+                counts.update(self._ngrams(terms, n, stopword_flags))
+        
+        # The title starts the important text, so headline occurrences are the title's share of the
+        # important ones (capped, as an n-gram spanning the end of the title is only in the important text)
+        self.field_tfs = {}
+        if fields:
+            for token, count in important_counts.items():
+                headline = min(headline_counts[token], count)
+                self.field_tfs[token] = (headline, count - headline)
+        
+        # Important words and n-grams get 2x weight
+        self.tokens = {token: (count, important_counts.pop(token, 0) * IMPORTANT_TF_WEIGHT)
+                       for token, count in normal_counts.items()}
+        self.tokens.update((token, (0, count * IMPORTANT_TF_WEIGHT)) for token, count in important_counts.items())
         return self.tokens
     
     def get_unique_tokens(self) -> List[str]:
@@ -340,12 +578,17 @@ class Document:
     def __repr__(self) -> str:
         return self.__str__()
     
-    def compute_simhash(self, hash_bits: int = 64) -> int:
+    def compute_simhash(self, hash_bits: int = 64, token_hash: str = "blake2b") -> int:
         """
         Compute SimHash fingerprint for near-duplicate detection.
         
+        All token hashes are computed in one batch and the weighted bit votes
+        are summed with a single NumPy matrix product.
+        
         Args:
-            hash_bits: Number of bits in the hash (default 64)
+            hash_bits: Number of bits in the hash (default 64, at most 64)
+            token_hash: Token hash function, one of SIMHASH_TOKEN_HASHES; "md5"
+                reproduces the fingerprints of earlier builds bit for bit
             
         Returns:
             int: SimHash fingerprint as an integer
@@ -356,34 +599,61 @@ class Document:
         if not self.tokens:
             return 0
         
-        # Initialize feature vector
-        feature_vector = [0] * hash_bits
-        
-
-        for token, (normal_count, important_count) in self.tokens.items():
-            weight = normal_count + important_count
-            # hash token to hash_bits-bit integer
-            token_hash = int(hashlib.md5(token.encode('utf-8')).hexdigest(), 16)
-            
-            for i in range(hash_bits):
-                if token_hash & (1 << i):
-                    feature_vector[i] += weight
-                else:
-                    feature_vector[i] -= weight
-        
-        fingerprint = 0
-        for i in range(hash_bits):
-            if feature_vector[i] > 0:
-                fingerprint |= (1 << i)
-        
-        return fingerprint
+        hashes = hash_tokens(self.tokens, token_hash)
+        weights = np.fromiter((normal + important for normal, important in self.tokens.values()),
+                              dtype=np.int64, count=len(self.tokens))
+        return simhash(hashes, weights, hash_bits)
     
-    def get_fingerprint(self) -> int:
+    def get_fingerprint(self, token_hash: str = "blake2b") -> int:
         """Get SimHash fingerprint for this document (cached)"""
         if not hasattr(self, '_fingerprint'):
-            self._fingerprint = self.compute_simhash()
+            self._fingerprint = self.compute_simhash(token_hash=token_hash)
         return self._fingerprint
 
+
+def hash_tokens(tokens, token_hash: str = "blake2b") -> np.ndarray:
+    """
+    Hash tokens to 64-bit integers for SimHash.
+    
+    Args:
+        tokens: Iterable of token strings
+        token_hash: "blake2b" (an 8-byte BLAKE2b digest) or "md5" (the low 64
+            bits of the MD5 digest, as int(md5.hexdigest(), 16) gave them)
+        
+    Returns:
+        np.ndarray: uint64 hash per token
+    """
+    if token_hash == "md5":
+        digests = b''.join(hashlib.md5(token.encode('utf-8')).digest()[8:] for token in tokens)
+        return np.frombuffer(digests, dtype='>u8').astype(np.uint64)
+    if token_hash == "blake2b":
+        digests = b''.join(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest() for token in tokens)
+        return np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+    raise ValueError(f"Unknown SimHash token hash '{token_hash}', expected one of {SIMHASH_TOKEN_HASHES}")
+
+
+def simhash(hashes: np.ndarray, weights: np.ndarray, hash_bits: int = 64) -> int:
+    """
+    Combine weighted token hashes into a SimHash fingerprint.
+    
+    Bit i of the fingerprint is set when the tokens with bit i set outweigh
+    the tokens without it.
+    
+    Args:
+        hashes: uint64 token hashes
+        weights: Token weights (term frequencies)
+        hash_bits: Number of low hash bits used (at most 64)
+        
+    Returns:
+        int: SimHash fingerprint as an integer
+    """
+    if hash_bits > 64:
+        raise ValueError(f"SimHash supports at most 64 bits, got {hash_bits}")
+    # One row of 64 bits per token, bit i in column i
+    bits = np.unpackbits(hashes.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = 2 * (weights @ bits[:, :hash_bits]) - weights.sum()
+    return sum(1 << int(i) for i in np.flatnonzero(votes > 0))
+
 class Posting:
     """Represents a posting in the index"""
     def __init__(self, doc_id: int, freq: int):
@@ -402,9 +672,14 @@ class NearDuplicateDetector:
     
     Uses Hamming distance between fingerprints to identify near-duplicates.
     Documents with Hamming distance <= threshold are considered near-duplicates.
+    
+    Lookups are banded: the fingerprint bits are split into threshold + 1
+    blocks, and since k differing bits can touch at most k blocks, every
+    fingerprint within distance k matches the query exactly on at least one
+    block. Only fingerprints sharing a block value with the query are compared.
     """
     
-    def __init__(self, similarity_threshold: int = 3, hash_bits: int = 64):
+    def __init__(self, similarity_threshold: int = 3, hash_bits: int = 64, token_hash: str = "blake2b"):
         """
         Initialize near-duplicate detector.
         
@@ -412,18 +687,71 @@ class NearDuplicateDetector:
             similarity_threshold: Maximum Hamming distance for near-duplicates (default 3)
                                  Lower values = stricter matching
             hash_bits: Number of bits in SimHash (default 64)
+            token_hash: Token hash documents are fingerprinted with, one of SIMHASH_TOKEN_HASHES
         """
+        if token_hash not in SIMHASH_TOKEN_HASHES:
+            raise ValueError(f"Unknown SimHash token hash '{token_hash}', expected one of {SIMHASH_TOKEN_HASHES}")
         self.similarity_threshold = similarity_threshold
         self.hash_bits = hash_bits
+        self.token_hash = token_hash
         # Map fingerprint -> set of doc_ids with this fingerprint
         self.fingerprint_to_docs: Dict[int, Set[int]] = defaultdict(set)
         # Map doc_id -> fingerprint
         self.doc_to_fingerprint: Dict[int, int] = {}
+        # (shift, mask) of each block; none if the threshold leaves no bit to band on
+        self.bands = self._band_layout(similarity_threshold, hash_bits)
+        # Per block: block value -> fingerprints with that value in the block
+        self.band_tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in self.bands]
+    
+    @staticmethod
+    def _band_layout(similarity_threshold: int, hash_bits: int) -> List[Tuple[int, int]]:
+        """Split hash_bits into similarity_threshold + 1 contiguous blocks, as (shift, mask) pairs"""
+        num_bands = similarity_threshold + 1
+        if similarity_threshold < 0 or num_bands > hash_bits:
+            return []
+        bands = []
+        shift = 0
+        for band in range(num_bands):
+            width = hash_bits // num_bands + (1 if band < hash_bits % num_bands else 0)
+            bands.append((shift, (1 << width) - 1))
+            shift += width
+        return bands
     
     def add_document(self, doc_id: int, fingerprint: int):
+        if fingerprint not in self.fingerprint_to_docs:
+            for (shift, mask), table in zip(self.bands, self.band_tables):
+                table[(fingerprint >> shift) & mask].add(fingerprint)
         self.fingerprint_to_docs[fingerprint].add(doc_id)
         self.doc_to_fingerprint[doc_id] = fingerprint
     
+    def _candidate_fingerprints(self, fingerprint: int) -> Set[int]:
+        """Stored fingerprints sharing at least one block with the given fingerprint"""
+        if not self.bands:
+            return set(self.fingerprint_to_docs)
+        candidates = set()
+        for (shift, mask), table in zip(self.bands, self.band_tables):
+            bucket = table.get((fingerprint >> shift) & mask)
+            if bucket:
+                candidates |= bucket
+        return candidates
+    
+    def find_near_duplicates_with_distance(self, fingerprint: int) -> List[Tuple[int, int]]:
+        """
+        Find near-duplicates of a fingerprint along with their Hamming distance.
+        
+        Args:
+            fingerprint: SimHash fingerprint to check
+            
+        Returns:
+            List of (doc_id, hamming_distance) tuples
+        """
+        near_duplicates = []
+        for stored_fp in self._candidate_fingerprints(fingerprint):
+            hamming_distance = self._hamming_distance(fingerprint, stored_fp)
+            if hamming_distance <= self.similarity_threshold:
+                near_duplicates.extend((doc_id, hamming_distance) for doc_id in self.fingerprint_to_docs[stored_fp])
+        return near_duplicates
+    
     def find_near_duplicates(self, fingerprint: int) -> List[int]:
         """
         Find all documents that are near-duplicates of the given fingerprint.
@@ -436,15 +764,7 @@ class NearDuplicateDetector:
         Returns:
             List of doc_ids that are near-duplicates
         """
-        near_duplicates = []
-        
-        # Check all stored fingerprints
-        for stored_fp, doc_ids in self.fingerprint_to_docs.items():
-            hamming_distance = self._hamming_distance(fingerprint, stored_fp)
-            if hamming_distance <= self.similarity_threshold:
-                near_duplicates.extend(doc_ids)
-        
-        return near_duplicates
+        return [doc_id for doc_id, _ in self.find_near_duplicates_with_distance(fingerprint)]
     
     def is_near_duplicate(self, doc_id: int, fingerprint: int) -> Tuple[bool, List[int]]:
         """
@@ -479,29 +799,35 @@ class NearDuplicateDetector:
         return distance
     
     def save_fingerprints(self, file_path: Path):
-        with open(file_path, 'w', encoding='utf-8') as f:
-            for doc_id, fingerprint in sorted(self.doc_to_fingerprint.items()):
-                f.write(f"{doc_id}:{fingerprint}\n")
+        """Write all fingerprints in the binary fingerprints format"""
+        records = np.array(sorted(self.doc_to_fingerprint.items()), dtype=np.uint64).reshape(-1, 2)
+        with open(file_path, 'wb') as f:
+            f.write(FINGERPRINTS_MAGIC)
+            f.write(np.ascontiguousarray(records, dtype='<u8').tobytes())
     
     def load_fingerprints(self, file_path: Path):
+        """Load fingerprints written by save_fingerprints, or the text fingerprints of earlier builds"""
         if not file_path.exists():
             return
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or ':' not in line:
-                    continue
-                
-                try:
-                    doc_id_str, fingerprint_str = line.split(':', 1)
-                    doc_id = int(doc_id_str)
-                    fingerprint = int(fingerprint_str)
-                    
-                    self.fingerprint_to_docs[fingerprint].add(doc_id)
-                    self.doc_to_fingerprint[doc_id] = fingerprint
-                except ValueError:
-                    continue
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        if data.startswith(FINGERPRINTS_MAGIC):
+            records = np.frombuffer(data, dtype=FINGERPRINT_RECORD, offset=len(FINGERPRINTS_MAGIC))
+            for doc_id, fingerprint in zip(records['doc_id'].tolist(), records['fingerprint'].tolist()):
+                self.add_document(doc_id, fingerprint)
+            return
+        
+        for line in data.decode('utf-8').splitlines():
+            line = line.strip()
+            if not line or ':' not in line:
+                continue
+            
+            try:
+                doc_id_str, fingerprint_str = line.split(':', 1)
+                self.add_document(int(doc_id_str), int(fingerprint_str))
+            except ValueError:
+                continue
     
     def get_statistics(self) -> Dict:
         total_docs = len(self.doc_to_fingerprint)
@@ -517,29 +843,280 @@ class NearDuplicateDetector:
         }
 
 
+class PostingsAccumulator:
+    """
+    Compact in-memory postings for one spill of the index.
+    
+    Instead of a list of (doc_id, tf) tuples per token, postings are appended
+    to three flat arrays (term id, doc_id, tf) as documents arrive, and are
+    only grouped and sorted by token when the spill is written out. A
+    positional accumulator also keeps every posting's positions, back to back
+    in one more flat array, and a field-aware one its headline and important
+    tfs in two more.
+    """
+    
+    # Approximate memory cost, used for memory-budgeted offloading
+    POSTING_BYTES = 12  # one entry in each of the three 4-byte columns
+    TERM_BYTES = 100    # dict slot, term id and list slot for a new token (the token string is added on top)
+    POSITION_BYTES = 4  # one entry in the positions column (plus 4 bytes per posting for its count)
+    FIELD_BYTES = 8     # one entry in each of the two field tf columns
+    # Item type of the array('I') columns: C unsigned int, 4 bytes on common platforms but not guaranteed
+    COLUMN_DTYPE = np.dtype(f"u{array('I').itemsize}")
+    
+    def __init__(self, positional: bool = False, fields: bool = False):
+        self.positional = positional
+        self.fields = fields
+        self.term_ids = {}  # token -> term id
+        self.terms = []     # term id -> token
+        self.clear()
+    
+    def clear(self):
+        """Drop all postings (new arrays, so buffers handed out while writing stay valid)"""
+        self.term_ids.clear()
+        self.terms.clear()
+        self.posting_terms = array('I')
+        self.doc_ids = array('I')
+        self.tfs = array('I')
+        self.position_counts = array('I')  # positions per posting (positional only)
+        self.positions = array('I')
+        self.headline_tfs = array('I')  # field tfs per posting (field-aware only)
+        self.important_tfs = array('I')
+        self.nbytes = 0  # running estimate of the memory footprint
+    
+    def add(self, doc_id: int, tokens: Dict[str, Tuple[int, int]],
+            positions: Optional[Dict[str, List[int]]] = None,
+            field_tfs: Optional[Dict[str, Tuple[int, int]]] = None) -> int:
+        """
+        Append a document's postings.
+        
+        Args:
+            doc_id: Document ID
+            tokens: Document tokens, stemmed_token -> (normal_count, important_count)
+            positions: Positions of each token (required for a positional accumulator)
+            field_tfs: Headline and important tfs of the tokens that have any (for a field-aware accumulator)
+            
+        Returns:
+            int: Estimated number of bytes the accumulator grew by
+        """
+        added_bytes = (self.POSTING_BYTES + (self.FIELD_BYTES if self.fields else 0)) * len(tokens)
+        for token, (normal_count, important_count) in tokens.items():
+            term_id = self.term_ids.get(token)
+            if term_id is None:
+                term_id = self.term_ids[token] = len(self.terms)
+                self.terms.append(token)
+                added_bytes += self.TERM_BYTES + sys.getsizeof(token)
+            self.posting_terms.append(term_id)
+            self.doc_ids.append(doc_id)
+            self.tfs.append(normal_count + important_count)
+            if self.positional:
+                token_positions = positions[token]
+                self.position_counts.append(len(token_positions))
+                self.positions.extend(token_positions)
+                added_bytes += self.POSITION_BYTES * (len(token_positions) + 1)
+            if self.fields:
+                headline_tf, important_tf = field_tfs.get(token, (0, 0))
+                self.headline_tfs.append(headline_tf)
+                self.important_tfs.append(important_tf)
+        self.nbytes += added_bytes
+        return added_bytes
+    
+    def __len__(self) -> int:
+        """Number of distinct tokens"""
+        return len(self.terms)
+    
+    def iter_sorted(self):
+        """
+        Group the postings by token.
+        
+        Yields:
+            (token, postings) in sorted token order, postings being (doc_id, tf)
+            pairs, (doc_id, tf, positions) for a positional accumulator or
+            (doc_id, tf, (headline_tf, important_tf)) for a field-aware one, in
+            the order the documents were added
+        """
+        if not self.terms:
+            return
+        
+        # Rank every term id by its token, then stable-sort the postings by that rank
+        sorted_term_ids = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        rank = np.empty(len(self.terms), dtype=np.int64)
+        rank[sorted_term_ids] = np.arange(len(self.terms))
+        posting_terms = np.frombuffer(self.posting_terms, dtype=self.COLUMN_DTYPE)
+        order = np.argsort(rank[posting_terms], kind='stable')
+        counts = np.bincount(posting_terms, minlength=len(self.terms))[sorted_term_ids].tolist()
+        doc_ids = np.frombuffer(self.doc_ids, dtype=self.COLUMN_DTYPE)[order]
+        tfs = np.frombuffer(self.tfs, dtype=self.COLUMN_DTYPE)[order]
+        if self.positional:
+            # Each posting's slice of the positions column, in sorted posting order
+            position_counts = np.frombuffer(self.position_counts, dtype=self.COLUMN_DTYPE)
+            position_ends = np.cumsum(position_counts, dtype=np.int64)
+            position_starts = (position_ends - position_counts)[order].tolist()
+            position_ends = position_ends[order].tolist()
+            positions = self.positions
+        if self.fields:
+            headline_tfs = np.frombuffer(self.headline_tfs, dtype=self.COLUMN_DTYPE)[order]
+            important_tfs = np.frombuffer(self.important_tfs, dtype=self.COLUMN_DTYPE)[order]
+        del posting_terms, order
+        
+        start = 0
+        for term_id, count in zip(sorted_term_ids, counts):
+            end = start + count
+            postings = zip(doc_ids[start:end].tolist(), tfs[start:end].tolist())
+            if self.positional:
+                postings = ((doc_id, tf, positions[position_start:position_end].tolist())
+                            for (doc_id, tf), position_start, position_end
+                            in zip(postings, position_starts[start:end], position_ends[start:end]))
+            elif self.fields:
+                postings = ((doc_id, tf, field_tfs) for (doc_id, tf), field_tfs
+                            in zip(postings, zip(headline_tfs[start:end].tolist(), important_tfs[start:end].tolist())))
+            yield self.terms[term_id], postings
+            start = end
+
+
 class InvertedIndex:
     """Manages inverted index with disk offloading and merging"""
     
-    def __init__(self, url_mapper: URLMapper, offload_threshold: int = 15000, index_dir: Path = None, 
-                 enable_near_duplicate_detection: bool = True, similarity_threshold: int = 3):
+    def __init__(self, url_mapper: URLMapper, offload_threshold: Optional[int] = 15000, index_dir: Path = None, 
+                 enable_near_duplicate_detection: bool = True, similarity_threshold: int = 3,
+                 max_open_runs: int = 256, index_format: str = "text", memory_budget_mb: Optional[float] = None,
+                 positional: bool = False, ngram_policy: Optional[NgramPolicy] = None,
+                 simhash_token_hash: str = "blake2b", tokenizer: str = "nltk",
+                 profiler: Optional[BuildProfiler] = None, checkpoint: Optional[Dict] = None,
+                 champion_list_size: Optional[int] = None, partitions: int = 1,
+                 merge_workers: Optional[int] = None, fields: bool = False, exact_dedup: bool = True,
+                 content_mode: str = "page"):
+        """
+        Args:
+            url_mapper: URLMapper assigning document IDs
+            offload_threshold: Spill to disk every this many documents (None to disable)
+            index_dir: Output directory
+            enable_near_duplicate_detection: Whether to fingerprint documents
+            similarity_threshold: Maximum Hamming distance for near-duplicates
+            max_open_runs: Partial files read at once during the merge
+            index_format: Final index format, one of INDEX_FORMATS
+            memory_budget_mb: Spill to disk once the estimated in-memory index exceeds this size (None to disable)
+            positional: Store token positions in every posting (documents must be tokenized positionally)
+            ngram_policy: N-gram policy the documents are tokenized with; its min_df is applied in the final merge
+            simhash_token_hash: Token hash for SimHash fingerprints ("md5" matches earlier builds)
+            tokenizer: Tokenizer the documents are analyzed with, recorded so queries use the same one
+            profiler: Build profiler to time offloading, merging and the document store with
+            checkpoint: Checkpoint of an interrupted build in index_dir to continue from (see load_checkpoint);
+                without one, any stale checkpoint in index_dir is removed
+            champion_list_size: Also write a champion tier holding each term's top this many postings
+                (None for none; not for the impact format, whose postings already start with them)
+            partitions: Split the final index into this many term-hash partitions (see partitions.py)
+            merge_workers: Processes merging the partitions concurrently (default: one per partition, up to
+                the number of CPUs)
+            fields: Keep each posting's headline and important tfs, so searches can weight the fields
+                (documents must be tokenized with fields; not with positional or the impact format)
+            exact_dedup: Have alias_exact_duplicate turn exact copies of an earlier page into URL aliases
+            content_mode: What of each page the documents are tokenized from, one of CONTENT_MODES
+        """
+        if index_format not in INDEX_FORMATS:
+            raise ValueError(f"Unknown index format '{index_format}', expected one of {INDEX_FORMATS}")
+        if positional and index_format == "impact":
+            raise ValueError("Positional postings are kept in doc_id order; use the text or binary format")
+        if champion_list_size is not None and (index_format == "impact" or champion_list_size < 1):
+            raise ValueError("A champion tier needs a positive list size and the text or binary format")
+        if fields and (positional or index_format == "impact"):
+            raise ValueError("Field-aware postings need the text or binary format, without positions")
+        if partitions < 1:
+            raise ValueError(f"Number of partitions must be at least 1, got {partitions}")
+        if content_mode not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode '{content_mode}', expected one of {CONTENT_MODES}")
         self.url_mapper = url_mapper
+        self.index_format = index_format
+        self.positional = positional
+        self.fields = fields
+        self.tokenizer = tokenizer
+        self.content_mode = content_mode
+        self.profiler = profiler or BuildProfiler()
+        self.ngram_policy = ngram_policy or DEFAULT_NGRAM_POLICY
+        self.ngram_stats = {'ngram_terms': 0, 'ngram_postings': 0, 'pruned_terms': 0, 'pruned_postings': 0}
+        self.champion_list_size = champion_list_size
+        self.champion_stats = {'terms': 0, 'truncated_terms': 0, 'postings': 0}
+        self.partitions = partitions
+        self.merge_workers = merge_workers or min(partitions, os.cpu_count() or 1)
+        self.partition_terms: List[int] = []
+        # Partitions merged again and partitions whose files were replaced, in the last merge
+        self.partitions_merged = self.partitions_rewritten = 0
         self.offload_threshold = offload_threshold
-        self.index_dir = index_dir or Path(__file__).parent.parent / "index"
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self.max_open_runs = max_open_runs  # partial files read at once during the merge
+        self.index_dir = index_dir or DEFAULT_INDEX_DIR
         self.index_dir.mkdir(exist_ok=True)
         
-        # In-memory index: token -> list of (doc_id, term_frequency)
-        self.in_memory_index = defaultdict(list)
+        # In-memory index: token -> (doc_id, term_frequency) postings, in compact columns
+        self.in_memory_index = PostingsAccumulator(positional, fields)
+        self.peak_memory_bytes = 0
+        self.spill_count = 0
         self.doc_count = 0
         self.partial_index_files = []
-        self.metadata = {}  # Store doc_id -> {headline, article, excerpt, url} mapping
         
         self.enable_near_duplicate_detection = enable_near_duplicate_detection
         if enable_near_duplicate_detection:
-            self.duplicate_detector = NearDuplicateDetector(similarity_threshold=similarity_threshold)
+            self.duplicate_detector = NearDuplicateDetector(similarity_threshold=similarity_threshold,
+                                                            token_hash=simhash_token_hash)
             self.duplicates_skipped = 0
             self.duplicates_found = 0
         else:
             self.duplicate_detector = None
+        
+        # Content digest -> doc ID of the first page with that content (see alias_exact_duplicate)
+        self.exact_dedup = exact_dedup
+        self.content_digests: Dict[bytes, int] = {}
+        
+        # Set by the build driver: how far through the crawl the documents added so far go.
+        # While it is set, every offload to disk also writes a checkpoint.
+        self.build_progress: Optional[Dict] = None
+        self.checkpoint_generation = 0
+        if checkpoint is None:
+            clear_checkpoint(self.index_dir)
+            # Headline, url, image and excerpt per document; full articles compressed alongside
+            self.doc_store = DocStoreWriter(self.index_dir)
+        else:
+            self._restore_checkpoint(checkpoint)
+    
+    def alias_exact_duplicate(self, url: str, content: str) -> bool:
+        """
+        Check a page against the pages seen so far before any parsing, by a digest of its content.
+        
+        The first page with some content is assigned its doc ID here. A later page
+        with the same content, up to whitespace, is an exact copy: its URL becomes an
+        alias of the first page's document and nothing else needs to be done for it.
+        
+        Args:
+            url: Cleaned page URL
+            content: Raw page content
+            
+        Returns:
+            bool: True if the page is an exact copy and must be skipped, False if it is to be indexed
+        """
+        if not self.exact_dedup:
+            return False
+        digest = content_digest(content)
+        if digest is None:
+            # Pages without content are not copies of each other
+            return False
+        canonical_id = self.content_digests.get(digest)
+        if canonical_id is None:
+            self.content_digests[digest] = self.url_mapper.get_id(url)
+            return False
+        if self.url_mapper.resolve(url) is None:
+            self.url_mapper.add_alias(url, canonical_id)
+        return True
+    
+    def save_content_digests(self, file_path: Path, count: Optional[int] = None):
+        """Write the first count content digests (default: all), in the order they were seen"""
+        records = np.fromiter(islice(self.content_digests.items(), count), dtype=CONTENT_DIGEST_RECORD)
+        with open(file_path, 'wb') as f:
+            f.write(records.tobytes())
+    
+    def load_content_digests(self, file_path: Path):
+        """Restore content digests written by save_content_digests"""
+        records = np.fromfile(file_path, dtype=CONTENT_DIGEST_RECORD)
+        self.content_digests = {digest.tobytes(): doc_id
+                                for digest, doc_id in zip(records['digest'], records['doc_id'].tolist())}
     
     def add_document(self, doc: Document, skip_duplicates: bool = False):
         """
@@ -554,8 +1131,47 @@ class InvertedIndex:
         """
         doc_id = doc.set_doc_id(self.url_mapper)
         
+        fingerprint = None
+        if self.enable_near_duplicate_detection and self.duplicate_detector:
+            fingerprint = doc.get_fingerprint(self.duplicate_detector.token_hash)
+        
+        if not self.register_document(doc_id, doc.url, doc.headline, doc.article, doc.image,
+                                      fingerprint=fingerprint, skip_duplicates=skip_duplicates):
+            return False
+        
+        # Add tokens to in-memory index
+        self.in_memory_index.add(doc_id, doc.tokens, doc.positions, doc.field_tfs)
+        self.peak_memory_bytes = max(self.peak_memory_bytes, self.in_memory_index.nbytes)
+        
+        # Offload to disk if threshold or memory budget reached
+        if self.offload_threshold and self.doc_count % self.offload_threshold == 0:
+            self._offload_to_disk()
+        elif self.memory_budget_bytes and self.in_memory_index.nbytes >= self.memory_budget_bytes:
+            self._offload_to_disk()
+        
+        return True
+    
+    def register_document(self, doc_id: int, url: str, headline: str, article: str, image: str,
+                          fingerprint: Optional[int] = None, skip_duplicates: bool = False) -> bool:
+        """
+        Record a document's near-duplicate status and metadata, without touching postings.
+        
+        Used by add_document, and directly by the parallel build whose workers
+        write the postings themselves.
+        
+        Args:
+            doc_id: Document ID assigned by the URLMapper
+            url: Cleaned document URL
+            headline: Article headline
+            article: Article text
+            image: Article image URL
+            fingerprint: SimHash fingerprint (required when near-duplicate detection is enabled)
+            skip_duplicates: If True, reject documents that are near-duplicates
+            
+        Returns:
+            bool: True if document was registered, False if skipped as duplicate
+        """
         if self.enable_near_duplicate_detection and self.duplicate_detector:
-            fingerprint = doc.get_fingerprint()
             is_duplicate, duplicate_doc_ids = self.duplicate_detector.is_near_duplicate(doc_id, fingerprint)
             
             if is_duplicate:
@@ -569,45 +1185,129 @@ class InvertedIndex:
         self.doc_count += 1
         
         # Store metadata for this document
-        # excerpt = doc.article.replace('\n', ' ').strip() + "..." if len(doc.article) > 150 else doc.article
-        self.metadata[doc_id] = {
-            "headline": doc.headline,
-            "article": doc.article,
-            "excerpt": doc.article,
-            "url": doc.url,
-            "image":doc.image
-        }
-        
-        # Add tokens to in-memory index
-        for token, (normal_count, important_count) in doc.tokens.items():
-            term_frequency = normal_count + important_count
-            self.in_memory_index[token].append((doc_id, term_frequency))
-        
-        # Offload to disk if threshold reached
-        if self.doc_count % self.offload_threshold == 0:
-            self._offload_to_disk()
-        
+        self.doc_store.add(doc_id, url, headline, article, image)
         return True
     
+    def reserve_partial_index_file(self) -> Path:
+        """Allocate the path of the next partial index file and register it for merging"""
+        partial_file = self.index_dir / f"partial_index_{len(self.partial_index_files)}.txt"
+        self.partial_index_files.append(partial_file)
+        return partial_file
+    
     def _offload_to_disk(self):
-        """Write current in-memory index to a partial index file"""
+        """Write current in-memory index to a partial index file, then checkpoint the build"""
         if not self.in_memory_index:
             return
         
-        partial_file = self.index_dir / f"partial_index_{len(self.partial_index_files)}.txt"
-        self.partial_index_files.append(partial_file)
-        
-        # Write index to file (token -> list of postings)
-        with open(partial_file, 'w', encoding='utf-8') as f:
-            for token in sorted(self.in_memory_index.keys()):
-                postings = self.in_memory_index[token]
-                # Format: token:doc_id1:tf1,doc_id2:tf2,...
-                postings_str = ','.join(f"{doc_id}:{tf}" for doc_id, tf in postings)
-                f.write(f"{token}:{postings_str}\n")
+        partial_file = self.reserve_partial_index_file()
+        with self.profiler.stage("offload"):
+            write_partial_index(partial_file, self.in_memory_index, self.partitions)
         
         # Clear in-memory index
         self.in_memory_index.clear()
+        self.spill_count += 1
         print(f"Offloaded index to {partial_file.name} (total partial files: {len(self.partial_index_files)})")
+        if self.build_progress is not None:
+            self.write_checkpoint()
+    
+    def _checkpoint_settings(self) -> Dict:
+        """Build settings a checkpoint can only be resumed with"""
+        return {
+            "format": self.index_format,
+            "doc_ids": self.url_mapper.id_mode,
+            "positions": self.positional,
+            "fields": self.fields,
+            "ngram_policy": self.ngram_policy.to_dict(),
+            "partitions": self.partitions,
+            "simhash": self.duplicate_detector.token_hash if self.duplicate_detector else None,
+            "tokenizer": self.tokenizer,
+            "content": self.content_mode,
+            "exact_dedup": self.exact_dedup,
+        }
+    
+    def write_checkpoint(self, partial_files: Optional[List[Path]] = None, content_digests: Optional[int] = None):
+        """
+        Checkpoint the build: everything added so far is on disk once this returns.
+        
+        The in-memory postings must have been offloaded, so that partial_files
+        hold the postings of exactly the documents in build_progress.
+        
+        Args:
+            partial_files: Partial index files holding those postings (default: all
+                registered ones; the parallel build passes only those of finished shards)
+            content_digests: Number of content digests, in the order they were seen, that belong
+                to those documents (default: all)
+        """
+        generation = self.checkpoint_generation + 1
+        with self.profiler.stage("checkpoint"):
+            url_mapping_file = checkpoint_path(self.index_dir, generation, "url_mapping.txt")
+            write_url_mapping(self.url_mapper, url_mapping_file)
+            url_aliases_file = checkpoint_path(self.index_dir, generation, URL_ALIASES_FILE)
+            write_url_aliases(self.url_mapper, url_aliases_file)
+            content_digests_file = checkpoint_path(self.index_dir, generation, CONTENT_DIGESTS_FILE)
+            self.save_content_digests(content_digests_file, content_digests)
+            fingerprints_file = None
+            if self.duplicate_detector:
+                fingerprints_file = checkpoint_path(self.index_dir, generation, FINGERPRINTS_FILE)
+                self.duplicate_detector.save_fingerprints(fingerprints_file)
+            doc_store = self.doc_store.checkpoint(checkpoint_path(self.index_dir, generation, OFFSETS_FILE))
+            
+            write_checkpoint(self.index_dir, {
+                "generation": generation,
+                "settings": self._checkpoint_settings(),
+                "progress": self.build_progress,
+                "partial_files": [path.name for path in (self.partial_index_files if partial_files is None
+                                                         else partial_files)],
+                "url_mapping": url_mapping_file.name,
+                "url_aliases": url_aliases_file.name,
+                "content_digests": content_digests_file.name,
+                "fingerprints": fingerprints_file.name if fingerprints_file else None,
+                "doc_store": doc_store,
+                "counters": {
+                    "doc_count": self.doc_count,
+                    "spill_count": self.spill_count,
+                    "peak_memory_bytes": self.peak_memory_bytes,
+                    "duplicates_found": getattr(self, "duplicates_found", 0),
+                    "duplicates_skipped": getattr(self, "duplicates_skipped", 0),
+                },
+            })
+        self.checkpoint_generation = generation
+        print(f"Checkpoint {generation} written ({self.doc_count} documents)")
+    
+    def _restore_checkpoint(self, checkpoint: Dict):
+        """Continue an interrupted build from its checkpoint"""
+        settings = self._checkpoint_settings()
+        changed = [key for key, value in checkpoint["settings"].items() if settings.get(key) != value]
+        if changed:
+            raise ValueError(f"Cannot resume: the checkpoint was built with different settings ({', '.join(changed)})")
+        
+        self.checkpoint_generation = checkpoint["generation"]
+        self.partial_index_files = [self.index_dir / name for name in checkpoint["partial_files"]]
+        counters = checkpoint["counters"]
+        self.doc_count = counters["doc_count"]
+        self.spill_count = counters["spill_count"]
+        self.peak_memory_bytes = counters["peak_memory_bytes"]
+        self.load_content_digests(self.index_dir / checkpoint["content_digests"])
+        if self.duplicate_detector:
+            self.duplicate_detector.load_fingerprints(self.index_dir / checkpoint["fingerprints"])
+            self.duplicates_found = counters["duplicates_found"]
+            self.duplicates_skipped = counters["duplicates_skipped"]
+        self.doc_store = DocStoreWriter(self.index_dir, resume_from=checkpoint["doc_store"])
+    
+    def record_worker_spills(self, spill_files: List[Path], peak_bytes: int):
+        """Account for a finished shard of the parallel build: its own partial file plus any early spills"""
+        self.partial_index_files.extend(spill_files)
+        self.spill_count += len(spill_files) + 1
+        self.peak_memory_bytes = max(self.peak_memory_bytes, peak_bytes)
+    
+    def get_memory_statistics(self) -> Dict:
+        """Estimated in-memory index usage and number of spills to disk"""
+        return {
+            'memory_budget_mb': self.memory_budget_bytes / (1024 * 1024) if self.memory_budget_bytes else None,
+            'peak_memory_mb': self.peak_memory_bytes / (1024 * 1024),
+            'spill_count': self.spill_count,
+            'partial_files': len(self.partial_index_files),
+        }
     
     def finalize(self):
         """Offload remaining in-memory index and merge all partial indexes"""
@@ -616,135 +1316,555 @@ class InvertedIndex:
             self._offload_to_disk()
         
         # Merge all partial indexes
-        if self.partial_index_files:
-            print(f"Merging {len(self.partial_index_files)} partial index files...")
+        with self.profiler.stage("merge", items=len(self.partial_index_files)):
+            if self.partial_index_files:
+                print(f"Merging {len(self.partial_index_files)} partial index files...")
             self._merge_partial_indexes()
-        else:
-            # No partial files, write in-memory index directly
-            self._write_final_index()
             
-        # Save metadata to JSON file
-        self._save_metadata()
+        # Finish the document store
+        with self.profiler.stage("doc_store"):
+            self._save_metadata()
+        self._save_manifest()
     
     def _merge_partial_indexes(self):
-        """Merge all partial index files into final index"""
-        # Read all partial indexes
-        merged_index = defaultdict(list)
-        
-        for partial_file in self.partial_index_files:
-            with open(partial_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or ':' not in line:
-                        continue
-                    
-                    parts = line.split(':', 1)
-                    if len(parts) != 2:
-                        continue
-                    
-                    token = parts[0]
-                    postings_str = parts[1]
-                    
-                    # Parse postings: doc_id1:tf1,doc_id2:tf2,...
-                    for posting in postings_str.split(','):
-                        if ':' in posting:
-                            doc_id_str, tf_str = posting.split(':', 1)
-                            try:
-                                doc_id = int(doc_id_str)
-                                tf = int(tf_str)
-                                merged_index[token].append((doc_id, tf))
-                            except ValueError:
-                                continue
-        
-        # Write merged index to final file
-        final_index_file = self.index_dir / "inverted_index.txt"
-        with open(final_index_file, 'w', encoding='utf-8') as f:
-            for token in sorted(merged_index.keys()):
-                postings = merged_index[token]
-                # Combine postings for same doc_id (sum term frequencies)
-                doc_tf_map = {}
-                for doc_id, tf in postings:
-                    if doc_id in doc_tf_map:
-                        doc_tf_map[doc_id] += tf
-                    else:
-                        doc_tf_map[doc_id] = tf
-                
-                # Write combined postings
-                postings_str = ','.join(f"{doc_id}:{tf}" for doc_id, tf in sorted(doc_tf_map.items()))
-                f.write(f"{token}:{postings_str}\n")
+        """
+        Merge all partial index files into the final index (see merge_runs_into_index).
         
-        print(f"Merged index written to {final_index_file}")
+        A partitioned index merges each partition from its own part of every
+        partial file, in a pool of merge_workers processes.
+        """
+        settings = dict(index_format=self.index_format, positional=self.positional, fields=self.fields,
+                        min_df=self.ngram_policy.min_df, champion_list_size=self.champion_list_size,
+                        max_open_runs=self.max_open_runs)
+        # A rebuild with a different layout must not leave the other one behind
+        if self.partitions == 1:
+            shutil.rmtree(self.index_dir / PARTITIONS_DIR, ignore_errors=True)
+            results = [merge_runs_into_index(self.partial_index_files, self.index_dir, **settings)]
+            print(f"Merged index written to {self.index_dir / INDEX_FILES[self.index_format]}")
+        else:
+            for name in (INDEX_FILES[self.index_format], "lexicon.txt", POSITIONS_FILE, FIELDS_FILE, CHAMPIONS_FILE,
+                         CHAMPIONS_LEXICON_FILE):
+                (self.index_dir / name).unlink(missing_ok=True)
+            # Partitions of an earlier build are kept where they did not change (see merge_partition)
+            partition_dirs = {partition_dir(self.index_dir, partition) for partition in range(self.partitions)}
+            for directory in (self.index_dir / PARTITIONS_DIR).glob("part_*"):
+                if directory not in partition_dirs:
+                    shutil.rmtree(directory)
+            with ProcessPoolExecutor(max_workers=self.merge_workers) as pool:
+                futures = [
+                    pool.submit(merge_partition,
+                                [partition_run_file(run, partition) for run in self.partial_index_files],
+                                partition_dir(self.index_dir, partition), **settings)
+                    for partition in range(self.partitions)
+                ]
+                results = [future.result() for future in futures]
+            self.partitions_merged = sum(result["merged"] for result in results)
+            self.partitions_rewritten = sum(result["rewritten"] for result in results)
+            print(f"Merged index written to {self.partitions} partitions in {self.index_dir / PARTITIONS_DIR} "
+                  f"({self.partitions_merged} merged, {self.partitions_rewritten} rewritten)")
+        
+        for result in results:
+            for stats, totals in ((result["ngram_stats"], self.ngram_stats),
+                                  (result["champion_stats"], self.champion_stats)):
+                for key, value in stats.items():
+                    totals[key] += value
+        self.partition_terms = [result["terms"] for result in results]
         
         # Clean up partial files (optional - keep them for debugging)
         # for partial_file in self.partial_index_files:
         #     partial_file.unlink()
     
-    def _write_final_index(self):
-        """Write in-memory index directly to final file (if no partial files)"""
-        final_index_file = self.index_dir / "inverted_index.txt"
-        with open(final_index_file, 'w', encoding='utf-8') as f:
-            for token in sorted(self.in_memory_index.keys()):
-                postings = self.in_memory_index[token]
-                postings_str = ','.join(f"{doc_id}:{tf}" for doc_id, tf in postings)
-                f.write(f"{token}:{postings_str}\n")
-        
-        print(f"Index written to {final_index_file}")
-    
     def save_url_mapping(self):
-        """Save URL to ID mapping to disk"""
+        """Save URL to ID mapping to disk, for the URLs whose document is in the index"""
+        # URLs given an ID for a page that then failed to build have no document
+        documents = self.doc_store.doc_ids()
+        for url, doc_id in list(self.url_mapper.url_to_id.items()):
+            if doc_id not in documents:
+                self.url_mapper.remove(url)
+        for url, doc_id in list(self.url_mapper.aliases.items()):
+            if doc_id not in documents:
+                del self.url_mapper.aliases[url]
         mapping_file = self.index_dir / "url_mapping.txt"
-        with open(mapping_file, 'w', encoding='utf-8') as f:
-            for url, doc_id in sorted(self.url_mapper.url_to_id.items(), key=lambda x: x[1]):
-                f.write(f"{doc_id}:{url}\n")
+        write_url_mapping(self.url_mapper, mapping_file)
         print(f"URL mapping saved to {mapping_file}")
+        aliases_file = self.index_dir / URL_ALIASES_FILE
+        if self.url_mapper.aliases:
+            write_url_aliases(self.url_mapper, aliases_file)
+            print(f"URL aliases of {len(self.url_mapper.aliases)} exact copies saved to {aliases_file}")
+        else:
+            aliases_file.unlink(missing_ok=True)
     
     def save_fingerprints(self):
         """Save document fingerprints to disk"""
         if self.enable_near_duplicate_detection and self.duplicate_detector:
-            fingerprint_file = self.index_dir / "fingerprints.txt"
+            fingerprint_file = self.index_dir / FINGERPRINTS_FILE
             self.duplicate_detector.save_fingerprints(fingerprint_file)
             print(f"Fingerprints saved to {fingerprint_file}")
     
     def _save_metadata(self):
-        """Save article metadata (headlines, articles, excerpts) to JSON file"""
-        metadata_file = self.index_dir / "article_metadata.json"
-        
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
-        
-        print(f"Article metadata saved to {metadata_file}")
-        print(f"Total articles with metadata: {len(self.metadata)}")
+        """Close the document store (headlines, urls, images, excerpts and compressed articles)"""
+        self.doc_store.close()
+        # A rebuild into an older index directory must not leave stale metadata behind
+        (self.index_dir / LEGACY_METADATA_FILE).unlink(missing_ok=True)
+        
+        print(f"Document store saved to {self.index_dir} "
+              f"({(self.index_dir / COLD_FILE).stat().st_size / 1024:.1f} KB of compressed articles)")
+        print(f"Total articles with metadata: {len(self.doc_store)}")
+    
+    def _save_manifest(self):
+        """Record how this index was built so the search side can read it"""
+        write_index_manifest(self.index_dir, {
+            "format": self.index_format,
+            "index_file": INDEX_FILES[self.index_format],
+            "doc_ids": self.url_mapper.id_mode,
+            "positions": self.positional,
+            "fields": self.fields,
+            "ngram_policy": self.ngram_policy.to_dict(),
+            "partitions": self.partitions,
+            "simhash": self.duplicate_detector.token_hash if self.duplicate_detector else None,
+            "tokenizer": self.tokenizer,
+            "content": self.content_mode,
+            "champions": self.champion_list_size,
+            "partition_terms": self.partition_terms if self.partitions > 1 else None,
+        })
+    
+    def final_index_dirs(self) -> List[Path]:
+        """Directories the merged postings, lexicons and champion tiers are in"""
+        if self.partitions == 1:
+            return [self.index_dir]
+        return [partition_dir(self.index_dir, partition) for partition in range(self.partitions)]
     
     def get_index_size_kb(self) -> float:
         """Calculate total size of index files in KB"""
         total_size = 0
-        for file_path in self.index_dir.glob("*.txt"):
+        for file_path in [*self.index_dir.glob("*.txt"), *self.index_dir.glob("*.bin"),
+                          *(self.index_dir / PARTITIONS_DIR).glob("part_*/*")]:
             total_size += file_path.stat().st_size
         return total_size / 1024.0
     
     def get_unique_tokens_count(self) -> int:
         """Get count of unique tokens in the final index"""
-        final_index_file = self.index_dir / "inverted_index.txt"
+        if self.partition_terms:
+            return sum(self.partition_terms)
+        if self.index_format != "text":
+            # Binary postings have no line structure; the lexicon has one line per token
+            final_index_file = self.index_dir / "lexicon.txt"
+        else:
+            final_index_file = self.index_dir / "inverted_index.txt"
         if not final_index_file.exists():
             return len(self.in_memory_index)
         
+        # Index lines are "token:postings"; lexicon lines are space separated
+        separator = ' ' if self.index_format != "text" else ':'
         count = 0
         with open(final_index_file, 'r', encoding='utf-8') as f:
             for line in f:
-                if line.strip() and ':' in line:
+                if line.strip() and separator in line and not line.startswith("#"):
                     count += 1
         return count
 
-   
-def parse_html_content(html_content):
+
+def write_url_mapping(url_mapper: URLMapper, mapping_file: Path):
+    """
+    Write the URL mapping as "doc_id:url" lines in doc_id order.
+    
+    The file is replaced atomically, so a search side reloading it never reads half a mapping.
+    """
+    tmp_file = mapping_file.with_name(mapping_file.name + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for url, doc_id in sorted(url_mapper.url_to_id.items(), key=lambda x: x[1]):
+            f.write(f"{doc_id}:{url}\n")
+    os.replace(tmp_file, mapping_file)
+
+
+def write_url_aliases(url_mapper: URLMapper, aliases_file: Path):
+    """Write the URL aliases as "doc_id:url" lines in doc_id order"""
+    with open(aliases_file, 'w', encoding='utf-8') as f:
+        for url, doc_id in sorted(url_mapper.aliases.items(), key=lambda x: (x[1], x[0])):
+            f.write(f"{doc_id}:{url}\n")
+
+
+def write_partial_index(partial_file: Path, index: PostingsAccumulator, partitions: int = 1):
+    """
+    Write an in-memory index to a partial index file, one token per line in sorted order.
+    
+    Args:
+        partial_file: Destination path
+        index: Accumulated postings to write
+        partitions: Split the tokens by partition into this many files instead, at the
+            partition_run_file paths of partial_file (all of them are written, even if empty)
+    """
+    with ExitStack() as stack:
+        if partitions == 1:
+            files = [stack.enter_context(open(partial_file, 'w', encoding='utf-8'))]
+        else:
+            files = [stack.enter_context(open(partition_run_file(partial_file, partition), 'w', encoding='utf-8'))
+                     for partition in range(partitions)]
+        for token, postings in index.iter_sorted():
+            f = files[term_partition(token, partitions)] if partitions > 1 else files[0]
+            # Format: token:doc_id1:tf1,doc_id2:tf2,... (doc_id:tf:positions for a positional index)
+            f.write(f"{token}:{format_text_postings(postings)}\n")
+
+
+def iter_partial_index(partial_file: Path):
+    """
+    Stream the lines of a sorted partial index file.
+    
+    Yields:
+        (token, postings_str) tuples in file (token) order
+    """
+    with open(partial_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or ':' not in line:
+                continue
+            
+            token, postings_str = line.split(':', 1)
+            yield token, postings_str
+
+
+def iter_merged_postings(run_files: List[Path], positional: bool = False, fields: bool = False):
+    """
+    K-way merge sorted partial index files, one token at a time.
+    
+    Postings of the same token are combined as they are reached: term
+    frequencies of a doc_id that appears in several runs are summed.
+    
+    Args:
+        run_files: Partial index files, each sorted by token
+        positional: The runs hold positions, which are merged as well
+        fields: The runs hold field tfs, which are summed as well
+        
+    Yields:
+        (token, postings) in token order, postings being (doc_id, tf) pairs
+        (or (doc_id, tf, positions) when positional, (doc_id, tf, (headline_tf,
+        important_tf)) with fields) sorted by doc_id
+    """
+    runs = [iter_partial_index(run_file) for run_file in run_files]
+    merged = heapq.merge(*runs, key=itemgetter(0))
+    
+    if positional:
+        yield from _merge_positional_entries(merged)
+        return
+    if fields:
+        yield from _merge_field_entries(merged)
+        return
+    
+    for token, entries in groupby(merged, key=itemgetter(0)):
+        # Combine postings for same doc_id (sum term frequencies)
+        doc_tf_map = {}
+        for _, postings_str in entries:
+            # Parse postings: doc_id1:tf1,doc_id2:tf2,...
+            for doc_id, tf in parse_text_postings(postings_str):
+                doc_tf_map[doc_id] = doc_tf_map.get(doc_id, 0) + tf
+        
+        yield token, sorted(doc_tf_map.items())
+
+
+def _merge_positional_entries(merged):
+    """Group merged positional run lines by token, as iter_merged_postings does for plain ones"""
+    for token, entries in groupby(merged, key=itemgetter(0)):
+        doc_map = {}
+        for _, postings_str in entries:
+            for doc_id, tf, positions in parse_text_postings(postings_str, with_positions=True):
+                if doc_id in doc_map:
+                    # Same doc_id in several runs (a URL crawled twice): sum tfs, union positions
+                    previous_tf, previous_positions = doc_map[doc_id]
+                    doc_map[doc_id] = (previous_tf + tf, sorted(set(previous_positions) | set(positions)))
+                else:
+                    doc_map[doc_id] = (tf, positions)
+        
+        yield token, [(doc_id, tf, positions) for doc_id, (tf, positions) in sorted(doc_map.items())]
+
+
+def _merge_field_entries(merged):
+    """Group merged field-aware run lines by token, as iter_merged_postings does for plain ones"""
+    for token, entries in groupby(merged, key=itemgetter(0)):
+        doc_map = {}
+        for _, postings_str in entries:
+            for doc_id, tf, (headline_tf, important_tf) in parse_text_postings(postings_str, with_fields=True):
+                previous_tf, previous_headline_tf, previous_important_tf = doc_map.get(doc_id, (0, 0, 0))
+                doc_map[doc_id] = (previous_tf + tf, previous_headline_tf + headline_tf,
+                                   previous_important_tf + important_tf)
+        
+        yield token, [(doc_id, tf, (headline_tf, important_tf))
+                      for doc_id, (tf, headline_tf, important_tf) in sorted(doc_map.items())]
+
+
+def prune_ngrams(merged_postings, min_df: int, stats: Dict[str, int]):
+    """
+    Drop n-gram terms found in fewer than min_df documents from merged postings.
+    
+    Args:
+        merged_postings: Iterable of (token, postings), as from iter_merged_postings
+        min_df: Minimum document frequency of a kept n-gram; unigrams are always kept
+        stats: Counters updated in place: ngram_terms, ngram_postings, pruned_terms, pruned_postings
+        
+    Yields:
+        The (token, postings) that are kept
+    """
+    for token, postings in merged_postings:
+        if is_ngram(token):
+            stats['ngram_terms'] += 1
+            stats['ngram_postings'] += len(postings)
+            if len(postings) < min_df:
+                stats['pruned_terms'] += 1
+                stats['pruned_postings'] += len(postings)
+                continue
+        yield token, postings
+
+
+def write_champion_lists(merged_postings, champions_file: Path, lexicon_file: Path, size: int,
+                         stats: Dict[str, int]):
+    """
+    Write the champion tier of merged postings while passing them on unchanged.
+    
+    A term's champion list is its size postings with the highest term frequency
+    (ties in doc_id order), which is the term's TF-IDF ranking; terms with no
+    more than size postings get their whole list, flagged complete.
+    
+    Args:
+        merged_postings: Iterable of (token, postings sorted by doc_id)
+        champions_file: Destination champion postings file
+        lexicon_file: Destination champion lexicon
+        size: Champion list size
+        stats: Counters updated in place: terms, truncated_terms, postings
+        
+    Yields:
+        The (token, postings) of merged_postings
+    """
+    offset = 0
+    with open(champions_file, 'wb') as champions_out, open(lexicon_file, 'w', encoding='utf-8') as lexicon_out:
+        for token, postings in merged_postings:
+            complete = len(postings) <= size
+            champions = postings if complete else \
+                sorted(heapq.nsmallest(size, postings, key=lambda posting: (-posting[1], posting[0])))
+            encoded = encode_impact_postings(champions)
+            champions_out.write(encoded)
+            lexicon_out.write(f"{token} {offset} {len(encoded)} {int(complete)}\n")
+            offset += len(encoded)
+            stats['terms'] += 1
+            stats['truncated_terms'] += not complete
+            stats['postings'] += len(champions)
+            yield token, postings
+
+
+def merge_runs_into_index(run_files: List[Path], out_dir: Path, index_format: str = "text",
+                          positional: bool = False, min_df: int = 1, champion_list_size: Optional[int] = None,
+                          max_open_runs: int = 256, fields: bool = False) -> Dict:
+    """
+    Merge sorted partial index files into a final index with a streaming k-way merge.
+    
+    Partial files are already sorted by token, so they are read line by line
+    and merged through a heap; only one line per open file and the postings of
+    the current token are held in memory. If there are more partial files than
+    max_open_runs, they are first merged in groups into intermediate files.
+    The lexicon is written along with the final index, so it never has to be
+    recovered by scanning the index. Runs in the parent process for an
+    unpartitioned index, and in a merge worker process for each partition of
+    a partitioned one.
+    
+    Args:
+        run_files: Partial index files, each sorted by token (none writes an empty index)
+        out_dir: Directory to write the index, its lexicon and champion tier to
+        index_format: Final index format, one of INDEX_FORMATS
+        positional: The runs hold positions
+        min_df: N-grams in fewer documents than this are pruned
+        champion_list_size: Also write a champion tier of this list size (None for none)
+        max_open_runs: Partial files read at once
+        fields: The runs hold field tfs
+        
+    Returns:
+        Dict with the n-gram pruning counters (ngram_stats), the champion tier
+        counters (champion_stats) and the number of terms written (terms)
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ngram_stats = {'ngram_terms': 0, 'ngram_postings': 0, 'pruned_terms': 0, 'pruned_postings': 0}
+    champion_stats = {'terms': 0, 'truncated_terms': 0, 'postings': 0}
+    
+    runs = list(run_files)
+    merge_pass = 0
+    while len(runs) > max_open_runs:
+        merged_runs = []
+        for group_start in range(0, len(runs), max_open_runs):
+            merged_file = out_dir / f"partial_merge_{merge_pass}_{len(merged_runs)}.txt"
+            merge_partial_runs(runs[group_start:group_start + max_open_runs], merged_file, positional, fields)
+            merged_runs.append(merged_file)
+        # Intermediate files from an earlier pass are no longer needed
+        if merge_pass > 0:
+            for run in runs:
+                run.unlink()
+        runs = merged_runs
+        merge_pass += 1
+    
+    final_index_file = out_dir / INDEX_FILES[index_format]
+    # Document frequencies are only complete in the final pass, so n-grams are pruned here
+    merged = prune_ngrams(iter_merged_postings(runs, positional, fields), min_df, ngram_stats)
+    if champion_list_size:
+        merged = write_champion_lists(merged, out_dir / CHAMPIONS_FILE, out_dir / CHAMPIONS_LEXICON_FILE,
+                                      champion_list_size, champion_stats)
+    else:
+        # A rebuild without a champion tier must not leave a stale one behind
+        (out_dir / CHAMPIONS_FILE).unlink(missing_ok=True)
+        (out_dir / CHAMPIONS_LEXICON_FILE).unlink(missing_ok=True)
+    if index_format != "text":
+        terms = write_binary_index(merged, final_index_file, out_dir / "lexicon.txt",
+                                   out_dir / POSITIONS_FILE if positional else None,
+                                   impact_order=index_format == "impact",
+                                   fields_file=out_dir / FIELDS_FILE if fields else None)
+    else:
+        terms = write_text_index(merged, final_index_file, out_dir / "lexicon.txt")
+    if merge_pass > 0:
+        for run in runs:
+            run.unlink()
+    
+    return {"ngram_stats": ngram_stats, "champion_stats": champion_stats, "terms": terms}
+
+
+def merge_partition(run_files: List[Path], out_dir: Path, **settings) -> Dict:
+    """
+    Merge one partition of a partitioned index, touching it only if it changed.
+    
+    A partition whose merge.json records the same runs and settings is kept
+    as it is. Otherwise it is merged next to its directory and moved into
+    place, unless the merged files are identical to the current ones.
+    
+    Args:
+        run_files: The partition's parts of the partial index files
+        out_dir: Directory of the partition
+        settings: Merge settings, as for merge_runs_into_index
+        
+    Returns:
+        The result of merge_runs_into_index, with "merged" (the partition was merged
+        again) and "rewritten" (its files were replaced)
+    """
+    out_dir = Path(out_dir)
+    inputs = partition_inputs_digest(run_files, settings)
+    previous = load_partition_merge(out_dir)
+    if previous is not None and previous["inputs"] == inputs:
+        return {**previous["result"], "merged": False, "rewritten": False}
+    
+    staging_dir = out_dir.with_name(out_dir.name + ".new")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    result = merge_runs_into_index(run_files, staging_dir, **settings)
+    rewritten = install_partition(staging_dir, out_dir)
+    write_partition_merge(out_dir, {"inputs": inputs, "result": result})
+    return {**result, "merged": True, "rewritten": rewritten}
+
+
+def write_text_index(merged_postings, output_file: Path, lexicon_file: Optional[Path] = None) -> int:
+    """
+    Write merged postings as a sorted text index file.
+    
+    Args:
+        merged_postings: Iterable of (token, postings sorted by doc_id)
+        output_file: Destination index file
+        lexicon_file: Also write the lexicon of the index here, locating each token's line
+        
+    Returns:
+        int: Number of tokens written
+    """
+    token_count = 0
+    offset = 0
+    with open(output_file, 'wb') as f, open(lexicon_file or os.devnull, 'w', encoding='utf-8') as lexicon_out:
+        if lexicon_file:
+            lexicon_out.write(lexicon_header())
+        for token, postings in merged_postings:
+            # Write combined postings
+            line = f"{token}:{format_text_postings(postings)}\n".encode('utf-8')
+            f.write(line)
+            if lexicon_file:
+                lexicon_out.write(format_lexicon_line(token, offset, len(line),
+                                                      *tf_stats([posting[1] for posting in postings])))
+            offset += len(line)
+            token_count += 1
+    
+    return token_count
+
+
+def merge_partial_runs(run_files: List[Path], output_file: Path, positional: bool = False,
+                       fields: bool = False) -> int:
+    """
+    Merge sorted partial index files into one sorted text index file.
+    
+    Args:
+        run_files: Partial index files, each sorted by token
+        output_file: Destination index file
+        positional: The runs hold positions
+        fields: The runs hold field tfs
+        
+    Returns:
+        int: Number of tokens written
+    """
+    return write_text_index(iter_merged_postings(run_files, positional, fields), output_file)
+
+
+def write_binary_index(merged_postings, index_file: Path, lexicon_file: Path,
+                       positions_file: Optional[Path] = None, impact_order: bool = False,
+                       fields_file: Optional[Path] = None) -> int:
+    """
+    Write merged postings in the binary format together with their lexicon.
+    
+    Each token's postings are delta + varint encoded back to back; the lexicon
+    line "token offset length df max_tf total_tf" points at the token's bytes.
+    With a positions file, the positions are encoded there and the lexicon line
+    gets two more columns, "positions_offset positions_length"; with a fields
+    file, the same holds for the field tfs.
+    
+    Args:
+        merged_postings: Iterable of (token, postings sorted by doc_id)
+        index_file: Destination binary index file
+        lexicon_file: Destination lexicon file
+        positions_file: Destination positions file, for positional postings
+        impact_order: Encode each token's postings in impact order (the impact format)
+        fields_file: Destination field tfs file, for field-aware postings
+        
+    Returns:
+        int: Number of tokens written
+    """
+    encode = encode_impact_postings if impact_order else encode_postings
+    # Positional and field-aware postings are never combined, so there is at most one side file
+    side_file, encode_side = (positions_file, encode_positions) if positions_file else (fields_file, encode_fields)
+    token_count = 0
+    offset = 0
+    side_offset = 0
+    with open(index_file, 'wb') as index_out, open(lexicon_file, 'w', encoding='utf-8') as lexicon_out, \
+            open(side_file or os.devnull, 'wb') as side_out:
+        lexicon_out.write(lexicon_header(None if side_file is None else "positions" if positions_file else "fields"))
+        for token, postings in merged_postings:
+            encoded = encode(postings)
+            index_out.write(encoded)
+            side = None
+            if side_file:
+                encoded_side = encode_side(postings)
+                side_out.write(encoded_side)
+                side = (side_offset, len(encoded_side))
+                side_offset += len(encoded_side)
+            lexicon_out.write(format_lexicon_line(token, offset, len(encoded),
+                                                  *tf_stats([posting[1] for posting in postings]), side))
+            offset += len(encoded)
+            token_count += 1
+    
+    return token_count
+
+
+def parse_html_content(html_content, parser: str = "html.parser"):
     """
     Parse HTML content and extract text, handling broken HTML gracefully.
     Returns clean text content from the HTML.
+    
+    Args:
+        html_content: Raw HTML string
+        parser: HTML parser backend, one of HTML_PARSERS
     """
     if not html_content or not html_content.strip():
         return ""
     
     try:
+        if parser == "lxml":
+            return clean_text(extract_text_lxml(html_content)[0])
+        
         # BeautifulSoup can handle broken/malformed HTML
         soup = BeautifulSoup(html_content, 'html.parser')
         
@@ -756,44 +1876,340 @@ def parse_html_content(html_content):
         text = soup.get_text()
         
         # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        clean_text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        return clean_text
+        return clean_text(text)
     except Exception as e:
         print(f"Error parsing HTML: {e}")
         return ""
 
 
-def iter_docs(root, stemmer: Optional[PorterStemmer] = None):
-    """Iterate through all JSON files and create Document objects"""
-    if stemmer is None:
-        stemmer = PorterStemmer()
-    
-    for domain in Path(root).iterdir():
+def iter_doc_files(root):
+    """Iterate through the paths of all crawled JSON files, in build order (sorted, so resumes see the same order)"""
+    for domain in sorted(Path(root).iterdir()):
         if domain.is_dir():  # Filter to specific domain
-            for page in domain.iterdir():
+            for page in sorted(domain.iterdir()):
                 if page.suffix == ".json":
-                    try:
-                        data = json.loads(page.read_text(encoding="utf-8", errors="ignore"))
-                        
-                        # Create Document object with headline and article data
-                        document = Document(
-                            url=data["url"],
-                            content=data["content"],
-                            image=data.get("image", ""),
-                            encoding=data.get("encoding", "utf-8"),
-                            stemmer=stemmer,
-                            headline=data.get("headline", ""),
-                            article=data.get("article", "")
-                        )
-                        
-                        yield document
-                        
-                    except Exception as e:
-                        print(f"Error reading file {page}: {e}")
+                    yield page
+
+
+def new_build_progress() -> Dict:
+    """Progress of a build that has not processed any file yet (recorded in its checkpoints)"""
+    return {"files_done": 0, "last_file": None, "documents": 0, "empty_content": 0, "exact_duplicates": 0,
+            "main_content_missing": 0, "total_tokens": 0, "total_unique_tokens": 0}
+
+
+def skip_done_files(root, files, progress: Dict):
+    """
+    Skip the files a resumed build already processed.
+    
+    Args:
+        root: Root directory of the crawled pages
+        files: Crawl files in build order, as from iter_doc_files
+        progress: Build progress restored from the checkpoint
+        
+    Yields:
+        The remaining files
+        
+    Raises:
+        ValueError: If the crawl no longer starts with the files the checkpoint processed
+    """
+    files = iter(files)
+    done = progress["files_done"]
+    if done:
+        skipped = 0
+        last = None
+        for last in islice(files, done):
+            skipped += 1
+        if skipped < done or last.relative_to(root).as_posix() != progress["last_file"]:
+            raise ValueError(f"Cannot resume: the crawl in {root} changed since the checkpoint "
+                             f"(file {done} was {progress['last_file']})")
+    yield from files
+
+
+def load_doc_file(page: Path) -> Optional[dict]:
+    """
+    Read and decode one crawled JSON file.
+    
+    Returns:
+        The decoded page data, or None if the file is unreadable or has no url/content
+    """
+    try:
+        data = json.loads(page.read_text(encoding="utf-8", errors="ignore"))
+    except Exception as e:
+        print(f"Error reading file {page}: {e}")
+        return None
+    
+    missing = [key for key in ("url", "content") if key not in data]
+    if missing:
+        print(f"Error reading file {page}: missing {', '.join(missing)}")
+        return None
+    return data
+
+
+def content_digest(content: str) -> Optional[bytes]:
+    """Digest identifying a page's content up to whitespace; None for a page without content"""
+    normalized = ' '.join(content.split()) if content else ""
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+def document_from_data(data: dict, analyzer: Optional[Analyzer] = None, parser: str = "html.parser",
+                       content_mode: str = "page") -> Document:
+    """Create a Document object with headline and article data from decoded page data"""
+    return Document(
+        url=data["url"],
+        content=data["content"],
+        image=data.get("image", ""),
+        encoding=data.get("encoding", "utf-8"),
+        analyzer=analyzer,
+        headline=data.get("headline", ""),
+        article=data.get("article", ""),
+        parser=parser,
+        content_mode=content_mode
+    )
+
+
+def iter_docs(root, analyzer: Optional[Analyzer] = None, parser: str = "html.parser", content_mode: str = "page"):
+    """Iterate through all JSON files and create Document objects"""
+    for page in iter_doc_files(root):
+        try:
+            data = json.loads(page.read_text(encoding="utf-8", errors="ignore"))
+            yield document_from_data(data, analyzer, parser, content_mode)
+        except Exception as e:
+            print(f"Error reading file {page}: {e}")
+            continue
+
+
+# Documents between checkpoints of a parallel build, as between the spills of a serial one
+PARALLEL_CHECKPOINT_DOCS = 15000
+
+
+# Per-process state for parallel build workers
+_worker_analyzer = None
+
+
+def _init_build_worker(tokenizer: str = "nltk"):
+    """Give each worker process its own analyzer, whose stem cache lives across its shards"""
+    global _worker_analyzer
+    _worker_analyzer = Analyzer(tokenizer=tokenizer)
+
+
+def _load_shard(pages: List[Path]) -> Tuple[List[dict], float, float]:
+    """
+    Decode the JSON files of one shard (runs on the prefetch thread pool).
+    
+    Returns:
+        Tuple of (decoded pages, wall seconds, thread CPU seconds)
+    """
+    start_wall, start_cpu = time.perf_counter(), time.thread_time()
+    docs = [data for data in map(load_doc_file, pages) if data is not None]
+    return docs, time.perf_counter() - start_wall, time.thread_time() - start_cpu
+
+
+def _index_shard(items: List[Tuple[int, dict]], partial_file: Path, parser: str,
+                 fingerprint_hash: Optional[str], memory_budget_bytes: Optional[int] = None, positional: bool = False,
+                 ngram_policy: Optional[NgramPolicy] = None, partitions: int = 1, fields: bool = False,
+                 content_mode: str = "page"):
+    """
+    Parse, tokenize and fingerprint one shard in a worker process.
+    
+    The shard's postings are written straight to partial_file; only small
+    per-document summaries travel back to the parent process. If the shard's
+    estimated in-memory index exceeds memory_budget_bytes, it is spilled early
+    to extra partial files next to partial_file.
+    
+    Args:
+        items: List of (doc_id, page data) in build order
+        partial_file: Partial index file to write the shard's postings to
+        parser: HTML parser backend
+        fingerprint_hash: SimHash token hash to fingerprint with, or None to skip fingerprints
+        memory_budget_bytes: In-memory index budget of this worker (None for no limit)
+        positional: Build positional postings
+        ngram_policy: N-gram policy to tokenize with
+        partitions: Number of partitions to split the partial files into
+        fields: Build field-aware postings
+        content_mode: What of each page to index, one of CONTENT_MODES
+        
+    Returns:
+        Tuple of (summaries, extra_partial_files, peak_bytes, shard_stats). summaries has
+        one entry per item: (doc_id, fingerprint, total_tokens, unique_tokens, has_content,
+        main_content_missing),
+        or None if the document could not be built; shard_stats holds the shard's
+        stem cache hits and misses and its BuildProfiler stages
+    """
+    shard_index = PostingsAccumulator(positional, fields)
+    profiler = BuildProfiler()
+    stem_cache_before = _worker_analyzer.cache_stats()
+    peak_bytes = 0
+    extra_files = []
+    summaries = []
+    
+    for doc_id, data in items:
+        try:
+            with profiler.stage("parse"):
+                doc = document_from_data(data, _worker_analyzer, parser, content_mode)
+        except Exception as e:
+            print(f"Error building document {data.get('url')}: {e}")
+            summaries.append(None)
+            continue
+        
+        doc.doc_id = doc_id
+        with profiler.stage("tokenize"):
+            doc.tokenize(positional, ngram_policy, fields)
+        fingerprint = None
+        if fingerprint_hash:
+            with profiler.stage("simhash"):
+                fingerprint = doc.get_fingerprint(fingerprint_hash)
+        
+        with profiler.stage("index"):
+            shard_index.add(doc_id, doc.tokens, doc.positions, doc.field_tfs)
+        peak_bytes = max(peak_bytes, shard_index.nbytes)
+        if memory_budget_bytes and shard_index.nbytes >= memory_budget_bytes:
+            spill_file = partial_file.with_name(f"{partial_file.stem}_{len(extra_files)}{partial_file.suffix}")
+            with profiler.stage("offload"):
+                write_partial_index(spill_file, shard_index, partitions)
+            extra_files.append(spill_file)
+            shard_index.clear()
+        
+        summaries.append((doc_id, fingerprint, doc.get_total_tokens(),
+                          doc.get_unique_token_count(), bool(doc.raw_content), doc.main_content_missing))
+    
+    with profiler.stage("offload"):
+        write_partial_index(partial_file, shard_index, partitions)
+    stem_cache = _worker_analyzer.cache_stats()
+    stem_hits = stem_cache["hits"] - stem_cache_before["hits"]
+    stem_misses = stem_cache["misses"] - stem_cache_before["misses"]
+    stem_seconds = stem_cache["stem_seconds"] - stem_cache_before["stem_seconds"]
+    profiler.carve("tokenize", "stem", stem_seconds, stem_seconds, stem_misses)
+    shard_stats = {"stem_hits": stem_hits, "stem_misses": stem_misses, "stages": profiler.stages()}
+    return summaries, extra_files, peak_bytes, shard_stats
+
+
+def build_parallel(data_root: Path, index: "InvertedIndex", workers: int, parser: str = "html.parser",
+                   shard_size: int = 2000, prefetch_threads: int = 4,
+                   progress: Optional[Dict] = None) -> Tuple[int, int, int, int, Dict]:
+    """
+    Build the partial indexes with a pool of worker processes.
+    
+    The crawl is split into shards of shard_size files. A thread pool decodes
+    the JSON of upcoming shards while the process pool parses, tokenizes and
+    fingerprints earlier ones, each shard becoming one partial index file.
+    Exact copies, document IDs, near-duplicate detection and metadata are
+    handled in this process in crawl order, so the result matches a serial
+    build; exact copies are never sent to the workers. The index's
+    memory budget is split evenly between the workers. Every
+    PARALLEL_CHECKPOINT_DOCS documents, the build is checkpointed with the
+    partial files of the shards finished so far.
+    
+    Args:
+        data_root: Root directory of the crawled pages
+        index: InvertedIndex to register documents and partial files with
+        workers: Number of worker processes
+        parser: HTML parser backend
+        shard_size: Number of files per shard
+        prefetch_threads: Number of threads decoding JSON ahead of the workers
+        progress: Build progress restored from a checkpoint; the build continues after its files
+        
+    Returns:
+        Tuple of (documents processed, documents with empty content, total tokens, total unique tokens,
+        stem cache statistics summed over the workers), counted from the start of a resumed build
+    """
+    progress = dict(progress or new_build_progress())
+    pages = list(skip_done_files(data_root, iter_doc_files(data_root), progress))
+    shards = [pages[i:i + shard_size] for i in range(0, len(pages), shard_size)]
+    print(f"Indexing {len(pages)} files in {len(shards)} shards with {workers} worker processes...")
+    
+    fingerprint_hash = index.duplicate_detector.token_hash if index.duplicate_detector else None
+    max_in_flight = workers * 2  # bounds how many decoded shards are held in memory
+    worker_budget = index.memory_budget_bytes // workers if index.memory_budget_bytes else None
+    # Partial files of the shards registered so far; reserved files of shards still in flight are not included
+    finished_files = list(index.partial_index_files)
+    docs_since_checkpoint = 0
+    stem_hits = stem_misses = 0
+    
+    with ThreadPoolExecutor(max_workers=prefetch_threads) as io_pool, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_build_worker,
+                                initargs=(index.tokenizer,)) as pool:
+        remaining = iter(shards)
+        loading = deque((io_pool.submit(_load_shard, shard), shard) for shard in islice(remaining, max_in_flight))
+        indexing = deque()
+        
+        while loading or indexing:
+            # Hand decoded shards to the workers, assigning doc ids in crawl order
+            while loading and len(indexing) < max_in_flight:
+                items = []
+                shard_metadata = []
+                shard_copies = 0
+                future, shard = loading.popleft()
+                shard_docs, decode_wall, decode_cpu = future.result()
+                index.profiler.merge({"json_decode": {"wall_s": decode_wall, "cpu_s": decode_cpu,
+                                                      "items": len(shard_docs)}})
+                for data in shard_docs:
+                    url = Document._clean_url(data["url"])
+                    if index.alias_exact_duplicate(url, data["content"]):
+                        shard_copies += 1
                         continue
+                    doc_id = index.url_mapper.get_id(url)
+                    items.append((doc_id, data))
+                    shard_metadata.append((url, data.get("headline", ""), data.get("article", ""), data.get("image", "")))
+                
+                partial_file = index.reserve_partial_index_file()
+                future = pool.submit(_index_shard, items, partial_file, parser, fingerprint_hash, worker_budget,
+                                     index.positional, index.ngram_policy, index.partitions, index.fields,
+                                     index.content_mode)
+                # Digests seen up to the end of this shard, so checkpoints leave out those of later shards
+                indexing.append((future, shard_metadata, partial_file, shard, shard_copies,
+                                 len(index.content_digests)))
+                
+                next_shard = next(remaining, None)
+                if next_shard is not None:
+                    loading.append((io_pool.submit(_load_shard, next_shard), next_shard))
+            
+            # Register finished shards in submission order
+            future, shard_metadata, partial_file, shard, shard_copies, shard_digests = indexing.popleft()
+            summaries, spill_files, peak_bytes, shard_stats = future.result()
+            index.record_worker_spills(spill_files, peak_bytes)
+            finished_files.extend([partial_file, *spill_files])
+            index.profiler.merge(shard_stats["stages"])
+            stem_hits += shard_stats["stem_hits"]
+            stem_misses += shard_stats["stem_misses"]
+            # A URL repeated within the shard has one summary and one metadata entry per page
+            for summary, (url, headline, article, image) in zip(summaries, shard_metadata):
+                if summary is None:
+                    continue
+                doc_id, fingerprint, doc_tokens, doc_unique_tokens, has_content, main_content_missing = summary
+                with index.profiler.stage("index"):
+                    index.register_document(doc_id, url, headline, article, image, fingerprint=fingerprint)
+                
+                progress["documents"] += 1
+                progress["total_tokens"] += doc_tokens
+                progress["total_unique_tokens"] += doc_unique_tokens
+                if not has_content:
+                    progress["empty_content"] += 1
+                if main_content_missing:
+                    progress["main_content_missing"] += 1
+                docs_since_checkpoint += 1
+            progress["exact_duplicates"] += shard_copies
+            progress["files_done"] += len(shard)
+            progress["last_file"] = shard[-1].relative_to(data_root).as_posix()
+            
+            print(f"Processed {progress['documents']} documents...")
+            index.profiler.tick(progress["documents"])
+            if docs_since_checkpoint >= PARALLEL_CHECKPOINT_DOCS:
+                index.build_progress = dict(progress)
+                index.write_checkpoint(finished_files, shard_digests)
+                docs_since_checkpoint = 0
+    
+    index.build_progress = progress
+    stem_cache = {
+        "hits": stem_hits,
+        "misses": stem_misses,
+        # Every miss adds one stem to some worker's cache
+        "size": stem_misses,
+        "hit_rate": stem_hits / (stem_hits + stem_misses) if stem_hits + stem_misses else 0.0,
+    }
+    return (progress["documents"], progress["empty_content"], progress["total_tokens"],
+            progress["total_unique_tokens"], stem_cache)
 
 def get_num_docs(root: Path) -> int:
     """
@@ -820,17 +2236,14 @@ def find_near_duplicates_for_doc(doc: Document, duplicate_detector: NearDuplicat
     Returns:
         List of tuples: (doc_id, url, hamming_distance)
     """
-    fingerprint = doc.get_fingerprint()
+    fingerprint = doc.get_fingerprint(duplicate_detector.token_hash)
     doc_id = doc.set_doc_id(url_mapper)
     
-    duplicates = []
-    for stored_fp, doc_ids in duplicate_detector.fingerprint_to_docs.items():
-        hamming_distance = duplicate_detector._hamming_distance(fingerprint, stored_fp)
-        if hamming_distance <= duplicate_detector.similarity_threshold:
-            for dup_doc_id in doc_ids:
-                if dup_doc_id != doc_id:
-                    url = url_mapper.get_url(dup_doc_id)
-                    duplicates.append((dup_doc_id, url, hamming_distance))
+    duplicates = [
+        (dup_doc_id, url_mapper.get_url(dup_doc_id), hamming_distance)
+        for dup_doc_id, hamming_distance in duplicate_detector.find_near_duplicates_with_distance(fingerprint)
+        if dup_doc_id != doc_id
+    ]
     
     # Sort by Hamming distance (closest first)
     duplicates.sort(key=lambda x: x[2])
@@ -842,26 +2255,367 @@ def load_duplicate_detector(index_dir: Path, similarity_threshold: int = 3) -> O
     Load a NearDuplicateDetector from saved fingerprints.
     
     Args:
-        index_dir: Directory containing the fingerprints.txt file
+        index_dir: Directory containing the fingerprints file (fingerprints.bin, or
+            fingerprints.txt for indexes built before the binary format)
         similarity_threshold: Threshold for near-duplicate detection
         
     Returns:
         NearDuplicateDetector instance or None if fingerprints file doesn't exist
     """
-    fingerprint_file = index_dir / "fingerprints.txt"
+    fingerprint_file = index_dir / FINGERPRINTS_FILE
+    if not fingerprint_file.exists():
+        fingerprint_file = index_dir / LEGACY_FINGERPRINTS_FILE
     if not fingerprint_file.exists():
         return None
     
-    detector = NearDuplicateDetector(similarity_threshold=similarity_threshold)
+    # Indexes built before the manifest recorded the token hash used MD5
+    token_hash = load_index_manifest(index_dir).get("simhash") or "md5"
+    detector = NearDuplicateDetector(similarity_threshold=similarity_threshold, token_hash=token_hash)
     detector.load_fingerprints(fingerprint_file)
     return detector
 
 
 
-def main():
-    """Build inverted index from the dataset"""
+def update_segments(data_root: Path, index_dir: Path, parser: str = "html.parser", index_format: str = "text",
+                    compact_below: Optional[int] = None, tokenizer: str = "nltk",
+                    ngram_policy: Optional[NgramPolicy] = None, content_mode: str = "page") -> Optional[str]:
+    """
+    Index new and changed crawl files into a new immutable segment.
+    
+    Crawl files are compared with the catalog by size and modification time,
+    then by content hash, so rewritten but identical files are not reindexed.
+    The new segment tombstones the documents of changed and deleted files, and
+    the older document of any URL that was crawled again. Doc IDs are dense and
+    never handed out twice.
+    
+    Segments hold plain postings: no positions, field tfs or near-duplicate
+    fingerprints, and every copy of a page is indexed. The analysis settings
+    are recorded in the catalog by the first segment and every later segment
+    must use the same ones.
+    
+    Args:
+        data_root: Crawled pages directory
+        index_dir: Segmented index directory
+        parser: HTML parser backend, one of HTML_PARSERS
+        index_format: Segment postings format; fixed by the first segment
+        compact_below: Afterwards, merge the segments holding fewer documents than this
+        tokenizer: Word tokenizer, one of TOKENIZERS; fixed by the first segment
+        ngram_policy: Which n-grams to index; fixed by the first segment. Pruning by
+            document frequency (min_df) needs a full build and is rejected
+        content_mode: What of each page to index, one of CONTENT_MODES; fixed by the first segment
+        
+    Returns:
+        Name of the new segment, or None if nothing changed
+    """
+    ngram_policy = ngram_policy or DEFAULT_NGRAM_POLICY
+    if ngram_policy.min_df > 1:
+        # A term's document frequency is spread over segments that are merged without pruning
+        raise ValueError("N-gram pruning by document frequency needs a full build, not an incremental one")
+    index_dir.mkdir(parents=True, exist_ok=True)
+    catalog = load_segment_catalog(index_dir, index_format)
+    if catalog["format"] != index_format:
+        raise ValueError(f"Index at {index_dir} holds {catalog['format']} segments, cannot add a {index_format} segment")
+    settings = {"tokenizer": tokenizer, "ngram_policy": ngram_policy.to_dict(), "content": content_mode}
+    # Catalogs written before a setting was recorded used its default
+    legacy_settings = {"tokenizer": "nltk", "ngram_policy": DEFAULT_NGRAM_POLICY.to_dict(), "content": "page"}
+    for key, value in settings.items():
+        catalog_value = catalog.setdefault(key, value if not catalog["segments"] else legacy_settings[key])
+        if catalog_value != value:
+            raise ValueError(f"Index at {index_dir} was built with {key} {catalog_value}, cannot add a segment "
+                             f"built with {key} {value}")
+    
+    mapping_file = index_dir / "url_mapping.txt"
+    if catalog["segments"] and mapping_file.exists():
+        url_mapper = URLMapper.load(mapping_file, "dense")
+    else:
+        url_mapper = URLMapper("dense")
+    # IDs of deleted URLs are gone from the mapping but must not be reused
+    url_mapper.next_id = max(url_mapper.next_id, catalog["next_doc_id"])
+    first_new_id = url_mapper.next_id
+    
+    files = catalog["files"]
+    changed = []
+    seen = set()
+    for page in iter_doc_files(data_root):
+        key = page.relative_to(data_root).as_posix()
+        seen.add(key)
+        stat = page.stat()
+        state = files.get(key)
+        if state and state["mtime_ns"] == stat.st_mtime_ns and state["size"] == stat.st_size:
+            continue
+        digest = hashlib.sha1(page.read_bytes()).hexdigest()
+        if state and state["sha1"] == digest:
+            state["mtime_ns"] = stat.st_mtime_ns
+            continue
+        changed.append((key, page, stat, digest))
+    removed = [key for key in files if key not in seen]
+    
+    if not changed and not removed:
+        # Keep refreshed modification times so unchanged files are not hashed again
+        write_segment_catalog(index_dir, catalog)
+        print(f"Index at {index_dir} is up to date")
+        return None
+    
+    # Documents of files that changed or disappeared
+    replaced_ids = {files[key]["doc_id"] for key, *_ in changed if key in files}
+    for key in removed:
+        replaced_ids.add(files.pop(key)["doc_id"])
+    
+    segment_name = f"seg_{catalog['next_segment']:06d}"
+    segment_dir = index_dir / SEGMENTS_DIR / segment_name
+    segment_dir.mkdir(parents=True)
+    index = InvertedIndex(url_mapper, index_dir=segment_dir, enable_near_duplicate_detection=False,
+                          index_format=index_format, ngram_policy=ngram_policy, tokenizer=tokenizer,
+                          exact_dedup=False, content_mode=content_mode)
+    tombstones = set()
+    
+    for key, page, stat, digest in changed:
+        doc_id = None
+        data = load_doc_file(page)
+        if data is not None:
+            doc = document_from_data(data, get_analyzer(tokenizer), parser, content_mode)
+            old_id = url_mapper.url_to_id.get(doc.url)
+            if old_id is not None and old_id < first_new_id:
+                # URL crawled again: the new version replaces the indexed one
+                tombstones.add(old_id)
+                url_mapper.remove(doc.url)
+            doc.tokenize(ngram_policy=ngram_policy)
+            index.add_document(doc)
+            doc_id = doc.doc_id
+        files[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest, "doc_id": doc_id}
+    
+    # A replaced document stays live while another crawl file still holds it
+    still_referenced = {state["doc_id"] for state in files.values()}
+    for doc_id in replaced_ids - still_referenced:
+        if doc_id is None:
+            continue
+        tombstones.add(doc_id)
+        url = url_mapper.get_url(doc_id)
+        if url is not None:
+            url_mapper.remove(url)
+    
+    index.finalize()
+    for partial_file in index.partial_index_files:
+        partial_file.unlink()
+    write_tombstones(segment_dir, tombstones)
+    
+    catalog["segments"].append({"name": segment_name, "docs": len(index.doc_store), "tombstones": len(tombstones)})
+    catalog["next_segment"] += 1
+    catalog["next_doc_id"] = url_mapper.next_id
+    write_url_mapping(url_mapper, mapping_file)
+    write_segment_catalog(index_dir, catalog)
+    write_index_manifest(index_dir, {
+        "format": SEGMENTED_FORMAT,
+        "segment_format": index_format,
+        "doc_ids": "dense",
+        "tokenizer": tokenizer,
+        "ngram_policy": ngram_policy.to_dict(),
+        "content": content_mode,
+    })
+    
+    print(f"\n=== SEGMENT {segment_name} ===")
+    print(f"Changed or new files: {len(changed)}")
+    print(f"Deleted files: {len(removed)}")
+    print(f"Documents indexed: {len(index.doc_store)}")
+    print(f"Documents tombstoned: {len(tombstones)}")
+    print(f"Live segments: {len(catalog['segments'])}")
+    
+    if compact_below:
+        compact_segments(index_dir, max_docs=compact_below)
+    return segment_name
+
+
+def compact_segments(index_dir: Path, max_docs: Optional[int] = None) -> Optional[str]:
+    """
+    Merge segments into a single new segment, dropping tombstoned documents.
+    
+    The catalog is swapped atomically and the merged segments are only retired:
+    they are deleted by the next compaction, so a search side that refreshes its
+    SegmentedIndex before each query (as search_index does) keeps serving from
+    the same directory while this runs.
+    
+    Args:
+        index_dir: Segmented index directory
+        max_docs: Only merge segments holding fewer documents than this (None merges all)
+        
+    Returns:
+        Name of the merged segment, or None if there was nothing to merge
+    """
+    catalog = load_segment_catalog(index_dir)
+    index_format = catalog["format"]
+    selected = [segment for segment in catalog["segments"] if max_docs is None or segment["docs"] < max_docs]
+    if len(selected) < (1 if max_docs is None else 2):
+        return None
+    
+    segments_root = index_dir / SEGMENTS_DIR
+    readers = {segment["name"]: SegmentReader(segments_root / segment["name"], index_format)
+               for segment in catalog["segments"]}
+    dead = set()
+    for reader in readers.values():
+        dead |= reader.load_tombstones()
+    
+    segment_name = f"seg_{catalog['next_segment']:06d}"
+    segment_dir = segments_root / segment_name
+    segment_dir.mkdir()
+    
+    # Each segment's live postings become a sorted run, merged like partial indexes
+    runs = []
+    doc_store = DocStoreWriter(segment_dir)
+    merged_doc_ids = set()
+    tombstones = set()
+    for segment in selected:
+        reader = readers[segment["name"]]
+        store = reader.load_metadata()
+        for doc_id, entry in list(store.items()):
+            merged_doc_ids.add(int(doc_id))
+            if int(doc_id) not in dead:
+                article = store.get(doc_id).get("article", "")
+                doc_store.add(int(doc_id), entry.get("url", ""), entry.get("headline", ""), article,
+                              entry.get("image", ""), excerpt=entry.get("excerpt"))
+        tombstones |= reader.load_tombstones()
+        
+        run_file = segment_dir / f"partial_index_{len(runs)}.txt"
+        with open(run_file, 'w', encoding='utf-8') as f:
+            for token, postings in reader.iter_postings():
+                postings_str = ','.join(f"{doc_id}:{tf}" for doc_id, tf in postings if doc_id not in dead)
+                if postings_str:
+                    f.write(f"{token}:{postings_str}\n")
+        runs.append(run_file)
+    
+    if index_format != "text":
+        write_binary_index(iter_merged_postings(runs), segment_dir / INDEX_FILES[index_format],
+                           segment_dir / "lexicon.txt", impact_order=index_format == "impact")
+    else:
+        write_text_index(iter_merged_postings(runs), segment_dir / INDEX_FILES["text"], segment_dir / "lexicon.txt")
+    for run_file in runs:
+        run_file.unlink()
+    
+    doc_store.close()
+    # Tombstones of documents dropped here are done; the rest still apply to older segments
+    tombstones -= merged_doc_ids
+    write_tombstones(segment_dir, tombstones)
+    write_index_manifest(segment_dir, {
+        "format": index_format,
+        "index_file": INDEX_FILES[index_format],
+        "doc_ids": "dense",
+    })
+    
+    selected_names = {segment["name"] for segment in selected}
+    position = next(i for i, segment in enumerate(catalog["segments"]) if segment["name"] in selected_names)
+    remaining = [segment for segment in catalog["segments"] if segment["name"] not in selected_names]
+    remaining.insert(position, {"name": segment_name, "docs": len(doc_store), "tombstones": len(tombstones)})
+    catalog["segments"] = remaining
+    catalog["next_segment"] += 1
+    # Readers may still hold the merged segments until they see the new catalog
+    previously_retired = catalog.get("retired", [])
+    catalog["retired"] = sorted(selected_names)
+    write_segment_catalog(index_dir, catalog)
+    
+    for name in previously_retired:
+        shutil.rmtree(segments_root / name, ignore_errors=True)
+    
+    print(f"Compacted {len(selected)} segments into {segment_name} "
+          f"({len(doc_store)} documents, {len(merged_doc_ids) - len(doc_store)} dropped)")
+    return segment_name
+
+
+def load_url_mapper(index_dir: Path, id_mode: str, checkpoint: Optional[Dict] = None) -> URLMapper:
+    """
+    Create the URLMapper for a build.
+    
+    Dense IDs are kept stable across builds by reserving the IDs of the URL
+    mapping of a previous dense build in index_dir (see URLMapper.reserve);
+    hash IDs are always recomputed. A resumed build continues from the URL
+    mapping and aliases of its checkpoint.
+    """
+    if checkpoint:
+        url_mapper = URLMapper.load(index_dir / checkpoint["url_mapping"], id_mode,
+                                    aliases_file=index_dir / checkpoint["url_aliases"])
+    else:
+        url_mapper = URLMapper(id_mode)
+    mapping_file = index_dir / "url_mapping.txt"
+    if id_mode == "dense" and mapping_file.exists() and load_index_manifest(index_dir).get("doc_ids") == "dense":
+        url_mapper.reserve(mapping_file)
+        print(f"Keeping the dense doc ids of {mapping_file} ({len(url_mapper.reserved)} URLs not seen yet)")
+    return url_mapper
+
+
+def report_tokenizer_parity(data_root: Path, sample: int, parser: str = "html.parser"):
+    """
+    Print how the regex tokenizer's alphanumeric tokens differ from NLTK's.
+    
+    Args:
+        data_root: Crawled pages directory
+        sample: Number of crawled pages to compare on
+        parser: HTML parser backend used to extract the page text
+    """
+    texts = []
+    for doc in islice(iter_docs(data_root, parser=parser), sample):
+        texts.extend([doc.parsed_text, doc.important_text])
+    
+    nltk_analyzer, regex_analyzer = Analyzer(tokenizer="nltk"), Analyzer(tokenizer="regex")
+    timings = {}
+    for analyzer in (nltk_analyzer, regex_analyzer):
+        start = time.perf_counter()
+        for text in texts:
+            analyzer.tokenize(text)
+        timings[analyzer.tokenizer] = time.perf_counter() - start
+    report = tokenizer_parity(texts)
+    
+    print(f"\n=== TOKENIZER PARITY ({len(texts) // 2} pages) ===")
+    print(f"nltk:  {report['nltk_tokens']:,} alphanumeric tokens in {timings['nltk']:.2f} s")
+    print(f"regex: {report['regex_tokens']:,} alphanumeric tokens in {timings['regex']:.2f} s")
+    print(f"Texts tokenized identically: {report['identical_texts']:,} of {report['texts']:,}")
+    print(f"Tokens only nltk produced: {report['nltk_only']:,} "
+          f"({report['nltk_only'] / max(report['nltk_tokens'], 1):.3%})")
+    print(f"Tokens only regex produced: {report['regex_only']:,} "
+          f"({report['regex_only'] / max(report['regex_tokens'], 1):.3%})")
+    for side in ("nltk", "regex"):
+        top = report[f"top_{side}_only"]
+        if top:
+            print(f"Most frequent {side}-only tokens: " + ", ".join(f"{token} ({n})" for token, n in top))
+
+
+def main(workers: int = 1, parser: str = "html.parser", shard_size: int = 2000,
+         data_root: Optional[Path] = None, index_dir: Optional[Path] = None, index_format: str = "text",
+         memory_budget_mb: Optional[float] = None, doc_ids: str = "hash", positional: bool = False,
+         ngram_policy: Optional[NgramPolicy] = None, simhash_compat: bool = False, tokenizer: str = "nltk",
+         profile_sample: Optional[int] = None, resume: bool = False,
+         champions: Optional[int] = DEFAULT_CHAMPION_LIST_SIZE, partitions: int = 1,
+         merge_workers: Optional[int] = None, fields: bool = False, exact_dedup: bool = True,
+         content_mode: str = "page"):
+    """
+    Build inverted index from the dataset
+    
+    Args:
+        workers: Number of worker processes; 1 builds serially in this process
+        parser: HTML parser backend, one of HTML_PARSERS
+        shard_size: Files per shard in a parallel build
+        data_root: Crawled pages directory (defaults to the crawler's downloaded_pages)
+        index_dir: Output directory (defaults to the project's index/ directory)
+        index_format: Final index format, one of INDEX_FORMATS
+        memory_budget_mb: Spill to disk by estimated memory use instead of every 15000 documents
+        doc_ids: Document ID assignment mode, one of DOC_ID_MODES
+        positional: Index unigrams with positions (for phrase queries) instead of n-grams
+        ngram_policy: Which n-grams to index (default: bigrams and trigrams, no pruning)
+        simhash_compat: Fingerprint with MD5 token hashes, bit-identical to earlier builds
+        tokenizer: Word tokenizer, one of TOKENIZERS
+        profile_sample: Run cProfile over one in every this many documents (serial builds only)
+        resume: Continue an interrupted build from the checkpoint in index_dir, if there is one;
+            the other settings must match those of the interrupted build
+        champions: Champion list size of the champion tier (None for none); ignored for the impact
+            format, whose postings are already in champion order
+        partitions: Split the final index into this many term-hash partitions, merged concurrently
+        merge_workers: Processes merging the partitions (default: one per partition, up to the number of CPUs)
+        fields: Keep headline, important and body tfs apart in every posting, for query-time field weights
+        exact_dedup: Index only the first of pages with the same content and record the URLs of the others
+            as its aliases in url_aliases.txt, before parsing them; False indexes every copy
+        content_mode: "page" indexes all text of each page; "main" only its article body and headline,
+            falling back to all text for pages without a recognizable article body
+    """
     # Default to DEV folder relative to project root, or use absolute path if provided
-    data_root = Path(__file__).parent.parent.parent / "current_crawler" / "web_crawler" / "data" / "downloaded_pages"
+    if data_root is None:
+        data_root = DEFAULT_DATA_ROOT
     print(f"Building inverted index from dataset at: {data_root}")
     # Check if the directory exists
     if not data_root.exists():
@@ -869,57 +2623,120 @@ def main():
         return
     
     # Initialize components
-    stemmer = PorterStemmer()  # NLTK Porter stemmer for tokenization
-    url_mapper = URLMapper()
-    index = InvertedIndex(url_mapper, offload_threshold=15000)
+    analyzer = get_analyzer(tokenizer)  # Shared tokenizer and memoizing Porter stemmer
+    stem_seconds_before, stem_misses_before = analyzer.stem_seconds, analyzer.cache_stats()["misses"]
+    profiler = BuildProfiler(profile_every=profile_sample if workers <= 1 else None)
+    index_dir = index_dir or DEFAULT_INDEX_DIR
+    checkpoint = load_checkpoint(index_dir) if resume else None
+    url_mapper = load_url_mapper(index_dir, doc_ids, checkpoint)
+    if checkpoint:
+        progress = dict(checkpoint["progress"])
+        print(f"Resuming from checkpoint {checkpoint['generation']}: {progress['files_done']} files, "
+              f"{progress['documents']} documents already indexed")
+    else:
+        if resume:
+            print(f"No checkpoint in {index_dir}, building from the start")
+        progress = new_build_progress()
+    index = InvertedIndex(url_mapper, offload_threshold=None if memory_budget_mb else 15000, index_dir=index_dir,
+                          index_format=index_format, memory_budget_mb=memory_budget_mb, positional=positional,
+                          ngram_policy=ngram_policy, simhash_token_hash="md5" if simhash_compat else "blake2b",
+                          tokenizer=tokenizer, profiler=profiler, checkpoint=checkpoint,
+                          champion_list_size=None if index_format == "impact" else champions,
+                          partitions=partitions, merge_workers=merge_workers, fields=fields,
+                          exact_dedup=exact_dedup, content_mode=content_mode)
     
-    count = 0
-    empty_content = 0
-    total_tokens = 0
-    total_unique_tokens = 0
+    try:
+        if workers > 1:
+            count, empty_content, total_tokens, total_unique_tokens, stem_cache = build_parallel(
+                data_root, index, workers, parser=parser, shard_size=shard_size, progress=progress)
+        else:
+            # Offloads to disk checkpoint this progress, so it is counted before a document is added
+            index.build_progress = progress
+            count = progress["documents"]
+            # Process documents and build index
+            for page in skip_done_files(data_root, iter_doc_files(data_root), progress):
+                progress["files_done"] += 1
+                progress["last_file"] = page.relative_to(data_root).as_posix()
+                with profiler.stage("json_decode"):
+                    data = load_doc_file(page)
+                if data is None:
+                    continue
+                with profiler.stage("dedup"):
+                    is_copy = index.alias_exact_duplicate(Document._clean_url(data["url"]), data["content"])
+                if is_copy:
+                    progress["exact_duplicates"] += 1
+                    continue
+                with profiler.sample(count + 1):
+                    try:
+                        with profiler.stage("parse"):
+                            doc = document_from_data(data, analyzer, parser, content_mode)
+                    except Exception as e:
+                        print(f"Error reading file {page}: {e}")
+                        continue
+                    count += 1
+            
+                    # Tokenize the document (with stemming and important words)
+                    with profiler.stage("tokenize"):
+                        doc.tokenize(positional, ngram_policy, fields)
+                    if index.duplicate_detector:
+                        # Cached on the document for add_document
+                        with profiler.stage("simhash"):
+                            doc.get_fingerprint(index.duplicate_detector.token_hash)
+                
+                    progress["documents"] = count
+                    progress["total_tokens"] += doc.get_total_tokens()
+                    progress["total_unique_tokens"] += doc.get_unique_token_count()
+                    if not doc.raw_content:
+                        progress["empty_content"] += 1
+                    if doc.main_content_missing:
+                        progress["main_content_missing"] += 1
+            
+                    # Add document to index (skip_duplicates=False means we index all documents, even duplicates)
+                    # Set skip_duplicates=True if you want to skip near-duplicate documents
+                    with profiler.stage("index"):
+                        index.add_document(doc, skip_duplicates=False)
+                profiler.tick(count)
+        
+                # Show progress every 1000 documents
+                if count % 1000 == 0:
+                    print(f"Processed {count} documents...")
+            
+                # Show details for the first few documents
+                if count <= 3:
+                    print(f"\n--- Sample Document {count} ---")
+                    print(f"URL: {doc.url}")
+                    print(f"Encoding: {doc.encoding}")
+                    print(f"Raw content length: {len(doc.raw_content)} chars")
+                    print(f"Parsed text length: {len(doc.parsed_text)} chars")
+                    print(f"Total tokens: {doc.get_total_tokens()}")
+                    print(f"Unique tokens: {doc.get_unique_token_count()}")
+                    print(f"Parsed text preview: {doc.parsed_text[:200]}...")
+                    print(f"First 10 tokens: {list(doc.tokens.keys())[:10]}")
+                    # Show top 5 most frequent tokens
+                    sorted_tokens = sorted(doc.tokens.items(), key=lambda x: x[1][0] + x[1][1], reverse=True)
+                    print(f"Top 5 frequent tokens: {[(t, n+i) for t, (n, i) in sorted_tokens[:5]]}")
+                    print(f"Document object: {doc}")
+            empty_content = progress["empty_content"]
+            total_tokens = progress["total_tokens"]
+            total_unique_tokens = progress["total_unique_tokens"]
     
-    # Process documents and build index
-    for doc in iter_docs(data_root, stemmer):
-        count += 1
-        
-        # Tokenize the document (with stemming and important words)
-        doc.tokenize()
-        
-        # Add document to index (skip_duplicates=False means we index all documents, even duplicates)
-        # Set skip_duplicates=True if you want to skip near-duplicate documents
-        index.add_document(doc, skip_duplicates=False)
-        
-        total_tokens += doc.get_total_tokens()
-        total_unique_tokens += doc.get_unique_token_count()
-        
-        if not doc.raw_content:
-            empty_content += 1
-        
-        # Show progress every 1000 documents
-        if count % 1000 == 0:
-            print(f"Processed {count} documents...")
-            
-        # Show details for the first few documents
-        if count <= 3:
-            print(f"\n--- Sample Document {count} ---")
-            print(f"URL: {doc.url}")
-            print(f"Encoding: {doc.encoding}")
-            print(f"Raw content length: {len(doc.raw_content)} chars")
-            print(f"Parsed text length: {len(doc.parsed_text)} chars")
-            print(f"Total tokens: {doc.get_total_tokens()}")
-            print(f"Unique tokens: {doc.get_unique_token_count()}")
-            print(f"Parsed text preview: {doc.parsed_text[:200]}...")
-            print(f"First 10 tokens: {list(doc.tokens.keys())[:10]}")
-            # Show top 5 most frequent tokens
-            sorted_tokens = sorted(doc.tokens.items(), key=lambda x: x[1][0] + x[1][1], reverse=True)
-            print(f"Top 5 frequent tokens: {[(t, n+i) for t, (n, i) in sorted_tokens[:5]]}")
-            print(f"Document object: {doc}")
-    
-    # Finalize index (offload remaining and merge)
-    print(f"\nFinalizing index...")
-    index.finalize()
-    index.save_url_mapping()
-    index.save_fingerprints()
+        # Finalize index (offload remaining and merge)
+        print(f"\nFinalizing index...")
+        index.finalize()
+    except BaseException:
+        # Leave the unfinished files as a crashed process would, for a resume to cut back to its checkpoint
+        index.doc_store.close_unfinished()
+        raise
+    with profiler.stage("save"):
+        index.save_url_mapping()
+        index.save_fingerprints()
+    # Until here an interrupted build can still resume from its last checkpoint
+    clear_checkpoint(index.index_dir)
+    profiler.tick(count, force=True)
+    if workers <= 1:
+        stem_seconds = analyzer.stem_seconds - stem_seconds_before
+        profiler.carve("tokenize", "stem", stem_seconds, stem_seconds,
+                       analyzer.cache_stats()["misses"] - stem_misses_before)
     
     # Calculate statistics
     index_size_kb = index.get_index_size_kb()
@@ -928,6 +2745,11 @@ def main():
     print(f"\n=== INDEX BUILDING RESULTS ===")
     print(f"Total documents processed: {count}")
     print(f"Documents with empty content: {empty_content}")
+    if index.exact_dedup:
+        print(f"Exact copies skipped (URL aliases): {index.build_progress['exact_duplicates']}")
+    if content_mode == "main":
+        print(f"Documents without an article body, indexed by their full text: "
+              f"{index.build_progress['main_content_missing']}")
     print(f"Total tokens across all documents: {total_tokens:,}")
     print(f"Total unique tokens across all documents: {total_unique_tokens:,}")
     if count > 0:
@@ -938,6 +2760,65 @@ def main():
     print(f"Number of indexed documents: {count}")
     print(f"Number of unique tokens: {unique_tokens_in_index:,}")
     print(f"Total size of index on disk: {index_size_kb:.2f} KB")
+    if index.partitions > 1:
+        print(f"Partitions: {index.partitions} ({index.merge_workers} merge workers), "
+              f"{min(index.partition_terms):,} to {max(index.partition_terms):,} terms each")
+        print(f"Partitions merged: {index.partitions_merged}, rewritten: {index.partitions_rewritten}")
+    
+    memory_stats = index.get_memory_statistics()
+    print(f"\n=== MEMORY STATISTICS ===")
+    if memory_stats['memory_budget_mb']:
+        print(f"Memory budget: {memory_stats['memory_budget_mb']:.1f} MB")
+    print(f"Peak in-memory index (estimated): {memory_stats['peak_memory_mb']:.1f} MB")
+    print(f"Spills to disk: {memory_stats['spill_count']}")
+    
+    print(f"\n=== TEXT ANALYSIS ===")
+    if workers <= 1:
+        stem_cache = analyzer.cache_stats()
+    print(f"Tokenizer: {tokenizer}")
+    print(f"Stem cache: {format_cache_stats(stem_cache)}")
+    
+    report = profiler.report(count, workers, extra={
+        "stem_cache": {key: stem_cache[key] for key in ("hits", "misses", "hit_rate")},
+        "spills": memory_stats["spill_count"],
+    })
+    report_path = profiler.write_report(index.index_dir, report)
+    print(f"\n=== BUILD PROFILE ===")
+    if workers > 1:
+        print(f"(stage times are summed over {workers} worker processes)")
+    print(format_stage_table(report))
+    print(f"Wall time: {report['wall_s']:.2f} s ({report['docs_per_s']} docs/s)")
+    if report["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {report['peak_rss_mb']:.1f} MB")
+    if report["peak_rss_children_mb"] is not None:
+        print(f"Peak RSS of a worker process: {report['peak_rss_children_mb']:.1f} MB")
+    if profiler.profiled_docs:
+        print(f"cProfile capture of {profiler.profiled_docs} documents saved next to the index")
+    print(f"Profile report saved to {report_path}")
+    
+    if not positional:
+        ngram_stats = index.ngram_stats
+        print(f"\n=== N-GRAM POLICY ===")
+        print(f"Policy: {index.ngram_policy}")
+        print(f"N-gram terms in the merged postings: {ngram_stats['ngram_terms']:,}")
+        if ngram_stats['ngram_terms']:
+            kept_terms = ngram_stats['ngram_terms'] - ngram_stats['pruned_terms']
+            kept_postings = ngram_stats['ngram_postings'] - ngram_stats['pruned_postings']
+            print(f"N-gram terms pruned (df < {index.ngram_policy.min_df}): {ngram_stats['pruned_terms']:,} "
+                  f"({ngram_stats['pruned_terms'] / ngram_stats['ngram_terms']:.1%})")
+            print(f"N-gram terms kept: {kept_terms:,}")
+            # Share of document/n-gram matches the pruned index can still answer
+            print(f"N-gram postings kept (phrase recall): {kept_postings:,} of {ngram_stats['ngram_postings']:,} "
+                  f"({kept_postings / ngram_stats['ngram_postings']:.1%})")
+    
+    if index.champion_list_size:
+        champion_stats = index.champion_stats
+        print(f"\n=== CHAMPION TIER ===")
+        print(f"Champion list size: {index.champion_list_size}")
+        print(f"Terms with truncated champion lists: {champion_stats['truncated_terms']:,} "
+              f"of {champion_stats['terms']:,}")
+        print(f"Champion postings: {champion_stats['postings']:,} "
+              f"({sum((d / CHAMPIONS_FILE).stat().st_size for d in index.final_index_dirs()) / 1024:.1f} KB)")
     
     # Near-duplicate detection statistics
     if index.enable_near_duplicate_detection and index.duplicate_detector:
@@ -951,4 +2832,101 @@ def main():
         print(f"Collision rate: {stats['collision_rate']:.2%}")
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser(description="Build the inverted index from the crawled pages")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="number of worker processes (default: 1, serial build)")
+    arg_parser.add_argument("--parser", choices=HTML_PARSERS, default="html.parser",
+                            help="HTML parser backend (default: html.parser)")
+    arg_parser.add_argument("--shard-size", type=int, default=2000,
+                            help="files per shard in a parallel build (default: 2000)")
+    arg_parser.add_argument("--data-root", type=Path, default=None,
+                            help="directory of crawled pages (default: the crawler's downloaded_pages)")
+    arg_parser.add_argument("--index-dir", type=Path, default=None,
+                            help="output directory for the index (default: index/)")
+    arg_parser.add_argument("--format", choices=INDEX_FORMATS, default="text",
+                            help="final index format; binary and impact also write lexicon.txt, impact orders "
+                                 "each term's postings by descending tf so searches read only their top (default: text)")
+    arg_parser.add_argument("--memory-budget-mb", type=float, default=None,
+                            help="spill postings to disk when their estimated size reaches this budget, "
+                                 "instead of every 15000 documents")
+    arg_parser.add_argument("--doc-ids", choices=DOC_ID_MODES, default="hash",
+                            help="doc id assignment: URL hash, or dense sequential ids kept stable "
+                                 "across builds into the same index directory (default: hash)")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="index only new, changed and deleted crawl files into a new segment "
+                                 "(always uses dense doc ids and indexes every copy of a page; takes the "
+                                 "--tokenizer, --max-ngram, --no-stopword-ngrams and --content of the first segment)")
+    arg_parser.add_argument("--compact-below", type=int, default=None,
+                            help="with --incremental, then merge the segments holding fewer documents than this")
+    arg_parser.add_argument("--compact", action="store_true",
+                            help="merge all segments of the index into one and exit")
+    arg_parser.add_argument("--positions", action="store_true",
+                            help="store token positions and index unigrams only; the search side then answers "
+                                 "multi-word queries as phrases instead of looking up n-gram terms")
+    arg_parser.add_argument("--max-ngram", type=int, default=3,
+                            help="longest n-gram to index; 1 indexes unigrams only (default: 3)")
+    arg_parser.add_argument("--no-stopword-ngrams", action="store_true",
+                            help="do not index n-grams that contain a stopword")
+    arg_parser.add_argument("--ngram-min-df", type=int, default=1,
+                            help="drop n-grams found in fewer documents than this during the merge (default: 1)")
+    arg_parser.add_argument("--simhash-compat", action="store_true",
+                            help="fingerprint with MD5 token hashes, bit-identical to fingerprints of earlier builds "
+                                 "(default: faster BLAKE2b token hashes)")
+    arg_parser.add_argument("--content", choices=CONTENT_MODES, default="page",
+                            help="what of each page to index: all of its text, or only the article body and "
+                                 "headline, falling back to all text where no article body is found (default: page)")
+    arg_parser.add_argument("--keep-exact-duplicates", action="store_true",
+                            help="index every copy of pages with the same content, instead of only the first "
+                                 "with the URLs of the others as its aliases in url_aliases.txt")
+    arg_parser.add_argument("--tokenizer", choices=TOKENIZERS, default="nltk",
+                            help="word tokenizer: NLTK word_tokenize, or a much faster Unicode-aware regex "
+                                 "(default: nltk)")
+    arg_parser.add_argument("--tokenizer-parity", type=int, default=None, metavar="SAMPLE",
+                            help="compare the two tokenizers on the first SAMPLE crawled pages and exit")
+    arg_parser.add_argument("--profile-sample", type=int, default=None, metavar="N",
+                            help="also run cProfile over one in every N documents of a serial build; "
+                                 "the capture is saved as build_profile.prof next to the index")
+    arg_parser.add_argument("--champions", type=int, default=DEFAULT_CHAMPION_LIST_SIZE, metavar="R",
+                            help="write a champion tier with each term's top R postings, which single-term "
+                                 f"searches answer from; 0 disables it (default: {DEFAULT_CHAMPION_LIST_SIZE})")
+    arg_parser.add_argument("--resume", action="store_true",
+                            help="continue an interrupted build from the checkpoint it left in the index "
+                                 "directory (written at every spill to disk); pass the same build options")
+    arg_parser.add_argument("--partitions", type=int, default=1, metavar="N",
+                            help="split the final index into N term-hash partitions under partitions/, each with "
+                                 "its own lexicon, merged concurrently; searches load a partition's lexicon on "
+                                 "first use (default: 1, unpartitioned)")
+    arg_parser.add_argument("--fields", action="store_true",
+                            help="keep each posting's headline (title), important (headings, bold) and body term "
+                                 "frequencies apart, so searches can weight the fields without a rebuild "
+                                 "(text and binary formats, not with --positions)")
+    arg_parser.add_argument("--merge-workers", type=int, default=None, metavar="N",
+                            help="processes merging the partitions (default: one per partition, up to the CPU count)")
+    args = arg_parser.parse_args()
+    if args.incremental or args.compact:
+        # Segments hold plain postings and are merged without n-gram pruning
+        unsupported = [flag for flag, value in [("--positions", args.positions), ("--fields", args.fields),
+                                                ("--simhash-compat", args.simhash_compat),
+                                                ("--ngram-min-df", args.ngram_min_df > 1)] if value]
+        if unsupported:
+            arg_parser.error(f"{', '.join(unsupported)} cannot be used with --incremental or --compact")
+        index_dir = args.index_dir or DEFAULT_INDEX_DIR
+        if args.compact:
+            compact_segments(index_dir)
+        else:
+            update_segments(args.data_root or DEFAULT_DATA_ROOT, index_dir, parser=args.parser,
+                            index_format=args.format, compact_below=args.compact_below, tokenizer=args.tokenizer,
+                            ngram_policy=NgramPolicy(args.max_ngram, not args.no_stopword_ngrams),
+                            content_mode=args.content)
+        sys.exit(0)
+    if args.tokenizer_parity:
+        report_tokenizer_parity(args.data_root or DEFAULT_DATA_ROOT, args.tokenizer_parity, parser=args.parser)
+        sys.exit(0)
+    main(workers=args.workers, parser=args.parser, shard_size=args.shard_size,
+         data_root=args.data_root, index_dir=args.index_dir, index_format=args.format,
+         memory_budget_mb=args.memory_budget_mb, doc_ids=args.doc_ids, positional=args.positions,
+         ngram_policy=NgramPolicy(args.max_ngram, not args.no_stopword_ngrams, args.ngram_min_df),
+         simhash_compat=args.simhash_compat, tokenizer=args.tokenizer, profile_sample=args.profile_sample,
+         resume=args.resume, champions=args.champions or None, partitions=args.partitions,
+         merge_workers=args.merge_workers, fields=args.fields, exact_dedup=not args.keep_exact_duplicates,
+         content_mode=args.content)
@@ -0,0 +1,201 @@
+"""
+Per-stage instrumentation of index builds.
+
+BuildProfiler accumulates wall time, CPU time and item counts per named
+stage, samples throughput and peak RSS while documents are processed, and
+can run cProfile over a sampled subset of documents. The report is written
+as build_profile.json next to the index (and the cProfile capture, if any,
+as build_profile.prof).
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows; RSS is then not reported
+    resource = None
+
+
+PROFILE_REPORT_FILE = "build_profile.json"
+PROFILE_STATS_FILE = "build_profile.prof"
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident set size of this process (or of its finished child processes) in MB"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class BuildProfiler:
+    """
+    Cumulative wall/CPU time and item counts per build stage.
+
+    Stages may nest; a stage's time excludes the time of stages opened
+    inside it, so the stages add up to the instrumented total. Profilers of
+    worker processes return their stages() for the parent to merge().
+    """
+
+    def __init__(self, sample_interval: float = 1.0, profile_every: Optional[int] = None):
+        """
+        Args:
+            sample_interval: Seconds between throughput/RSS samples
+            profile_every: Run cProfile over one in every this many documents (None disables it)
+        """
+        self.sample_interval = sample_interval
+        self.profile_every = profile_every
+        self._stages: Dict[str, Dict] = {}
+        self._stack: List[List[float]] = []  # per open stage: child wall, child CPU
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.timeline: List[Dict] = []
+        self._last_sample = self.start_wall
+        self._profile = cProfile.Profile() if profile_every else None
+        self.profiled_docs = 0
+
+    def _add(self, name: str, wall: float, cpu: float, items: int):
+        stage = self._stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "items": 0})
+        stage["wall_s"] += wall
+        stage["cpu_s"] += cpu
+        stage["items"] += items
+
+    @contextmanager
+    def stage(self, name: str, items: int = 1):
+        """Time the enclosed block as items of stage name"""
+        self._stack.append([0.0, 0.0])
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            child_wall, child_cpu = self._stack.pop()
+            self._add(name, wall - child_wall, cpu - child_cpu, items)
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+
+    def carve(self, parent: str, name: str, wall: float, cpu: float, items: int):
+        """Move time measured inside stage parent (e.g. by a component's own counters) to stage name"""
+        if parent in self._stages:
+            self._stages[parent]["wall_s"] -= wall
+            self._stages[parent]["cpu_s"] -= cpu
+        self._add(name, wall, cpu, items)
+
+    def stages(self) -> Dict[str, Dict]:
+        """Stage totals, as sent back by worker processes"""
+        return self._stages
+
+    def merge(self, stages: Dict[str, Dict]):
+        """Add the stage totals of another profiler (a worker process's)"""
+        for name, stage in stages.items():
+            self._add(name, stage["wall_s"], stage["cpu_s"], stage["items"])
+
+    def tick(self, docs: int, force: bool = False):
+        """Record a throughput/RSS sample if sample_interval has passed"""
+        now = time.perf_counter()
+        if not force and now - self._last_sample < self.sample_interval:
+            return
+        previous = self.timeline[-1] if self.timeline else {"elapsed_s": 0.0, "docs": 0}
+        elapsed = now - self.start_wall
+        interval = elapsed - previous["elapsed_s"]
+        self.timeline.append({
+            "elapsed_s": round(elapsed, 3),
+            "docs": docs,
+            "docs_per_s": round((docs - previous["docs"]) / interval, 1) if interval > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        self._last_sample = now
+
+    @contextmanager
+    def sample(self, doc_number: int):
+        """Run cProfile over the enclosed block if doc_number is in the sampled subset"""
+        if self._profile is None or doc_number % self.profile_every:
+            yield
+            return
+        self.profiled_docs += 1
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+
+    def report(self, docs: int, workers: int = 1, extra: Optional[Dict] = None) -> Dict:
+        """
+        Build the report dict.
+
+        Args:
+            docs: Documents processed
+            workers: Worker processes; with more than one, stage times are summed over processes
+            extra: Additional top-level entries (e.g. cache statistics)
+        """
+        wall = time.perf_counter() - self.start_wall
+        report = {
+            "documents": docs,
+            "workers": workers,
+            "wall_s": round(wall, 3),
+            "cpu_s": round(time.process_time() - self.start_cpu, 3),
+            "docs_per_s": round(docs / wall, 1) if wall > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(children=True) if workers > 1 else None,
+            "stages": {
+                name: {
+                    "wall_s": round(stage["wall_s"], 4),
+                    "cpu_s": round(stage["cpu_s"], 4),
+                    "items": stage["items"],
+                    "share_of_wall": round(stage["wall_s"] / wall, 4) if wall > 0 and workers == 1 else None,
+                }
+                for name, stage in sorted(self._stages.items(), key=lambda item: -item[1]["wall_s"])
+            },
+            "timeline": self.timeline,
+        }
+        if self._profile is not None:
+            report["cprofile"] = {
+                "profiled_documents": self.profiled_docs,
+                "every": self.profile_every,
+                "top_functions": self._top_functions(),
+            }
+        report.update(extra or {})
+        return report
+
+    def _top_functions(self, limit: int = 20) -> List[Dict]:
+        """Functions with the most cumulative time in the cProfile capture"""
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{Path(filename).name}:{line}({function})",
+                "calls": calls,
+                "tottime_s": round(total, 4),
+                "cumtime_s": round(cumulative, 4),
+            })
+        rows.sort(key=lambda row: -row["cumtime_s"])
+        return rows[:limit]
+
+    def write_report(self, index_dir: Path, report: Dict) -> Path:
+        """Write the report (and the cProfile capture, if any) next to the index"""
+        report_path = Path(index_dir) / PROFILE_REPORT_FILE
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(str(Path(index_dir) / PROFILE_STATS_FILE))
+        return report_path
+
+
+def format_stage_table(report: Dict) -> str:
+    """Human-readable table of a report's stages"""
+    lines = [f"{'stage':<14}{'wall s':>10}{'cpu s':>10}{'items':>10}{'share':>8}"]
+    for name, stage in report["stages"].items():
+        share = f"{stage['share_of_wall']:.1%}" if stage["share_of_wall"] is not None else "-"
+        lines.append(f"{name:<14}{stage['wall_s']:>10.3f}{stage['cpu_s']:>10.3f}{stage['items']:>10}{share:>8}")
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""
+Checkpoints of an index build in progress.
+
+A checkpoint is written whenever the build spills its postings to disk. It
+consists of checkpoint.json, which records how far the build got and which
+partial index files hold its postings, and snapshots of the state that only
+lives in memory until the end of the build:
+
+    checkpoint_<generation>_url_mapping.txt      URL mapping, as url_mapping.txt
+    checkpoint_<generation>_url_aliases.txt      URLs of exact copies, as url_aliases.txt
+    checkpoint_<generation>_content_digests.bin  Content digests of the pages indexed so far
+    checkpoint_<generation>_fingerprints.bin     SimHash fingerprints, as fingerprints.bin
+    checkpoint_<generation>_docs_offsets.bin     document store offset table, as docs_offsets.bin
+
+The snapshots of a generation are written first and checkpoint.json is
+replaced atomically last, so after a crash checkpoint.json always describes
+a complete generation; the files of older generations are then removed.
+A successful build removes its checkpoint.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 3
+
+
+def checkpoint_path(index_dir: Path, generation: int, name: str) -> Path:
+    """Path of a snapshot file of one checkpoint generation"""
+    return Path(index_dir) / f"checkpoint_{generation:06d}_{name}"
+
+
+def load_checkpoint(index_dir: Path) -> Optional[Dict]:
+    """
+    Read the checkpoint of an interrupted build.
+
+    Returns:
+        The checkpoint dict, or None if index_dir has no checkpoint
+    """
+    checkpoint_file = Path(index_dir) / CHECKPOINT_FILE
+    if not checkpoint_file.exists():
+        return None
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')} in {checkpoint_file}")
+    return checkpoint
+
+
+def write_checkpoint(index_dir: Path, checkpoint: Dict):
+    """
+    Atomically make checkpoint the current one and drop older generations.
+
+    Args:
+        index_dir: Index directory being built
+        checkpoint: Checkpoint dict; its snapshot files must already be written
+    """
+    index_dir = Path(index_dir)
+    checkpoint = {"version": CHECKPOINT_VERSION, **checkpoint}
+    temp_file = index_dir / (CHECKPOINT_FILE + ".tmp")
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, index_dir / CHECKPOINT_FILE)
+
+    current = f"checkpoint_{checkpoint['generation']:06d}_"
+    for snapshot in index_dir.glob("checkpoint_*_*"):
+        if not snapshot.name.startswith(current):
+            snapshot.unlink()
+
+
+def clear_checkpoint(index_dir: Path):
+    """Remove the checkpoint and all its snapshot files"""
+    index_dir = Path(index_dir)
+    (index_dir / CHECKPOINT_FILE).unlink(missing_ok=True)
+    (index_dir / (CHECKPOINT_FILE + ".tmp")).unlink(missing_ok=True)
+    for snapshot in index_dir.glob("checkpoint_*_*"):
+        snapshot.unlink()
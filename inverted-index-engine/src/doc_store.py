@@ -0,0 +1,293 @@
+"""
+Document store: what the search side shows for each result.
+
+Written incrementally while the index is built, in three files:
+
+    docs_hot.jsonl    one JSON object per document: doc_id, url, headline, image
+                      and a short precomputed excerpt; small enough to load at startup
+    docs_cold.bin     the full articles, each zlib-compressed on its own
+    docs_offsets.bin  offset table, one (doc_id, offset, length) record per
+                      document in docs_cold.bin, little-endian uint64/uint64/uint32
+
+A build writes the three files under temporary names (HOT_FILE + ".tmp", ...)
+and renames them into place when it closes the store, so the store of the
+previous build is served unchanged until then.
+
+Indexes built before the document store have a single article_metadata.json,
+which open_doc_store still reads.
+"""
+
+import json
+import os
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+import numpy as np
+
+
+HOT_FILE = "docs_hot.jsonl"
+COLD_FILE = "docs_cold.bin"
+OFFSETS_FILE = "docs_offsets.bin"
+# Written by builds before the document store
+LEGACY_METADATA_FILE = "article_metadata.json"
+# Suffix of the files of a store that is still being written
+TMP_SUFFIX = ".tmp"
+
+OFFSET_RECORD = np.dtype([('doc_id', '<u8'), ('offset', '<u8'), ('length', '<u4')])
+
+EXCERPT_LENGTH = 150
+
+
+def make_excerpt(article: str, length: int = EXCERPT_LENGTH) -> str:
+    """Single-line start of an article, cut at a word boundary"""
+    text = ' '.join(article.split())
+    if len(text) <= length:
+        return text
+    cut = text.rfind(' ', 0, length)
+    return text[:cut if cut > 0 else length] + "..."
+
+
+class DocStoreWriter:
+    """
+    Appends documents to a document store as they are indexed.
+
+    Nothing but the offset table (16-20 bytes per document, in compact
+    arrays) is held in memory until close(), which moves the written files
+    into place.
+    """
+
+    def __init__(self, store_dir: Path, compression_level: int = 6, resume_from: Optional[Dict] = None):
+        """
+        Args:
+            store_dir: Directory to write the store to
+            compression_level: zlib level of the cold part
+            resume_from: State returned by checkpoint(); the unfinished store is cut back to it and appended to
+        """
+        self.store_dir = Path(store_dir)
+        self.compression_level = compression_level
+        self._doc_ids = array('Q')
+        self._offsets = array('Q')
+        self._lengths = array('L')
+        self._cold_size = 0
+        if resume_from is None:
+            self._hot = open(self._tmp_path(HOT_FILE), 'w', encoding='utf-8')
+            self._cold = open(self._tmp_path(COLD_FILE), 'wb')
+            return
+
+        # Documents written after the checkpoint are dropped; the build adds them again
+        for name, size in ((HOT_FILE, resume_from["hot_bytes"]), (COLD_FILE, resume_from["cold_bytes"])):
+            with open(self._tmp_path(name), 'r+b') as f:
+                f.truncate(size)
+        self._hot = open(self._tmp_path(HOT_FILE), 'a', encoding='utf-8')
+        self._cold = open(self._tmp_path(COLD_FILE), 'ab')
+        table = np.fromfile(self.store_dir / resume_from["offsets_file"], dtype=OFFSET_RECORD)
+        self._doc_ids.extend(table['doc_id'].tolist())
+        self._offsets.extend(table['offset'].tolist())
+        self._lengths.extend(table['length'].tolist())
+        self._cold_size = resume_from["cold_bytes"]
+
+    def _tmp_path(self, name: str) -> Path:
+        """Where a file of the store is written until close()"""
+        return self.store_dir / (name + TMP_SUFFIX)
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def doc_ids(self) -> Set[int]:
+        """IDs of the documents added so far"""
+        return set(self._doc_ids)
+
+    def add(self, doc_id: int, url: str, headline: str, article: str, image: str,
+            excerpt: Optional[str] = None):
+        """
+        Append one document.
+
+        Args:
+            doc_id: Document ID
+            url: Document URL
+            headline: Article headline
+            article: Full article text (stored compressed in the cold part; None is stored as '')
+            image: Article image URL
+            excerpt: Short excerpt; computed from the article if not given
+        """
+        article = article or ""
+        hot = {
+            "doc_id": doc_id,
+            "url": url,
+            "headline": headline,
+            "image": image,
+            "excerpt": make_excerpt(article) if excerpt is None else excerpt,
+        }
+        self._hot.write(json.dumps(hot, ensure_ascii=False) + "\n")
+
+        data = zlib.compress(article.encode('utf-8'), self.compression_level)
+        self._cold.write(data)
+        self._doc_ids.append(doc_id)
+        self._offsets.append(self._cold_size)
+        self._lengths.append(len(data))
+        self._cold_size += len(data)
+
+    def _write_offsets(self, offsets_file: Path):
+        table = np.empty(len(self._doc_ids), dtype=OFFSET_RECORD)
+        table['doc_id'] = np.frombuffer(self._doc_ids, dtype=np.uint64)
+        table['offset'] = np.frombuffer(self._offsets, dtype=np.uint64)
+        table['length'] = np.asarray(self._lengths, dtype=np.uint32)
+        with open(offsets_file, 'wb') as f:
+            f.write(table.tobytes())
+
+    def checkpoint(self, offsets_file: Path) -> Dict:
+        """
+        Flush both parts and snapshot the offset table written so far.
+
+        Args:
+            offsets_file: File to write the offset table snapshot to (in the store directory)
+
+        Returns:
+            State to pass as resume_from to continue the store after a crash
+        """
+        self._hot.flush()
+        self._cold.flush()
+        self._write_offsets(offsets_file)
+        return {
+            "documents": len(self._doc_ids),
+            "hot_bytes": os.fstat(self._hot.fileno()).st_size,
+            "cold_bytes": self._cold_size,
+            "offsets_file": Path(offsets_file).name,
+        }
+
+    def close_unfinished(self):
+        """Flush and close both parts of a store that will not be finished, leaving them for a resume"""
+        self._hot.close()
+        self._cold.close()
+
+    def close(self):
+        """Flush both parts, write the offset table and move the store into place"""
+        if self._hot.closed:
+            return
+        self._hot.close()
+        self._cold.close()
+        self._write_offsets(self._tmp_path(OFFSETS_FILE))
+        for name in (COLD_FILE, OFFSETS_FILE, HOT_FILE):
+            os.replace(self._tmp_path(name), self.store_dir / name)
+
+
+class DocStore:
+    """
+    Read side of a document store.
+
+    The hot part is loaded into memory; articles are read and decompressed
+    one at a time from the cold part, located through the offset table.
+    The cold part stays open, so articles still come from the store that was
+    opened after a rebuild has moved a new one into place.
+    Entries are keyed by doc_id string, as the search side passes them around.
+    """
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.hot: Dict[str, Dict] = {}
+        with open(self.store_dir / HOT_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                self.hot[str(entry.pop("doc_id"))] = entry
+
+        table = np.fromfile(self.store_dir / OFFSETS_FILE, dtype=OFFSET_RECORD)
+        # Dense ids are written in order already; hash ids need sorting for the binary search
+        order = np.argsort(table['doc_id'], kind='stable')
+        self._doc_ids = table['doc_id'][order]
+        self._offsets = table['offset'][order]
+        self._lengths = table['length'][order]
+        self._cold = open(self.store_dir / COLD_FILE, 'rb')
+
+    def __len__(self) -> int:
+        return len(self.hot)
+
+    def __contains__(self, doc_id) -> bool:
+        return str(doc_id) in self.hot
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """(doc_id string, hot entry) pairs"""
+        return iter(self.hot.items())
+
+    def values(self) -> Iterator[Dict]:
+        """Hot entries"""
+        return iter(self.hot.values())
+
+    def article(self, doc_id) -> str:
+        """Full article text of a document, '' if it is not in the store"""
+        key = int(doc_id)
+        # A URL crawled twice is stored twice; like the hot part, the last one wins
+        i = int(np.searchsorted(self._doc_ids, key, side='right')) - 1
+        if i < 0 or int(self._doc_ids[i]) != key:
+            return ""
+        # pread does not move a shared file position, so concurrent requests can read at once
+        data = os.pread(self._cold.fileno(), int(self._lengths[i]), int(self._offsets[i]))
+        return zlib.decompress(data).decode('utf-8')
+
+    def get(self, doc_id, default=None) -> Optional[Dict]:
+        """
+        Hot entry of a document together with its full article.
+
+        Args:
+            doc_id: Document ID (int or string)
+            default: Returned if the document is not in the store
+        """
+        entry = self.hot.get(str(doc_id))
+        if entry is None:
+            return default
+        return {**entry, "article": self.article(doc_id)}
+
+
+class ChainedDocStore:
+    """Read view over the document stores of several segments, without deleted documents"""
+
+    def __init__(self, stores: Iterable[Union[DocStore, Dict]], dead: Set[str]):
+        self.stores = list(stores)
+        self.dead = dead
+
+    def _store_of(self, doc_id):
+        key = str(doc_id)
+        if key in self.dead:
+            return None
+        return next((store for store in self.stores if key in store), None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+
+    def __contains__(self, doc_id) -> bool:
+        return self._store_of(doc_id) is not None
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        for store in self.stores:
+            for doc_id, entry in store.items():
+                if doc_id not in self.dead:
+                    yield doc_id, entry
+
+    def values(self) -> Iterator[Dict]:
+        return (entry for _, entry in self.items())
+
+    def get(self, doc_id, default=None) -> Optional[Dict]:
+        store = self._store_of(doc_id)
+        if store is None:
+            return default
+        return store.get(str(doc_id), default)
+
+
+def open_doc_store(store_dir: Path) -> Union[DocStore, Dict]:
+    """
+    Open the document store of an index (or segment) directory.
+
+    Returns:
+        DocStore, or for indexes built before the document store the parsed
+        article_metadata.json dict (which offers the same get/items/values);
+        an empty dict if the directory has neither
+    """
+    store_dir = Path(store_dir)
+    if (store_dir / HOT_FILE).exists():
+        return DocStore(store_dir)
+    legacy_file = store_dir / LEGACY_METADATA_FILE
+    if legacy_file.exists():
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
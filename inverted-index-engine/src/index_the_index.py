@@ -1,3 +1,61 @@
+"""
+Lexicons of an index: one line per term locating its postings.
+
+The final merge of a build writes the lexicon as it writes the postings
+(see format_lexicon_line), so a build never scans its index again. Each
+line is "token offset length df max_tf total_tf", plus the offset and
+length of the term's positions or field tfs in a binary index's side file,
+under a header line naming the columns. Lexicons of earlier builds have no
+header and no tf statistics.
+
+indexing_our_index and write_lexicon_into_file rebuild the lexicon of a
+text index from the index file alone, to repair or upgrade a lexicon.
+"""
+
+from typing import Optional, Sequence, Tuple
+
+
+# Term frequency statistics of each term, after its df
+LEXICON_STAT_COLUMNS = ("max_tf", "total_tf")
+
+
+def lexicon_header(sidecar: Optional[str] = None) -> str:
+    """
+    Header line of a lexicon, naming its columns.
+    
+    Args:
+        sidecar: "positions" or "fields" if the lines also locate the term in a side file
+    """
+    columns = ["token", "offset", "length", "df", *LEXICON_STAT_COLUMNS]
+    if sidecar:
+        columns += [f"{sidecar}_offset", f"{sidecar}_length"]
+    return "# " + " ".join(columns) + "\n"
+
+
+def tf_stats(tfs: Sequence[int]) -> Tuple[int, int, int]:
+    """(df, max_tf, total_tf) of a term's postings, from their term frequencies"""
+    return len(tfs), max(tfs, default=0), sum(tfs)
+
+
+def format_lexicon_line(token: str, offset: int, length: int, df: int, max_tf: int, total_tf: int,
+                        side: Optional[Tuple[int, int]] = None) -> str:
+    """
+    Lexicon line of one term.
+    
+    Args:
+        token: The term
+        offset: Byte offset of its postings in the index file
+        length: Byte length of its postings
+        df, max_tf, total_tf: Its number of postings, and the largest and summed term frequency of
+            those postings (see tf_stats)
+        side: (offset, length) of its positions or field tfs in the side file, if any
+    """
+    line = f"{token} {offset} {length} {df} {max_tf} {total_tf}"
+    if side is not None:
+        line += f" {side[0]} {side[1]}"
+    return line + "\n"
+
+
 def indexing_our_index(file_path):
     print("Indexing our index...")
 
@@ -29,38 +87,65 @@ def indexing_our_index(file_path):
             parts = text.split(':', 1)
             term = parts[0]
             
-            # Count document frequency (number of documents containing this term)
+            # Statistics of the term frequencies of the postings "doc_id:tf[:...]", kept as they are read
             postings = parts[1]
-            df = len(postings.split(',')) if postings else 0
+            df = max_tf = total_tf = 0
+            for entry in postings.split(',') if postings else ():
+                tf = int(entry.split(':', 2)[1])
+                df += 1
+                max_tf = max(max_tf, tf)
+                total_tf += tf
             
             length = len(line)
 
             lexicon[term] = {
                 "offset": offset,          
                 "length": length,          
-                "df": df                   
+                "df": df,
+                "max_tf": max_tf,
+                "total_tf": total_tf
             }
 
     return lexicon
 
 def write_lexicon_into_file(file_path, lexicon_path):
+    """Rebuild the lexicon of a text index; the result is the lexicon its build wrote"""
     lexicon = indexing_our_index(file_path)
     with open(lexicon_path, "w", encoding="utf-8") as lexicon_file:
+        lexicon_file.write(lexicon_header())
         for term, info in lexicon.items():
-            lexicon_file.write(f"{term} {info['offset']} {info['length']} {info['df']}\n")
+            lexicon_file.write(format_lexicon_line(term, info["offset"], info["length"], info["df"],
+                                                   info["max_tf"], info["total_tf"]))
 
 
-def load_lexicon_into_memory(file_path):
-    """Load lexicon from file into memory as a dictionary"""
+def load_lexicon_into_memory(file_path, sidecar="positions"):
+    """
+    Load lexicon from file into memory as a dictionary
+    
+    Each term's entry has its offset, length and df, the other columns named by
+    the lexicon's header (max_tf, total_tf, side file location) when it has one.
+    
+    Args:
+        file_path: Lexicon file
+        sidecar: Name of what the fifth and sixth columns of a binary index's lexicon without
+            a header locate: "positions" (positions.bin) or "fields" (fields.bin, field-aware indexes)
+    """
     lexicon = {}
+    columns = None
     
     with open(file_path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
+            if line.startswith("#"):
+                columns = line[1:].split()[1:]
+                continue
                 
             parts = line.split()
+            if columns is not None:
+                lexicon[parts[0]] = dict(zip(columns, map(int, parts[1:])))
+                continue
             if len(parts) >= 4:
                 term = parts[0]
                 offset = int(parts[1])
@@ -72,8 +157,29 @@ def load_lexicon_into_memory(file_path):
                     "length": length,
                     "df": df
                 }
+                # Binary positional and field-aware indexes also locate the term's positions or field tfs
+                if len(parts) >= 6:
+                    lexicon[term][f"{sidecar}_offset"] = int(parts[4])
+                    lexicon[term][f"{sidecar}_length"] = int(parts[5])
     
     return lexicon
+
+
+def load_champion_lexicon(file_path):
+    """Load the champion tier's lexicon ("token offset length complete" lines) into memory as a dictionary"""
+    champion_lexicon = {}
+    
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 4:
+                champion_lexicon[parts[0]] = {
+                    "offset": int(parts[1]),
+                    "length": int(parts[2]),
+                    "complete": parts[3] == "1"
+                }
+    
+    return champion_lexicon
 if __name__ == "__main__":
     from pathlib import Path
     
@@ -82,7 +188,7 @@ if __name__ == "__main__":
     index_file = project_root / "index" / "inverted_index.txt"
     lexicon_file = project_root / "index" / "lexicon.txt"
     
-    print(f"Creating lexicon from: {index_file}")
+    print(f"Rebuilding lexicon from: {index_file}")
     print(f"Saving lexicon to: {lexicon_file}")
     
     write_lexicon_into_file(str(index_file), str(lexicon_file))
@@ -0,0 +1,166 @@
+"""
+Term-partitioned indexes.
+
+A full build with more than one partition splits the final index by a hash
+of each term into self-contained partitions:
+
+    partitions/part_000/inverted_index.txt|.bin   postings of the terms hashed to partition 0
+    partitions/part_000/lexicon.txt               term offsets into the partition's postings
+    partitions/part_000/positions.bin             positions, for a binary positional index
+    partitions/part_000/champions*                champion tier of the partition's terms
+    partitions/part_000/merge.json                digest of the runs the partition was merged from
+
+The builder writes its partial runs already split by partition, so each
+partition is merged from its own runs, in parallel with the others. The
+search side hashes a query term to its partition and only loads the lexicon
+of a partition the first time one of its terms is looked up.
+
+A rebuild into an existing partitioned index only touches the partitions
+that changed. Each partition records in merge.json a digest of the runs and
+settings it was merged from: a partition whose runs are unchanged is not
+merged again, and one merged into files identical to its current ones is left
+in place. Only the others are replaced.
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+PARTITIONS_DIR = "partitions"
+
+# Inside each partition: what it was merged from, and the merge's counters
+PARTITION_MERGE_FILE = "merge.json"
+
+
+def term_partition(token: str, partitions: int) -> int:
+    """Partition of a term; stable across processes and runs, unlike hash()"""
+    return zlib.crc32(token.encode('utf-8')) % partitions
+
+
+def partition_dir(index_dir: Path, partition: int) -> Path:
+    """Directory of one partition of an index"""
+    return Path(index_dir) / PARTITIONS_DIR / f"part_{partition:03d}"
+
+
+def partition_run_file(run_file: Path, partition: int) -> Path:
+    """Path of one partition's part of a partial index run"""
+    run_file = Path(run_file)
+    return run_file.with_name(f"{run_file.stem}.p{partition:03d}{run_file.suffix}")
+
+
+def partition_inputs_digest(run_files: List[Path], settings: Dict) -> str:
+    """Digest of what a partition is merged from: its runs, in order, and the merge settings"""
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode('utf-8'), digest_size=16)
+    for run_file in run_files:
+        digest.update(os.path.getsize(run_file).to_bytes(8, 'little'))
+        with open(run_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_partition_merge(directory: Path) -> Optional[Dict]:
+    """The merge.json of a partition directory, or None if it has none"""
+    try:
+        with open(Path(directory) / PARTITION_MERGE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_partition_merge(directory: Path, merge: Dict):
+    """Record what a partition was merged from; written last, so a partition with one is complete"""
+    tmp_file = Path(directory) / (PARTITION_MERGE_FILE + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(merge, f, indent=2)
+    os.replace(tmp_file, Path(directory) / PARTITION_MERGE_FILE)
+
+
+def install_partition(staging_dir: Path, directory: Path) -> bool:
+    """
+    Move a freshly merged partition into place, unless it has the same files as the current one.
+
+    Args:
+        staging_dir: Directory the partition was merged into (removed in either case)
+        directory: The partition's directory in the index
+
+    Returns:
+        bool: True if the partition was replaced, False if the current one was kept
+    """
+    staging_dir, directory = Path(staging_dir), Path(directory)
+    names = sorted(path.name for path in staging_dir.iterdir())
+    current = sorted(path.name for path in directory.iterdir() if path.name != PARTITION_MERGE_FILE) \
+        if directory.is_dir() else None
+    if names == current and all(filecmp.cmp(staging_dir / name, directory / name, shallow=False) for name in names):
+        shutil.rmtree(staging_dir)
+        return False
+    retired_dir = directory.with_name(directory.name + ".old")
+    shutil.rmtree(retired_dir, ignore_errors=True)
+    if directory.exists():
+        os.replace(directory, retired_dir)
+    os.replace(staging_dir, directory)
+    shutil.rmtree(retired_dir, ignore_errors=True)
+    return True
+
+
+class PartitionedLexicon:
+    """
+    Lexicon of a partitioned index, loaded one partition at a time on demand.
+
+    Looked-up term entries carry the paths of their partition's files (under
+    the keys of files), so readers know where to seek the offsets they hold.
+    """
+
+    def __init__(self, index_dir: Path, partitions: int, lexicon_file: str,
+                 load_lexicon: Callable[[Path], Dict], files: Dict[str, str],
+                 term_counts: Optional[List[int]] = None):
+        """
+        Args:
+            index_dir: Index directory
+            partitions: Number of partitions
+            lexicon_file: Name of the lexicon file inside each partition
+            load_lexicon: Loads one partition's lexicon file into a term -> entry dict
+            files: Entry key -> file name inside the partition, added to every looked-up entry
+            term_counts: Terms per partition (from the manifest), for len()
+        """
+        self.index_dir = Path(index_dir)
+        self.partitions = partitions
+        self.lexicon_file = lexicon_file
+        self.load_lexicon = load_lexicon
+        self.files = files
+        self.term_counts = term_counts
+        self._loaded: Dict[int, Dict] = {}
+
+    def _partition_lexicon(self, term: str) -> Dict:
+        partition = term_partition(term, self.partitions)
+        if partition not in self._loaded:
+            lexicon_path = partition_dir(self.index_dir, partition) / self.lexicon_file
+            self._loaded[partition] = self.load_lexicon(lexicon_path) if lexicon_path.exists() else {}
+        return self._loaded[partition]
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._partition_lexicon(term)
+
+    def __getitem__(self, term: str) -> Dict:
+        entry = self._partition_lexicon(term)[term]
+        directory = partition_dir(self.index_dir, term_partition(term, self.partitions))
+        return {**entry, **{key: directory / name for key, name in self.files.items()}}
+
+    def get(self, term: str, default=None):
+        return self[term] if term in self else default
+
+    def __len__(self) -> int:
+        if self.term_counts is not None:
+            return sum(self.term_counts)
+        return sum(len(lexicon) for lexicon in self._loaded.values())
+
+    @property
+    def loaded_partitions(self) -> int:
+        """Number of partitions whose lexicon has been loaded so far"""
+        return len(self._loaded)
@@ -0,0 +1,364 @@
+"""
+On-disk postings formats shared by the index builder and the search side.
+
+text:   one line per term, "token:doc_id1:tf1,doc_id2:tf2,..." (inverted_index.txt)
+binary: per term, the postings sorted by doc_id and stored as varint pairs
+        (doc_id gap, tf); terms are located through the lexicon's byte
+        offsets (inverted_index.bin)
+impact: per term, the postings in descending impact order, grouped into
+        blocks of one impact value and at most IMPACT_BLOCK_SIZE postings:
+        varints (impact, posting count, byte length), then the block's doc_id
+        gaps as varints, ascending within the block (a large tied run is
+        split into several blocks); located through the lexicon like the
+        binary format
+        (inverted_index_impact.bin). A posting's impact is its term frequency,
+        which is its TF-IDF contribution quantized by its term's idf, so the
+        top-k documents of a term are read off a prefix of its postings.
+
+A positional index adds each posting's token positions: in the text format as
+a third field, "doc_id:tf:pos1;pos2;...", in the binary format in a separate
+positions.bin (per posting, the position count then the position gaps, as
+varints) located through two more lexicon columns.
+
+A field-aware index keeps, next to each posting's tf, how many of its
+occurrences were in the page's headline (its title) and in the rest of its
+important text (h1-h3 headings, bold); body occurrences are then
+tf - IMPORTANT_TF_WEIGHT x (headline + important). In the text format these
+are a third and fourth field, "doc_id:tf:headline:important", left out when
+both are 0; in the binary format they are in a separate fields.bin (per term,
+only the postings with headline or important occurrences, as varint triples
+(doc_id gap, headline, important)) located through two more lexicon columns.
+
+Text and binary indexes may also have a champion tier: champions.bin holds
+each term's top postings by term frequency (at most the champion list size
+recorded in the manifest), encoded like the impact format, and
+champions_lexicon.txt has one line per term, "token offset length complete",
+complete being 1 if the champion list holds all of the term's postings.
+
+index_manifest.json records which format an index directory was built with.
+"""
+
+import json
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+INDEX_FORMATS = ("text", "binary", "impact")
+
+# Most postings in one impact block, so a prefix read can stop inside a large run of tied impacts
+IMPACT_BLOCK_SIZE = 128
+
+INDEX_FILES = {
+    "text": "inverted_index.txt",
+    "binary": "inverted_index.bin",
+    "impact": "inverted_index_impact.bin",
+}
+
+POSITIONS_FILE = "positions.bin"
+
+FIELDS_FILE = "fields.bin"
+
+# Fields of a field-aware index, and the weight each important (headline or
+# important field) occurrence has in a posting's tf
+FIELDS = ("headline", "important", "body")
+IMPORTANT_TF_WEIGHT = 2
+
+CHAMPIONS_FILE = "champions.bin"
+CHAMPIONS_LEXICON_FILE = "champions_lexicon.txt"
+
+MANIFEST_FILE = "index_manifest.json"
+
+
+def write_index_manifest(index_dir: Path, manifest: Dict):
+    """Write the index manifest describing how an index directory was built"""
+    with open(Path(index_dir) / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_index_manifest(index_dir: Path) -> Dict:
+    """
+    Load the index manifest of an index directory.
+
+    Indexes built before the manifest existed are plain text indexes.
+    """
+    manifest_path = Path(index_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {"format": "text"}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _format_text_posting(posting: Tuple) -> str:
+    if len(posting) == 2:
+        return f"{posting[0]}:{posting[1]}"
+    if isinstance(posting[2], tuple):
+        # Field tfs; postings without headline or important occurrences leave them out
+        return f"{posting[0]}:{posting[1]}:{posting[2][0]}:{posting[2][1]}" if any(posting[2]) \
+            else f"{posting[0]}:{posting[1]}"
+    return f"{posting[0]}:{posting[1]}:{';'.join(map(str, posting[2]))}"
+
+
+def format_text_postings(postings: Iterable[Tuple]) -> str:
+    """
+    Format postings as the part of a text index line after "token:".
+
+    Args:
+        postings: (doc_id, tf), (doc_id, tf, positions) or (doc_id, tf, (headline_tf, important_tf)) tuples
+    """
+    return ','.join(map(_format_text_posting, postings))
+
+
+def parse_text_postings(postings_str: str, with_positions: bool = False, with_fields: bool = False) -> List[Tuple]:
+    """
+    Parse the postings part of a text index line.
+
+    Args:
+        postings_str: "doc_id1:tf1,doc_id2:tf2,..." (the line after "token:"),
+            optionally with a positions field or two field tf fields per posting
+        with_positions: Return (doc_id, tf, positions) instead of (doc_id, tf)
+        with_fields: Return (doc_id, tf, (headline_tf, important_tf)) instead of (doc_id, tf)
+
+    Returns:
+        List of postings in file order; malformed entries are skipped
+    """
+    postings = []
+    for entry in postings_str.split(','):
+        fields = entry.split(':')
+        if len(fields) < 2:
+            continue
+        try:
+            doc_id, tf = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue
+        if with_positions:
+            positions = [int(p) for p in fields[2].split(';')] if len(fields) > 2 and fields[2] else []
+            postings.append((doc_id, tf, positions))
+        elif with_fields:
+            postings.append((doc_id, tf, (int(fields[2]), int(fields[3])) if len(fields) > 3 else (0, 0)))
+        else:
+            postings.append((doc_id, tf))
+    return postings
+
+
+def encode_varint(value: int, out: bytearray):
+    """Append value to out as a little-endian base-128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(postings: Iterable[Tuple[int, int]]) -> bytes:
+    """
+    Encode postings sorted by doc_id as interleaved varints (doc_id gap, tf).
+
+    Args:
+        postings: (doc_id, tf) pairs in ascending doc_id order (positions, if any, are ignored)
+
+    Returns:
+        bytes: Encoded postings
+    """
+    out = bytearray()
+    previous = 0
+    for doc_id, tf, *_ in postings:
+        encode_varint(doc_id - previous, out)
+        encode_varint(tf, out)
+        previous = doc_id
+    return bytes(out)
+
+
+def encode_positions(postings: Iterable[Tuple[int, int, List[int]]]) -> bytes:
+    """
+    Encode the positions of positional postings for positions.bin.
+
+    Args:
+        postings: (doc_id, tf, positions) tuples, positions ascending
+
+    Returns:
+        bytes: Per posting, the number of positions then the position gaps, as varints
+    """
+    out = bytearray()
+    for _, _, positions in postings:
+        encode_varint(len(positions), out)
+        previous = 0
+        for position in positions:
+            encode_varint(position - previous, out)
+            previous = position
+    return bytes(out)
+
+
+def decode_positions(data: bytes) -> List[np.ndarray]:
+    """Decode encoded positions back into one ascending int64 array per posting"""
+    values = decode_varints_numpy(data).astype(np.int64)
+    positions = []
+    i = 0
+    while i < len(values):
+        count = int(values[i])
+        positions.append(np.cumsum(values[i + 1:i + 1 + count]))
+        i += 1 + count
+    return positions
+
+
+def encode_fields(postings: Iterable[Tuple[int, int, Tuple[int, int]]]) -> bytes:
+    """
+    Encode the field tfs of field-aware postings for fields.bin.
+
+    Args:
+        postings: (doc_id, tf, (headline_tf, important_tf)) tuples in ascending doc_id order
+
+    Returns:
+        bytes: For each posting with headline or important occurrences, the varints
+        (doc_id gap from the previous such posting, headline_tf, important_tf)
+    """
+    out = bytearray()
+    previous = 0
+    for doc_id, _, (headline, important) in postings:
+        if headline or important:
+            encode_varint(doc_id - previous, out)
+            encode_varint(headline, out)
+            encode_varint(important, out)
+            previous = doc_id
+    return bytes(out)
+
+
+def decode_fields(data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode a term's encoded field tfs.
+
+    Returns:
+        Tuple of (doc_ids, headline_tfs, important_tfs) int64 arrays in ascending
+        doc_id order, for the postings with headline or important occurrences only
+    """
+    values = decode_varints_numpy(data).astype(np.int64)
+    return np.cumsum(values[0::3]), values[1::3], values[2::3]
+
+
+def decode_postings(data: bytes) -> List[Tuple[int, int]]:
+    """Decode encoded postings back into (doc_id, tf) pairs (pure Python)"""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+
+    doc_ids = []
+    doc_id = 0
+    for gap in values[0::2]:
+        doc_id += gap
+        doc_ids.append(doc_id)
+    return list(zip(doc_ids, values[1::2]))
+
+
+def decode_varints_numpy(data: bytes) -> np.ndarray:
+    """
+    Decode a buffer of varints in one vectorized pass.
+
+    Every byte below 0x80 ends a varint; each byte's 7 payload bits are
+    shifted by its position inside its varint and summed per varint.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if not buf.size:
+        return np.empty(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    positions = np.arange(buf.size) - np.repeat(starts, ends - starts + 1)
+    payload = (buf & 0x7F).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    return np.add.reduceat(payload, starts)
+
+
+def decode_postings_numpy(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode encoded postings into NumPy arrays.
+
+    Returns:
+        Tuple of (doc_ids, tfs) as int64 arrays in ascending doc_id order
+    """
+    values = decode_varints_numpy(data).astype(np.int64)
+    return np.cumsum(values[0::2]), values[1::2]
+
+
+def encode_impact_postings(postings: Iterable[Tuple[int, int]]) -> bytes:
+    """
+    Encode postings in impact order, in blocks of one term frequency and at most IMPACT_BLOCK_SIZE postings.
+
+    Args:
+        postings: (doc_id, tf) pairs in ascending doc_id order (positions, if any, are ignored)
+
+    Returns:
+        bytes: Blocks in descending tf order, each the varints (tf, count, byte length)
+        followed by its ascending doc_ids as varint gaps
+    """
+    blocks: Dict[int, List[int]] = {}
+    for doc_id, tf, *_ in postings:
+        blocks.setdefault(tf, []).append(doc_id)
+
+    out = bytearray()
+    for tf in sorted(blocks, reverse=True):
+        doc_ids = blocks[tf]
+        for start in range(0, len(doc_ids), IMPACT_BLOCK_SIZE):
+            block = doc_ids[start:start + IMPACT_BLOCK_SIZE]
+            gaps = bytearray()
+            previous = 0
+            for doc_id in block:
+                encode_varint(doc_id - previous, gaps)
+                previous = doc_id
+            encode_varint(tf, out)
+            encode_varint(len(block), out)
+            encode_varint(len(gaps), out)
+            out += gaps
+    return bytes(out)
+
+
+def _read_varint(f: BinaryIO) -> int:
+    value = shift = 0
+    while True:
+        byte = f.read(1)[0]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value
+        shift += 7
+
+
+def read_impact_postings(f: BinaryIO, offset: int, length: int,
+                         limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read a term's impact-ordered postings, or only the first limit of them.
+
+    Blocks are read one at a time, so reading the top postings of a long
+    list touches only the first few blocks, even within a large run of tied
+    term frequencies.
+
+    Args:
+        f: Impact index file opened in binary mode
+        offset: Byte offset of the term's postings (from the lexicon)
+        length: Byte length of the term's postings (from the lexicon)
+        limit: Stop after the block that completes this many postings (None reads them all)
+
+    Returns:
+        Tuple of (doc_ids, tfs) int64 arrays in impact order: descending tf, ties in ascending doc_id order
+    """
+    end = offset + length
+    f.seek(offset)
+    doc_id_blocks, tf_blocks = [], []
+    read = 0
+    while f.tell() < end and (limit is None or read < limit):
+        tf, count, nbytes = _read_varint(f), _read_varint(f), _read_varint(f)
+        doc_id_blocks.append(np.cumsum(decode_varints_numpy(f.read(nbytes)).astype(np.int64)))
+        tf_blocks.append(np.full(count, tf, dtype=np.int64))
+        read += count
+    if not doc_id_blocks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    doc_ids, tfs = np.concatenate(doc_id_blocks), np.concatenate(tf_blocks)
+    if limit is not None:
+        return doc_ids[:limit], tfs[:limit]
+    return doc_ids, tfs
@@ -1,13 +1,18 @@
 from pathlib import Path
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-from index_the_index import load_lexicon_into_memory
+from doc_store import open_doc_store
+from index_the_index import load_champion_lexicon, load_lexicon_into_memory
+from postings import (CHAMPIONS_FILE, CHAMPIONS_LEXICON_FILE, FIELDS, FIELDS_FILE, IMPORTANT_TF_WEIGHT, INDEX_FILES,
+                      POSITIONS_FILE, decode_fields, decode_positions, decode_postings_numpy, load_index_manifest,
+                      parse_text_postings, read_impact_postings)
+from partitions import PartitionedLexicon
+from segments import SEGMENTED_FORMAT, SegmentedIndex
+from text_analysis import format_cache_stats, get_analyzer
 import time
-import json
+import numpy as np
 from fastapi import FastAPI, HTTPException
 import math
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -17,83 +22,152 @@ project_root = Path(__file__).parent.parent
 lexicon = None
 url_mapping = None
 metadata = None
+index_manifest = None
+champion_lexicon = None
+
+# Multi-word queries on a positional index also match documents where the
+# terms occur within this many tokens of each other, ranked after exact phrases
+PROXIMITY_WINDOW = 10
+
+# Results returned per query
+MAX_RESULTS = 15
+
+# Field weights that reproduce the tf a field-aware index stores, and so the default ranking
+DEFAULT_FIELD_WEIGHTS = {"headline": IMPORTANT_TF_WEIGHT, "important": IMPORTANT_TF_WEIGHT, "body": 1}
+
+
+def phrase_frequency(term_positions: List[np.ndarray]) -> int:
+    """
+    Count the occurrences of a phrase in one document.
+    
+    Args:
+        term_positions: Ascending positions of each phrase term, in phrase order
+    
+    Returns:
+        Number of positions p where term i occurs at p + i for every i
+    """
+    starts = term_positions[0]
+    for offset, positions in enumerate(term_positions[1:], start=1):
+        starts = starts[np.isin(starts + offset, positions)]
+        if not len(starts):
+            break
+    return len(starts)
+
+
+def proximity_frequency(term_positions: List[np.ndarray], window: int) -> int:
+    """
+    Count the occurrences of the first term that have every other term within window tokens.
+    
+    Args:
+        term_positions: Ascending positions of each query term
+        window: Maximum distance in tokens, on either side
+    """
+    anchors = term_positions[0]
+    near = np.ones(len(anchors), dtype=bool)
+    for positions in term_positions[1:]:
+        if not len(positions):
+            return 0
+        # Distance from each anchor to the closest occurrence of this term
+        right = np.searchsorted(positions, anchors).clip(max=len(positions) - 1)
+        left = (right - 1).clip(min=0)
+        distance = np.minimum(np.abs(positions[right] - anchors), np.abs(positions[left] - anchors))
+        near &= distance <= window
+    return int(near.sum())
+
 
 def load_search_data():
     """Load lexicon and URL mapping data once at startup for better performance"""
-    global lexicon, url_mapping
+    global lexicon, url_mapping, metadata, index_manifest, champion_lexicon
     
     startup_start = time.time()
     print("Loading search index data...")
     
-    lexicon = load_lexicon_into_memory(project_root / "index" / "lexicon.txt")
+    index_manifest = load_index_manifest(project_root / "index")
     url_mapping = load_url_mapping(project_root / "index" / "url_mapping.txt")
-    # Load article metadata JSON
-    try:
-        global metadata
-        metadata_path = project_root / "index" / "article_metadata.json"
-        with open(metadata_path, 'r', encoding='utf-8') as mf:
-            metadata = json.load(mf)
+    if index_manifest["format"] == SEGMENTED_FORMAT:
+        # Incremental index: the live segments stand in for the lexicon
+        lexicon = SegmentedIndex(project_root / "index")
+        metadata = lexicon.load_metadata()
+        print(f"✓ Loaded {len(lexicon.segments)} segments, {len(lexicon.tombstones)} tombstoned documents")
         print(f"✓ Loaded metadata for {len(metadata)} documents")
-    except FileNotFoundError:
-        print(f"Metadata file not found: {metadata_path}")
-        metadata = {}
-    except Exception as e:
-        print(f"Error loading metadata: {e}")
-        metadata = {}
+    elif index_manifest.get("partitions", 1) > 1:
+        # Partitioned index: each partition's lexicon is loaded the first time one of its terms is searched
+        partitions, partition_terms = index_manifest["partitions"], index_manifest.get("partition_terms")
+        lexicon = PartitionedLexicon(project_root / "index", partitions, "lexicon.txt",
+                                     lambda path: load_lexicon_into_memory(path, lexicon_sidecar(index_manifest)),
+                                     {"index_file": index_manifest["index_file"], "positions_file": POSITIONS_FILE,
+                                      "fields_file": FIELDS_FILE},
+                                     partition_terms)
+        metadata = load_metadata(project_root / "index")
+        if index_manifest.get("champions"):
+            # Every term has a champion list
+            champion_lexicon = PartitionedLexicon(project_root / "index", partitions, CHAMPIONS_LEXICON_FILE,
+                                                  load_champion_lexicon, {"postings_file": CHAMPIONS_FILE},
+                                                  partition_terms)
+        print(f"✓ Partitioned index: {partitions} partitions, lexicons loaded on first use")
+    else:
+        lexicon = load_lexicon_into_memory(project_root / "index" / "lexicon.txt", lexicon_sidecar(index_manifest))
+        metadata = load_metadata(project_root / "index")
+        if index_manifest.get("champions"):
+            champion_lexicon = load_champion_lexicon(project_root / "index" / CHAMPIONS_LEXICON_FILE)
+            print(f"✓ Loaded champion lists of up to {index_manifest['champions']} postings for "
+                  f"{len(champion_lexicon)} terms")
     
     startup_end = time.time()
     startup_time = (startup_end - startup_start) * 1000
     
+    print(f"✓ Index format: {index_manifest['format']}")
     print(f"✓ Loaded {len(lexicon)} terms in lexicon")
     print(f"✓ Loaded {len(url_mapping)} URL mappings")
     print(f"✓ Startup loading time: {startup_time:.2f} ms")
     print("=" * 50)
 
+def lexicon_sidecar(manifest: Dict) -> str:
+    """What the extra lexicon columns of a binary index locate: its positions or its field tfs"""
+    return "fields" if manifest.get("fields") else "positions"
+
 class Query:
     def __init__(self):
         self.query = ""
         self.boolean_operator = ""
-        self.stemmer = PorterStemmer()  # Initialize Porter stemmer for query processing
         project_root = Path(__file__).resolve().parent.parent
-        self.index_file_path = project_root / "index" / "inverted_index.txt"
+        manifest = index_manifest if index_manifest is not None else load_index_manifest(project_root / "index")
+        # Same analysis (tokenizer, stemming) the index was built with
+        self.analyzer = get_analyzer(manifest.get("tokenizer", "nltk"))
+        self.index_format = manifest["format"]
+        # Segmented indexes are read through the SegmentedIndex passed in as the lexicon
+        # Terms of a partitioned index carry the paths of their partition's files in their lexicon entries
+        self.index_file_path = project_root / "index" / INDEX_FILES.get(self.index_format, INDEX_FILES["text"])
+        self.positions = manifest.get("positions", False)
+        self.positions_file_path = project_root / "index" / POSITIONS_FILE
+        # Field-aware indexes rank by self.field_weights when they are set (see set_field_weights)
+        self.fields = manifest.get("fields", False)
+        self.fields_file_path = project_root / "index" / FIELDS_FILE
+        self.field_weights = None
+        # Champion tier: each term's top postings, with a flag for lists that hold all of them
+        self.champion_list_size = manifest.get("champions")
+        self.champion_lexicon = champion_lexicon if self.champion_list_size else None
+        self.champions_file_path = project_root / "index" / CHAMPIONS_FILE
         self.url_mapping_file_path = project_root / "index" / "url_mapping.txt"
         self.results = ""
     
-    def _should_preserve_token(self, token: str, original_token: str = None) -> bool:
+    def set_field_weights(self, field_weights: Optional[Dict[str, float]]):
         """
-        Determine if a token should be preserved without stemming.
-        Preserves: short acronyms (2-3 chars, all caps), very short tokens (< 3 chars)
+        Rank single-term queries by their field tfs weighted with field_weights, instead of by the stored tf.
         
         Args:
-            token: Lowercase token to check
-            original_token: Original token before lowercasing (for case checking)
-            
-        Returns:
-            True if token should be preserved, False if should be stemmed
-        """
-        if original_token:
-            # Preserve short acronyms (2-3 characters, all uppercase)
-            if len(original_token) <= 3 and original_token.isupper() and original_token.isalpha():
-                return True
-        # Preserve very short tokens to avoid over-stemming
-        if len(token) < 3:
-            return True
-        return False
-    
-    def _smart_stem(self, token: str, original_token: str = None) -> str:
-        """
-        Apply stemming with smart preservation of acronyms and short tokens.
-        
-        Args:
-            token: Lowercase token to stem
-            original_token: Original token before lowercasing
-            
-        Returns:
-            Stemmed token, or original if should be preserved
+            field_weights: Weights of some of FIELDS, the others keeping their DEFAULT_FIELD_WEIGHTS
+                (None or empty to rank by the stored tf)
         """
-        if self._should_preserve_token(token, original_token):
-            return token.lower()
-        return self.stemmer.stem(token)
+        if not field_weights:
+            self.field_weights = None
+            return
+        if not self.fields:
+            raise ValueError("This index has no field-aware postings; rebuild it with --fields to weight fields")
+        unknown = set(field_weights) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)}, expected some of {FIELDS}")
+        self.field_weights = {**DEFAULT_FIELD_WEIGHTS, **field_weights}
     
     def stem_query_term(self, query_term: str) -> str:
         """
@@ -107,17 +181,8 @@ class Query:
         Returns:
             Stemmed query term, or original if no valid tokens found
         """
-        # Tokenize the query term (handles multi-word queries)
-        # Get original tokens to preserve case info for acronyms
-        original_tokens = word_tokenize(query_term)
-        tokens = word_tokenize(query_term.lower())
-        
-        # Filter to alphanumeric tokens and stem them with smart preservation
-        stemmed_tokens = []
-        for orig_token, token in zip(original_tokens, tokens):
-            if token.isalnum() and len(token) >= 1:
-                stemmed = self._smart_stem(token, orig_token)
-                stemmed_tokens.append(stemmed)
+        # Tokenize and stem the query term (handles multi-word queries)
+        stemmed_tokens = self.analyzer.analyze(query_term)
         
         # Return the first stemmed token, or original if no valid tokens
         return stemmed_tokens[0] if stemmed_tokens else query_term.lower()
@@ -132,7 +197,7 @@ class Query:
         Returns:
             True if query has multiple alphanumeric tokens
         """
-        tokens = word_tokenize(query.lower())
+        tokens = self.analyzer.tokenize(query.lower())
         alphanumeric_tokens = [token for token in tokens if token.isalnum() and len(token) >= 1]
         return len(alphanumeric_tokens) > 1
     
@@ -258,19 +323,8 @@ class Query:
         Returns:
             List of stemmed terms
         """
-        # Tokenize the entire query
-        # Get original tokens to preserve case info for acronyms
-        original_tokens = word_tokenize(query)
-        tokens = word_tokenize(query.lower())
-        
-        # Filter to alphanumeric tokens and stem them with smart preservation
-        stemmed_tokens = []
-        for orig_token, token in zip(original_tokens, tokens):
-            if token.isalnum() and len(token) >= 1:
-                stemmed = self._smart_stem(token, orig_token)
-                stemmed_tokens.append(stemmed)
-        
-        return stemmed_tokens
+        # Tokenize and stem the entire query exactly as documents are analyzed
+        return self.analyzer.analyze(query)
     
     def generate_query_ngrams(self, query: str) -> list:
         """
@@ -343,13 +397,17 @@ class Query:
         if stemmed_query not in lexicon:
             return {}  # Term not found in index
         
+        if self.index_format in ("binary", "impact", SEGMENTED_FORMAT):
+            doc_ids, tfs = self.get_postings_arrays(stemmed_query, lexicon)
+            return dict(zip(map(str, doc_ids.tolist()), tfs.tolist()))
+        
         # Get the term's location information from lexicon
         term_info = lexicon[stemmed_query]
         offset = term_info['offset']
         length = term_info['length']
         
         try:
-            with open(self.index_file_path, 'rb') as inverted_index_doc:
+            with open(term_info.get('index_file', self.index_file_path), 'rb') as inverted_index_doc:
                 # Seek directly to the term's location
                 inverted_index_doc.seek(offset)
                 
@@ -366,14 +424,10 @@ class Query:
                 
                 term = parts[0]
                 if term == stemmed_query:
-                    # Parse format: word:doc_id1:freq1,doc_id2:freq2,...
+                    # Parse format: word:doc_id1:freq1,doc_id2:freq2,... (positions, if any, are skipped)
                     doc_data = ':'.join(parts[1:])
-                    
-                    # Split by comma to get individual document entries
-                    for entry in doc_data.split(','):
-                        if ':' in entry:
-                            doc_id, freq = entry.split(':', 1)
-                            doc_frequencies[doc_id.strip()] = int(freq.strip())
+                    for doc_id, freq in parse_text_postings(doc_data):
+                        doc_frequencies[str(doc_id)] = freq
                             
         except FileNotFoundError:
             print(f"Index file not found: {self.index_file_path}")
@@ -384,6 +438,111 @@ class Query:
         
         return doc_frequencies
     
+    def get_postings_arrays(self, stemmed_query, lexicon, limit: Optional[int] = None):
+        """
+        Read and decode the postings of an already stemmed term from a binary or impact index,
+        or gather its live postings across the segments of a segmented index.
+        
+        Args:
+            stemmed_query: Stemmed term as stored in the lexicon
+            lexicon: Loaded lexicon dictionary for direct file access, or a SegmentedIndex
+            limit: On an impact index, read only the top this many postings
+        
+        Returns:
+        - A tuple of NumPy arrays (doc_ids, term_frequencies), empty if the term is missing;
+          in doc_id order, or in impact order (descending tf) on an impact index
+        """
+        if isinstance(lexicon, SegmentedIndex):
+            return lexicon.get_postings(stemmed_query)
+        
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        if stemmed_query not in lexicon:
+            return empty
+        
+        term_info = lexicon[stemmed_query]
+        try:
+            with open(term_info.get('index_file', self.index_file_path), 'rb') as inverted_index_doc:
+                if self.index_format == "impact":
+                    return read_impact_postings(inverted_index_doc, term_info['offset'], term_info['length'], limit)
+                inverted_index_doc.seek(term_info['offset'])
+                data = inverted_index_doc.read(term_info['length'])
+        except FileNotFoundError:
+            print(f"Index file not found: {self.index_file_path}")
+            return empty
+        
+        return decode_postings_numpy(data)
+    
+    def get_positional_postings(self, stemmed_query, lexicon) -> Dict[str, np.ndarray]:
+        """
+        Read the token positions of an already stemmed term from a positional index.
+        
+        Args:
+            stemmed_query: Stemmed term as stored in the lexicon
+            lexicon: Loaded lexicon dictionary for direct file access
+        
+        Returns:
+        - A dictionary mapping document IDs to ascending NumPy position arrays
+        """
+        if stemmed_query not in lexicon:
+            return {}
+        
+        term_info = lexicon[stemmed_query]
+        if self.index_format == "binary":
+            doc_ids, _ = self.get_postings_arrays(stemmed_query, lexicon)
+            with open(term_info.get('positions_file', self.positions_file_path), 'rb') as positions_doc:
+                positions_doc.seek(term_info['positions_offset'])
+                positions = decode_positions(positions_doc.read(term_info['positions_length']))
+            return dict(zip(map(str, doc_ids.tolist()), positions))
+        
+        with open(term_info.get('index_file', self.index_file_path), 'rb') as inverted_index_doc:
+            inverted_index_doc.seek(term_info['offset'])
+            line = inverted_index_doc.read(term_info['length']).decode('utf-8').strip()
+        _, postings_str = line.split(':', 1)
+        return {str(doc_id): np.array(positions, dtype=np.int64)
+                for doc_id, _, positions in parse_text_postings(postings_str, with_positions=True)}
+    
+    def get_sorted_doc_ids_by_phrase(self, query, lexicon, url_mapping, window: Optional[int] = None):
+        """
+        Get document IDs matching a multi-word query as a phrase, from a positional index.
+        
+        Args:
+            query: Raw query; any number of words
+            lexicon: Loaded lexicon dictionary for direct file access
+            url_mapping: Loaded URL mapping dictionary for fast lookup
+            window: None for exact phrase matches, otherwise match documents where
+                every term occurs within this many tokens of the first one
+        
+        Returns:
+        - A list of document IDs sorted by phrase frequency x phrase IDF (highest to lowest)
+        """
+        stemmed_terms = self.stem_all_query_terms(query)
+        if not stemmed_terms:
+            return []
+        
+        postings = [self.get_positional_postings(term, lexicon) for term in stemmed_terms]
+        # Rarest term first, so the candidate set starts small
+        candidates = set(min(postings, key=len))
+        for term_postings in postings:
+            candidates.intersection_update(term_postings)
+        
+        frequencies = {}
+        for doc_id in candidates:
+            term_positions = [term_postings[doc_id] for term_postings in postings]
+            if window is None:
+                frequency = phrase_frequency(term_positions)
+            else:
+                frequency = proximity_frequency(term_positions, window)
+            if frequency:
+                frequencies[doc_id] = frequency
+        
+        print(f"Found {len(frequencies)} documents matching the {'phrase' if window is None else 'terms nearby'}")
+        if not frequencies:
+            return []
+        
+        idf = math.log(len(url_mapping) / len(frequencies))
+        # Ties keep doc_id order, like the single-term ranking
+        return sorted(sorted(frequencies, key=int), key=lambda doc_id: frequencies[doc_id] * idf, reverse=True)
+    
     def get_sorted_urls_by_frequency(self, query, lexicon, url_mapping):
         """
         Get URLs sorted by their term frequency in descending order
@@ -433,6 +592,11 @@ class Query:
         Returns:
         - A list of URLs sorted by TF-IDF (highest to lowest)
         """
+        if self.field_weights is not None:
+            return self.get_sorted_doc_ids_by_field_weights(query, lexicon, url_mapping)
+        if self.index_format in ("binary", "impact", SEGMENTED_FORMAT):
+            return self._get_sorted_doc_ids_by_tf_idf_binary(query, lexicon, url_mapping)
+        
         # Get document IDs and their frequencies
         doc_frequencies = self.get_documents_with_frequencies(query, lexicon)
         
@@ -460,6 +624,153 @@ class Query:
         
         return sorted_doc_ids
     
+    def _get_sorted_doc_ids_by_tf_idf_binary(self, query, lexicon, url_mapping):
+        """TF-IDF ranking on decoded NumPy postings; same ordering as the text path"""
+        doc_ids, tfs = self.get_postings_arrays(self.stem_query_term(query), lexicon)
+        
+        print(f"Found {len(doc_ids)} documents containing the term")
+        
+        N = len(url_mapping)
+        df = len(doc_ids)
+        if df == 0:
+            return []
+        
+        idf = math.log(N/df)
+        # Equal scores rank in doc_id order, like the text path (impact-ordered postings are not in doc_id order)
+        order = np.lexsort((doc_ids, -(tfs * idf)))
+        return [str(doc_id) for doc_id in doc_ids[order].tolist()]
+    
+    def get_field_postings(self, stemmed_query, lexicon, with_body: bool = True):
+        """
+        Read the postings of an already stemmed term from a field-aware index, split by field.
+        
+        Args:
+            stemmed_query: Stemmed term as stored in the lexicon
+            lexicon: Loaded lexicon dictionary for direct file access
+            with_body: Return every posting; without, only those with headline or important
+                occurrences, which on a binary index are read from fields.bin alone
+        
+        Returns:
+        - A tuple of NumPy arrays (doc_ids, headline_tfs, important_tfs, body_tfs) in doc_id order;
+          without with_body, the body tfs are not read and left 0
+        """
+        term_info = lexicon[stemmed_query]
+        if self.index_format == "text":
+            with open(term_info.get('index_file', self.index_file_path), 'rb') as inverted_index_doc:
+                inverted_index_doc.seek(term_info['offset'])
+                line = inverted_index_doc.read(term_info['length']).decode('utf-8').strip()
+            postings = parse_text_postings(line.split(':', 1)[1], with_fields=True)
+            doc_ids = np.array([doc_id for doc_id, _, _ in postings], dtype=np.int64)
+            tfs = np.array([tf for _, tf, _ in postings], dtype=np.int64)
+            field_tfs = np.array([field_tfs for _, _, field_tfs in postings], dtype=np.int64).reshape(-1, 2)
+            headline_tfs, important_tfs = field_tfs[:, 0], field_tfs[:, 1]
+        else:
+            with open(term_info.get('fields_file', self.fields_file_path), 'rb') as fields_doc:
+                fields_doc.seek(term_info['fields_offset'])
+                field_doc_ids, field_headline_tfs, field_important_tfs = decode_fields(
+                    fields_doc.read(term_info['fields_length']))
+            if not with_body:
+                return field_doc_ids, field_headline_tfs, field_important_tfs, np.zeros_like(field_doc_ids)
+            doc_ids, tfs = self.get_postings_arrays(stemmed_query, lexicon)
+            # Field tfs are only stored for the postings that have any
+            headline_tfs, important_tfs = np.zeros_like(tfs), np.zeros_like(tfs)
+            slots = np.searchsorted(doc_ids, field_doc_ids)
+            headline_tfs[slots], important_tfs[slots] = field_headline_tfs, field_important_tfs
+        
+        body_tfs = tfs - IMPORTANT_TF_WEIGHT * (headline_tfs + important_tfs)
+        if not with_body:
+            fielded = (headline_tfs + important_tfs) > 0
+            return doc_ids[fielded], headline_tfs[fielded], important_tfs[fielded], np.zeros(fielded.sum(), np.int64)
+        return doc_ids, headline_tfs, important_tfs, body_tfs
+    
+    def get_sorted_doc_ids_by_field_weights(self, query, lexicon, url_mapping):
+        """
+        Rank a term's documents by TF-IDF over field-weighted term frequencies (BM25F-style).
+        
+        Each posting's headline, important and body tfs are combined with
+        self.field_weights into one weighted tf before scoring, so the weights
+        can change per query. The default weights give back the stored tf and
+        the default ranking. With a body weight of 0, only documents with the
+        term in a weighted field match, and a binary index reads just the
+        term's sparse field tfs (the headline-only fast path).
+        
+        Args:
+            query: Query term to search for
+            lexicon: Loaded lexicon dictionary for direct file access
+            url_mapping: Loaded URL mapping dictionary for fast lookup
+        
+        Returns:
+        - A list of document IDs sorted by weighted TF-IDF (highest to lowest), ties in doc_id order
+        """
+        stemmed_query = self.stem_query_term(query)
+        if stemmed_query not in lexicon:
+            print("Found 0 documents containing the term")
+            return []
+        
+        weights = self.field_weights
+        doc_ids, headline_tfs, important_tfs, body_tfs = self.get_field_postings(
+            stemmed_query, lexicon, with_body=bool(weights["body"]))
+        weighted_tfs = (weights["headline"] * headline_tfs + weights["important"] * important_tfs
+                        + weights["body"] * body_tfs)
+        if not weights["body"]:
+            matching = weighted_tfs > 0
+            doc_ids, weighted_tfs = doc_ids[matching], weighted_tfs[matching]
+        
+        print(f"Found {len(doc_ids)} documents containing the term")
+        if not len(doc_ids):
+            return []
+        
+        # The idf is the term's, whichever fields are weighted
+        idf = math.log(len(url_mapping) / lexicon[stemmed_query]['df'])
+        order = np.lexsort((doc_ids, -(weighted_tfs * idf)))
+        return [str(doc_id) for doc_id in doc_ids[order].tolist()]
+    
+    def get_top_doc_ids_by_tf_idf(self, query, lexicon, url_mapping, k: int = MAX_RESULTS):
+        """
+        Get the k best documents by TF-IDF, and how many documents match in all.
+        
+        On an impact index the postings are stored best first, so once k have
+        been read no later posting can enter the top k and the rest of the list
+        is never read. On an index with a champion tier the term's champion list
+        holds its best postings the same way, and the full list is only read if
+        k is more than an incomplete champion list holds. The number of matches
+        comes from the lexicon's df. Other indexes, and field-weighted queries
+        (champion lists are ranked by the stored tf), rank the whole list.
+        
+        Args:
+            query: Query term to search for
+            lexicon: Loaded lexicon dictionary for direct file access
+            url_mapping: Loaded URL mapping dictionary for fast lookup
+            k: Number of documents to return
+        
+        Returns:
+        - A tuple of (top k document IDs sorted by TF-IDF, total number of matching documents)
+        """
+        stemmed_query = self.stem_query_term(query)
+        postings_file, term_info = None, None
+        if self.index_format == "impact":
+            term_info = lexicon.get(stemmed_query)
+            postings_file = term_info and term_info.get('index_file', self.index_file_path)
+        elif self.champion_lexicon is not None and self.field_weights is None \
+                and stemmed_query in self.champion_lexicon:
+            champions = self.champion_lexicon[stemmed_query]
+            if champions["complete"] or k <= self.champion_list_size:
+                postings_file = champions.get('postings_file', self.champions_file_path)
+                term_info = champions
+        
+        # A term in every document scores 0 everywhere, and ties rank in doc_id order
+        if term_info is None or stemmed_query not in lexicon \
+                or math.log(len(url_mapping) / lexicon[stemmed_query]['df']) <= 0:
+            sorted_doc_ids = self.get_sorted_doc_ids_by_tf_idf(query, lexicon, url_mapping)
+            return sorted_doc_ids[:k], len(sorted_doc_ids)
+        
+        df = lexicon[stemmed_query]['df']
+        # Within a term every score is tf x the same positive idf, so impact order is already the ranking
+        with open(postings_file, 'rb') as postings_doc:
+            doc_ids, _ = read_impact_postings(postings_doc, term_info['offset'], term_info['length'], limit=k)
+        print(f"Found {df} documents containing the term (read the top {len(doc_ids)})")
+        return [str(doc_id) for doc_id in doc_ids.tolist()], df
+    
     def boolean_AND_operator(self, query, lexicon, url_mapping):
         """Process boolean AND queries with stemmed terms"""
         terms = [term.strip() for term in query.split('AND')]
@@ -483,10 +794,11 @@ class Query:
 
         return list(common_urls)
     
-    def get_article_and_headline(self, metadata_json, sorted_doc_ids):
+    def get_article_and_headline(self, doc_store, sorted_doc_ids):
         results = []
         for doc_id in sorted_doc_ids:
-            entry = metadata_json.get(doc_id, {}) if isinstance(metadata_json, dict) else {}
+            # Full articles come from the cold part of the store, so only ask for the results shown
+            entry = (doc_store.get(doc_id) or {}) if doc_store is not None else {}
             results.append({
                 'doc_id': doc_id,
                 'headline': entry.get('headline', ''),
@@ -498,6 +810,17 @@ class Query:
         return results
 
 
+def load_metadata(index_dir):
+    """Open the document store of an index (doc_id -> headline, url, image, excerpt; articles read on demand)"""
+    try:
+        metadata = open_doc_store(index_dir)
+        print(f"✓ Loaded metadata for {len(metadata)} documents")
+    except Exception as e:
+        print(f"Error loading metadata: {e}")
+        metadata = {}
+    return metadata
+
+
 def load_url_mapping(url_mapping_path):
     """Load URL mapping into memory as a dictionary for fast lookup"""
     url_mapping = {}
@@ -518,13 +841,14 @@ def load_url_mapping(url_mapping_path):
 
 
 
-def search_query_logic(query_text):
+def search_query_logic(query_text, field_weights: Optional[Dict[str, float]] = None):
     """
     Core search logic function - extracted from test_search_local.py
     This function contains the clean search logic that can be used by both Flask API and local testing
     
     Args:
         query_text: The search query string
+        field_weights: Weights of some of FIELDS to rank by, on a field-aware index (None for the stored tf)
         
     Returns:
         Dictionary with search results in API format
@@ -534,10 +858,14 @@ def search_query_logic(query_text):
         # Use pre-loaded data instead of loading on every request
         if lexicon is None or url_mapping is None:
             # Fallback: load data if not already loaded (shouldn't happen in normal operation)
-            lexicon = load_lexicon_into_memory(project_root / "index" / "lexicon.txt")
+            load_search_data()
+        elif isinstance(lexicon, SegmentedIndex) and lexicon.refresh():
+            # An update or compaction changed the live segments since the last query
             url_mapping = load_url_mapping(project_root / "index" / "url_mapping.txt")
+            metadata = lexicon.load_metadata()
         
         query_processor = Query()
+        query_processor.set_field_weights(field_weights)
         
         # Start timing ONLY the search algorithm
         start_time = time.time()
@@ -553,16 +881,27 @@ def search_query_logic(query_text):
         # Ensure metadata is available (fallback)
         if metadata is None:
             try:
-                with open(project_root / "index" / "article_metadata.json", 'r', encoding='utf-8') as mf:
-                    metadata = json.load(mf)
+                metadata = open_doc_store(project_root / "index")
             except Exception:
                 metadata = {}
 
-        # Use TF-IDF scoring for all queries (get doc IDs)
-        sorted_doc_ids = query_processor.get_sorted_doc_ids_by_tf_idf(query_text, lexicon, url_mapping)
+        if query_processor.positions and query_processor.is_multi_word_query(query_text) \
+                and 'AND' not in query_text.upper():
+            # Positional index: exact phrase matches, then (unless quoted) documents with the terms nearby
+            sorted_doc_ids = query_processor.get_sorted_doc_ids_by_phrase(query_text, lexicon, url_mapping)
+            quoted = query_text.strip().startswith('"') and query_text.strip().endswith('"')
+            if not quoted:
+                exact = set(sorted_doc_ids)
+                sorted_doc_ids += [doc_id for doc_id in query_processor.get_sorted_doc_ids_by_phrase(
+                    query_text, lexicon, url_mapping, window=PROXIMITY_WINDOW) if doc_id not in exact]
+            results_count = len(sorted_doc_ids)
+        else:
+            # Use TF-IDF scoring for all queries (get doc IDs); impact indexes read only the top postings
+            sorted_doc_ids, results_count = query_processor.get_top_doc_ids_by_tf_idf(query_text, lexicon, url_mapping)
 
         # Retrieve headlines/articles using doc IDs
-        sorted_urls_with_headlines_and_articles = query_processor.get_article_and_headline(metadata, sorted_doc_ids)
+        sorted_urls_with_headlines_and_articles = query_processor.get_article_and_headline(
+            metadata, sorted_doc_ids[:MAX_RESULTS])
 
         # End timing - this now measures ONLY the search algorithm
         end_time = time.time()
@@ -573,9 +912,9 @@ def search_query_logic(query_text):
             'query': query_text,
             'query_info': query_info,
             'total_documents': len(url_mapping),
-            'results_count': len(sorted_doc_ids),
+            'results_count': results_count,
             'search_time_ms': round(duration_ms, 2),
-            'results': sorted_urls_with_headlines_and_articles[:15]  # Top 20 results like Flask API
+            'results': sorted_urls_with_headlines_and_articles[:MAX_RESULTS]  # Top results like Flask API
         }
         
         return result_data
@@ -606,6 +945,8 @@ async def lifespan(app: FastAPI):
     yield  # ← Application runs here
 
     # SHUTDOWN
+    analyzer = get_analyzer((index_manifest or {}).get("tokenizer", "nltk"))
+    print(f"Stem cache: {format_cache_stats(analyzer.cache_stats())}")
     print("Shutting down app...")
 
 app=FastAPI(lifespan=lifespan)
@@ -635,14 +976,18 @@ class SearchQueryResults(BaseModel):
     results: List[SearchResult]
 
 @app.get("/searchQuery", response_model=SearchQueryResults)
-def search_endpoint(query: str):
+def search_endpoint(query: str, headline_weight: Optional[float] = None, important_weight: Optional[float] = None,
+                    body_weight: Optional[float] = None):
     if not query:
         raise HTTPException(
             status_code=400,
             detail="Did not include a query"
         )
+    # Field weights only apply to indexes built with --fields
+    field_weights = {field: weight for field, weight in zip(FIELDS, (headline_weight, important_weight, body_weight))
+                     if weight is not None}
     try:
-        return search_query_logic(query)
+        return search_query_logic(query, field_weights)
     except Exception as e:
         raise HTTPException(
             status_code=500,
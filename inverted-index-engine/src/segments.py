@@ -0,0 +1,246 @@
+"""
+Segmented (incremental) indexes.
+
+An incrementally built index directory holds immutable segments under
+segments/, each a small index of its own:
+
+    segments/seg_000001/inverted_index.txt|.bin   postings of the segment's documents
+    segments/seg_000001/lexicon.txt               term offsets into the segment's postings
+    segments/seg_000001/docs_*                    document store of the segment's documents
+    segments/seg_000001/tombstones.txt            doc_ids deleted or replaced by this update
+
+segments.json (the catalog) lists the live segments, the segments retired by
+the last compaction and the state of every crawled file; url_mapping.txt
+holds the dense doc ids of all live URLs.
+Documents are never updated in place: a re-crawled URL gets a new doc_id in a
+new segment and its old doc_id is tombstoned. Search reads every live segment
+and drops tombstoned doc_ids; compaction merges segments and drops them for good.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+from doc_store import ChainedDocStore, open_doc_store
+from index_the_index import load_lexicon_into_memory
+from postings import INDEX_FILES, decode_postings_numpy, parse_text_postings, read_impact_postings
+
+
+# Manifest format of an index directory built from segments
+SEGMENTED_FORMAT = "segmented"
+
+CATALOG_FILE = "segments.json"
+SEGMENTS_DIR = "segments"
+TOMBSTONES_FILE = "tombstones.txt"
+
+
+def load_segment_catalog(index_dir: Path, index_format: str = "text") -> Dict:
+    """
+    Load the segment catalog of an index directory.
+
+    Args:
+        index_dir: Index directory
+        index_format: Segment postings format used if there is no catalog yet
+
+    Returns:
+        Catalog dict; an empty catalog if the directory has no segments yet
+    """
+    catalog_path = Path(index_dir) / CATALOG_FILE
+    if not catalog_path.exists():
+        return {
+            "format": index_format,
+            "next_segment": 1,
+            "next_doc_id": 0,
+            "segments": [],
+            "files": {},
+        }
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_segment_catalog(index_dir: Path, catalog: Dict):
+    """
+    Write the segment catalog.
+
+    The catalog is replaced atomically, so a reader never sees a segment list
+    that is half written; segments it drops can be deleted afterwards.
+    """
+    catalog_path = Path(index_dir) / CATALOG_FILE
+    tmp_path = catalog_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp_path, catalog_path)
+
+
+def write_tombstones(segment_dir: Path, doc_ids: Set[int]):
+    """Write the doc_ids a segment deletes, one per line"""
+    with open(Path(segment_dir) / TOMBSTONES_FILE, 'w', encoding='utf-8') as f:
+        for doc_id in sorted(doc_ids):
+            f.write(f"{doc_id}\n")
+
+
+def load_tombstones(segment_dir: Path) -> Set[int]:
+    """Read the doc_ids a segment deletes"""
+    tombstones_path = Path(segment_dir) / TOMBSTONES_FILE
+    if not tombstones_path.exists():
+        return set()
+    with open(tombstones_path, 'r', encoding='utf-8') as f:
+        return {int(line) for line in f if line.strip()}
+
+
+class SegmentReader:
+    """Postings and metadata of one immutable segment"""
+
+    def __init__(self, segment_dir: Path, index_format: str = "text"):
+        self.segment_dir = Path(segment_dir)
+        self.index_format = index_format
+        self.index_file_path = self.segment_dir / INDEX_FILES[index_format]
+        self.lexicon = load_lexicon_into_memory(self.segment_dir / "lexicon.txt")
+
+    def _read_term(self, term: str) -> bytes:
+        """Raw bytes of a term's entry in the segment's postings file"""
+        term_info = self.lexicon[term]
+        with open(self.index_file_path, 'rb') as f:
+            f.seek(term_info['offset'])
+            return f.read(term_info['length'])
+
+    def get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Postings of a stemmed term in this segment.
+
+        Returns:
+            Tuple of (doc_ids, tfs) int64 arrays in ascending doc_id order, empty if the term is missing
+        """
+        if term not in self.lexicon:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        if self.index_format == "impact":
+            term_info = self.lexicon[term]
+            with open(self.index_file_path, 'rb') as f:
+                doc_ids, tfs = read_impact_postings(f, term_info['offset'], term_info['length'])
+            order = np.argsort(doc_ids, kind='stable')
+            return doc_ids[order], tfs[order]
+
+        data = self._read_term(term)
+        if self.index_format == "binary":
+            return decode_postings_numpy(data)
+
+        _, postings_str = data.decode('utf-8').strip().split(':', 1)
+        postings = np.array(parse_text_postings(postings_str), dtype=np.int64).reshape(-1, 2)
+        return postings[:, 0], postings[:, 1]
+
+    def iter_postings(self):
+        """
+        Stream the whole segment in token order.
+
+        Yields:
+            (token, postings) with postings as (doc_id, tf) pairs sorted by doc_id
+        """
+        # Lexicon entries are written in token order, which dicts preserve
+        for term in self.lexicon:
+            doc_ids, tfs = self.get_postings(term)
+            yield term, list(zip(doc_ids.tolist(), tfs.tolist()))
+
+    def load_metadata(self):
+        """Document store of the segment's documents, keyed by doc_id string"""
+        return open_doc_store(self.segment_dir)
+
+    def load_tombstones(self) -> Set[int]:
+        """doc_ids deleted by this segment"""
+        return load_tombstones(self.segment_dir)
+
+
+class SegmentedIndex:
+    """
+    Read view over all live segments of an index directory.
+
+    Used by the search side in place of a single lexicon: supports
+    "term in index" and returns the live postings of a term across segments.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.segments = []
+        self.tombstones = np.empty(0, dtype=np.int64)
+        self._term_count = None
+        self._catalog_stamp = ()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Pick up the segments of updates and compactions made since the catalog was read.
+
+        The catalog is read again only if it was replaced or modified; readers of
+        segments that are still live are kept. Segments a compaction retires are only
+        deleted by the next compaction, so a view that is refreshed before each query
+        never reads a deleted segment.
+
+        Returns:
+            True if the live segments changed
+        """
+        catalog_path = self.index_dir / CATALOG_FILE
+        if catalog_path.exists():
+            # The catalog is replaced as a new file, so its inode changes even within the mtime resolution
+            stat = catalog_path.stat()
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        else:
+            stamp = None
+        if stamp == self._catalog_stamp:
+            return False
+        catalog = load_segment_catalog(self.index_dir)
+        self.index_format = catalog["format"]
+        readers = {segment.segment_dir.name: segment for segment in self.segments}
+        self._catalog_stamp = stamp
+        if list(readers) == [segment["name"] for segment in catalog["segments"]]:
+            # Only the state of the crawled files changed
+            return False
+        self.segments = [
+            readers.get(segment["name"]) or
+            SegmentReader(self.index_dir / SEGMENTS_DIR / segment["name"], self.index_format)
+            for segment in catalog["segments"]
+        ]
+        tombstones = set()
+        for segment in self.segments:
+            tombstones |= segment.load_tombstones()
+        self.tombstones = np.array(sorted(tombstones), dtype=np.int64)
+        self._term_count = None
+        return True
+
+    def __contains__(self, term: str) -> bool:
+        return any(term in segment.lexicon for segment in self.segments)
+
+    def __len__(self) -> int:
+        """Number of distinct terms across segments"""
+        if self._term_count is None:
+            terms = set()
+            for segment in self.segments:
+                terms.update(segment.lexicon)
+            self._term_count = len(terms)
+        return self._term_count
+
+    def get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Live postings of a stemmed term across all segments.
+
+        Returns:
+            Tuple of (doc_ids, tfs) int64 arrays in ascending doc_id order, tombstoned doc_ids removed
+        """
+        parts = [segment.get_postings(term) for segment in self.segments if term in segment.lexicon]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        doc_ids = np.concatenate([part[0] for part in parts])
+        tfs = np.concatenate([part[1] for part in parts])
+        live = ~np.isin(doc_ids, self.tombstones)
+        doc_ids, tfs = doc_ids[live], tfs[live]
+        # A doc_id lives in exactly one segment; segments are not in doc_id order after compaction
+        order = np.argsort(doc_ids, kind='stable')
+        return doc_ids[order], tfs[order]
+
+    def load_metadata(self) -> ChainedDocStore:
+        """Document stores of all segments, without the tombstoned documents"""
+        dead = set(map(str, self.tombstones.tolist()))
+        return ChainedDocStore((segment.load_metadata() for segment in self.segments), dead)
@@ -0,0 +1,264 @@
+"""
+Text analysis shared by the indexer, the search side and the crawler.
+"""
+
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from nltk.stem import PorterStemmer
+from nltk.tokenize import word_tokenize
+
+
+# Distinct tokens whose stems are memoized per analyzer
+STEM_CACHE_SIZE = 100_000
+
+TOKENIZERS = ("nltk", "regex")
+
+# Contraction suffixes NLTK's Treebank tokenizer splits off ("do" + "n't", "it" + "'s")
+_CONTRACTION = r"(?:['’](?:s|m|d|ll|re|ve)|n['’]t)(?![^\W_])"
+
+# One pass of the "regex" tokenizer. Letters and digits of any script form
+# words; the compounds and contractions Treebank keeps as single non-alphanumeric
+# tokens are matched whole, so analyze() drops them just as it does NLTK's.
+TOKEN_PATTERN = re.compile(rf"""
+    {_CONTRACTION}                                  # 's, n't, ...
+  | [^\W_]+?(?={_CONTRACTION})                      # the word before a contraction
+  | [^\W_]+(?:(?:[-./_'’]|(?<=\d),)[^\W_]+)+      # well-known, U.S, and/or, 1,000, O'Neil
+  | [^\W_]+
+""", re.VERBOSE | re.IGNORECASE)
+
+# Arabic vowel marks (harakat, tanween, Quranic annotations) are optional in
+# writing and not alphanumeric, so the regex tokenizer removes them up front
+ARABIC_MARKS = re.compile(r"[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e4\u06e7\u06e8\u06ea-\u06ed]")
+
+
+def regex_tokenize(text: str) -> List[str]:
+    """
+    Split text into word tokens with a single compiled regex, case preserved.
+    
+    A fast, Unicode-aware stand-in for NLTK's word_tokenize: on English text
+    it yields the same alphanumeric tokens in nearly all cases, and Arabic
+    words come out whole even with vowel marks or an attached Arabic comma,
+    which word_tokenize leaves non-alphanumeric.
+    """
+    return TOKEN_PATTERN.findall(ARABIC_MARKS.sub('', text))
+
+
+# common stop words provided in write-up
+stopwords = {
+    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and",
+    "any", "are", "aren't", "as", "at", "be", "because", "been", "before", "being",
+    "below", "between", "both", "but", "by", "can't", "cannot", "could", "couldn't",
+    "did", "didn't", "do", "does", "doesn't", "doing", "don't", "down", "during",
+    "each", "few", "for", "from", "further", "had", "hadn't", "has", "hasn't",
+    "have", "haven't", "having", "he", "he'd", "he'll", "he's", "her", "here",
+    "here's", "hers", "herself", "him", "himself", "his", "how", "how's", "i",
+    "i'd", "i'll", "i'm", "i've", "if", "in", "into", "is", "isn't", "it", "it's",
+    "its", "itself", "let's", "me", "more", "most", "mustn't", "my", "myself", "no",
+    "nor", "not", "of", "off", "on", "once", "only", "or", "other", "ought", "our",
+    "ours", "ourselves", "out", "over", "own", "same", "shan't", "she", "she'd",
+    "she'll", "she's", "should", "shouldn't", "so", "some", "such", "than", "that",
+    "that's", "the", "their", "theirs", "them", "themselves", "then", "there",
+    "there's", "these", "they", "they'd", "they'll", "they're", "they've", "this",
+    "those", "through", "to", "too", "under", "until", "up", "very", "was",
+    "wasn't", "we", "we'd", "we'll", "we're", "we've", "were", "weren't", "what",
+    "what's", "when", "when's", "where", "where's", "which", "while", "who",
+    "who's", "whom", "why", "why's", "with", "won't", "would", "wouldn't", "you",
+    "you'd", "you'll", "you're", "you've", "your", "yours", "yourself", "yourselves",
+}
+
+
+class NgramPolicy:
+    """
+    Which n-grams Document.tokenize indexes next to the unigrams.
+    
+    Most n-grams occur in a single document and are never queried, so they
+    can be limited in length, kept from spanning stopwords, and pruned by
+    document frequency when the partial indexes are merged.
+    """
+    
+    def __init__(self, max_n: int = 3, span_stopwords: bool = True, min_df: int = 1):
+        """
+        Args:
+            max_n: Longest n-gram indexed (1 indexes unigrams only)
+            span_stopwords: Whether n-grams may contain stopwords ("bank_of_america")
+            min_df: N-grams found in fewer documents than this are dropped at merge time
+        """
+        if max_n < 1:
+            raise ValueError(f"max_n must be at least 1, got {max_n}")
+        if min_df < 1:
+            raise ValueError(f"min_df must be at least 1, got {min_df}")
+        self.max_n = max_n
+        self.span_stopwords = span_stopwords
+        self.min_df = min_df
+    
+    def __repr__(self) -> str:
+        return f"NgramPolicy(max_n={self.max_n}, span_stopwords={self.span_stopwords}, min_df={self.min_df})"
+    
+    def to_dict(self) -> dict:
+        """Policy as recorded in the index manifest"""
+        return {"max_n": self.max_n, "span_stopwords": self.span_stopwords, "min_df": self.min_df}
+
+
+def is_ngram(term: str) -> bool:
+    """Whether an index term is an n-gram ("word1_word2") rather than a unigram"""
+    return '_' in term
+
+
+class Analyzer:
+    """
+    Tokenizer and smart Porter stemmer used for both documents and queries.
+    
+    News vocabulary is highly repetitive, so stems are memoized in a bounded
+    LRU cache; cache_stats() reports how often it hits. Indexing and query
+    processing must analyze text identically, which is why both go through
+    this one class.
+    """
+    
+    def __init__(self, cache_size: int = STEM_CACHE_SIZE, tokenizer: str = "nltk"):
+        """
+        Args:
+            cache_size: Maximum number of memoized stems (0 disables the cache)
+            tokenizer: "nltk" (word_tokenize) or "regex" (regex_tokenize, much faster)
+        """
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer '{tokenizer}', expected one of {TOKENIZERS}")
+        self.tokenizer = tokenizer
+        self.tokenize = word_tokenize if tokenizer == "nltk" else regex_tokenize
+        self.stemmer = PorterStemmer()
+        self.stem_seconds = 0.0  # time spent in the Porter stemmer itself, i.e. on cache misses
+        self._stem = lru_cache(maxsize=cache_size)(self._stem_uncached)
+    
+    def _stem_uncached(self, token: str) -> str:
+        start = time.perf_counter()
+        stem = self.stemmer.stem(token)
+        self.stem_seconds += time.perf_counter() - start
+        return stem
+    
+    @staticmethod
+    def should_preserve(token: str, original_token: Optional[str] = None) -> bool:
+        """
+        Determine if a token should be preserved without stemming.
+        Preserves: short acronyms (2-3 chars, all caps), very short tokens (< 3 chars)
+        
+        Args:
+            token: Lowercase token to check
+            original_token: Original token before lowercasing (for case checking)
+            
+        Returns:
+            True if token should be preserved, False if should be stemmed
+        """
+        if original_token:
+            # Preserve short acronyms (2-3 characters, all uppercase)
+            if len(original_token) <= 3 and original_token.isupper() and original_token.isalpha():
+                return True
+        # Preserve very short tokens to avoid over-stemming
+        return len(token) < 3
+    
+    def stem(self, token: str, original_token: Optional[str] = None) -> str:
+        """
+        Apply stemming with smart preservation of acronyms and short tokens.
+        
+        Args:
+            token: Lowercase token to stem
+            original_token: Original token before lowercasing
+            
+        Returns:
+            Stemmed token, or original if should be preserved
+        """
+        if self.should_preserve(token, original_token):
+            return token.lower()
+        return self._stem(token)
+    
+    def analyze(self, text: str, stopword_flags: Optional[List[bool]] = None) -> List[str]:
+        """
+        Run text through the analysis chain exactly once.
+        
+        Tokenizes the original text (so case is still available for acronym
+        preservation), keeps alphanumeric tokens and stems them.
+        
+        Args:
+            text: Raw text
+            stopword_flags: If given, filled with whether each returned token is a stopword
+            
+        Returns:
+            List of stemmed tokens in text order
+        """
+        terms = []
+        for orig_token in self.tokenize(text):
+            token = orig_token.lower()
+            # Keep only alphanumeric tokens (filter out punctuation)
+            if token.isalnum():
+                terms.append(self.stem(token, orig_token))
+                if stopword_flags is not None:
+                    stopword_flags.append(token in stopwords)  # checked before stemming
+        return terms
+    
+    def cache_stats(self) -> Dict:
+        """Stem cache hits, misses, current size, hit rate and time spent stemming misses"""
+        info = self._stem.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+            "stem_seconds": self.stem_seconds,
+        }
+
+
+_shared_analyzers: Dict[str, Analyzer] = {}
+
+
+def get_analyzer(tokenizer: str = "nltk") -> Analyzer:
+    """The process-wide analyzer for a tokenizer, so every caller shares one stem cache"""
+    if tokenizer not in _shared_analyzers:
+        _shared_analyzers[tokenizer] = Analyzer(tokenizer=tokenizer)
+    return _shared_analyzers[tokenizer]
+
+
+def format_cache_stats(stats: Dict) -> str:
+    """One-line summary of Analyzer.cache_stats()"""
+    return (f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+            f"{stats['size']} stems cached")
+
+
+def tokenizer_parity(texts, sample_size: int = 20) -> Dict:
+    """
+    Compare the alphanumeric tokens of the "nltk" and "regex" tokenizers.
+    
+    Args:
+        texts: Iterable of raw texts
+        sample_size: Number of most frequent differing tokens to report per side
+        
+    Returns:
+        Dict with token totals, the number of texts tokenized identically, and
+        the most frequent tokens only one of the tokenizers produced
+    """
+    nltk_total = regex_total = identical = count = 0
+    nltk_only, regex_only = Counter(), Counter()
+    for text in texts:
+        count += 1
+        nltk_tokens = Counter(t for t in word_tokenize(text) if t.isalnum())
+        regex_tokens = Counter(t for t in regex_tokenize(text) if t.isalnum())
+        nltk_total += sum(nltk_tokens.values())
+        regex_total += sum(regex_tokens.values())
+        if nltk_tokens == regex_tokens:
+            identical += 1
+        nltk_only.update(nltk_tokens - regex_tokens)
+        regex_only.update(regex_tokens - nltk_tokens)
+    
+    return {
+        "texts": count,
+        "identical_texts": identical,
+        "nltk_tokens": nltk_total,
+        "regex_tokens": regex_total,
+        "nltk_only": sum(nltk_only.values()),
+        "regex_only": sum(regex_only.values()),
+        "top_nltk_only": nltk_only.most_common(sample_size),
+        "top_regex_only": regex_only.most_common(sample_size),
+    }
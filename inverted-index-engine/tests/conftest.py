@@ -0,0 +1,131 @@
+"""
+Fixtures shared by the engine tests: small synthetic crawls, index builds,
+queries against a built index and crash simulation.
+
+Crawls are written by factory fixtures (make_corpus(root), ...) so a test
+can grow or change its crawl between builds.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import build_index
+import search_index
+from build_index import main
+from checkpoint import CHECKPOINT_FILE
+from postings import INDEX_FILES, load_index_manifest
+from search_index import Query
+
+
+WORDS = ["gaza", "ceasefire", "talks", "saudi", "trump", "envoy", "Cairo", "UN", "aid", "convoy", "court", "ruling"]
+
+# Files of a build that must not depend on how it ran (workers, spills, resumes)
+OUTPUT_FILES = ("inverted_index.txt", "url_mapping.txt", "docs_hot.jsonl", "docs_cold.bin", "docs_offsets.bin",
+                "fingerprints.bin")
+
+
+def write_corpus(root: Path, num_pages: int = 40):
+    """Write a small crawl with a few repeated URLs and an unreadable file"""
+    for i in range(num_pages):
+        domain = root / f"domain_{i % 3}"
+        domain.mkdir(parents=True, exist_ok=True)
+        body = ' '.join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(20 + i))
+        page = {
+            "url": f"https://www.aljazeera.com/news/{i % 35}#section",
+            "headline": f"Headline {i}",
+            "article": body,
+            "content": f"<html><head><title>Page {i}</title></head><body><h1>{WORDS[i % len(WORDS)]}</h1><p>{body}</p></body></html>",
+            "image": f"image_{i}.jpg",
+            "encoding": "utf-8",
+        }
+        (domain / f"{i:03d}.json").write_text(json.dumps(page), encoding="utf-8")
+    (root / "domain_0" / "broken.json").write_text("{not json", encoding="utf-8")
+
+
+def write_skewed_corpus(root: Path, num_pages: int = 30):
+    """Write a crawl in which each word is in a different share of the pages, with varying frequency"""
+    domain = root / "domain"
+    domain.mkdir(parents=True)
+    for i in range(num_pages):
+        body = ' '.join(' '.join([word] * (1 + (i * j) % 4))
+                        for j, word in enumerate(WORDS) if i % (j % 5 + 1) == 0)
+        page = {
+            "url": f"https://www.aljazeera.com/news/{i}",
+            "content": f"<html><body><p>{body}</p></body></html>",
+        }
+        (domain / f"{i:03d}.json").write_text(json.dumps(page), encoding="utf-8")
+
+
+@pytest.fixture
+def words():
+    """Vocabulary of the synthetic crawls"""
+    return list(WORDS)
+
+
+@pytest.fixture
+def make_corpus():
+    """make_corpus(root, num_pages=40) writes the default crawl; more pages extend it"""
+    return write_corpus
+
+
+@pytest.fixture
+def make_skewed_corpus():
+    """make_skewed_corpus(root, num_pages=30) writes a crawl with skewed word frequencies"""
+    return write_skewed_corpus
+
+
+@pytest.fixture
+def build(tmp_path):
+    """build(name, data_root, **options) builds tmp_path / name from a crawl and returns it"""
+    def build_index_dir(name: str, data_root: Path, **options) -> Path:
+        index_dir = tmp_path / name
+        index_dir.mkdir()
+        main(data_root=data_root, index_dir=index_dir, **options)
+        return index_dir
+    return build_index_dir
+
+
+@pytest.fixture
+def make_query(monkeypatch):
+    """make_query(index_dir) returns a Query reading the given index, as the search side would"""
+    def make(index_dir: Path) -> Query:
+        manifest = load_index_manifest(index_dir)
+        monkeypatch.setattr(search_index, "index_manifest", manifest)
+        query = Query()
+        query.index_file_path = index_dir / INDEX_FILES[manifest["format"]]
+        return query
+    return make
+
+
+@pytest.fixture
+def assert_same_index():
+    """assert_same_index(index_dir, reference_dir) checks a finished build against a reference build"""
+    def check(index_dir: Path, reference_dir: Path):
+        for name in OUTPUT_FILES:
+            assert (index_dir / name).read_bytes() == (reference_dir / name).read_bytes(), name
+        assert not (index_dir / CHECKPOINT_FILE).exists()
+        assert not list(index_dir.glob("checkpoint_*"))
+    return check
+
+
+@pytest.fixture
+def crash_after():
+    """crash_after(monkeypatch, files) makes the build die while reading the crawl file after the given number"""
+    def crash(monkeypatch, files: int):
+        load_doc_file = build_index.load_doc_file
+        calls = []
+
+        def failing_load(page):
+            calls.append(page)
+            if len(calls) > files:
+                raise MemoryError("simulated crash")
+            return load_doc_file(page)
+
+        monkeypatch.setattr(build_index, "load_doc_file", failing_load)
+    return crash
@@ -0,0 +1,100 @@
+import sys
+import json
+from pathlib import Path
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import URL_ALIASES_FILE, URLMapper, main
+
+
+def test_parallel_build_matches_serial_build(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    serial_dir.mkdir()
+    parallel_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=serial_dir)
+    main(workers=2, shard_size=7, data_root=data_root, index_dir=parallel_dir)
+    
+    for name in ("inverted_index.txt", "url_mapping.txt", "docs_hot.jsonl", "docs_cold.bin", "docs_offsets.bin",
+                 "fingerprints.bin"):
+        assert (parallel_dir / name).read_bytes() == (serial_dir / name).read_bytes(), name
+
+
+def test_memory_budget_spills_without_changing_the_index(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    default_dir = tmp_path / "default"
+    budget_dir = tmp_path / "budget"
+    default_dir.mkdir()
+    budget_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=default_dir)
+    main(data_root=data_root, index_dir=budget_dir, memory_budget_mb=0.01)
+    
+    assert len(list(budget_dir.glob("partial_index_*.txt"))) > 1
+    assert (budget_dir / "inverted_index.txt").read_bytes() == (default_dir / "inverted_index.txt").read_bytes()
+
+
+def test_dense_doc_ids_are_sequential_and_stable_across_builds(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=20)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=index_dir, doc_ids="dense")
+    first = (index_dir / "url_mapping.txt").read_text(encoding="utf-8").splitlines()
+    assert [int(line.split(':', 1)[0]) for line in first] == list(range(len(first)))
+    
+    # A later crawl adds pages; known URLs keep their ids
+    make_corpus(data_root, num_pages=30)
+    main(data_root=data_root, index_dir=index_dir, doc_ids="dense")
+    second = (index_dir / "url_mapping.txt").read_text(encoding="utf-8").splitlines()
+    assert second[:len(first)] == first
+    assert [int(line.split(':', 1)[0]) for line in second] == list(range(len(second)))
+
+
+def test_dense_rebuild_drops_urls_gone_from_the_crawl(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=20)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    main(data_root=data_root, index_dir=index_dir, doc_ids="dense")
+    first = URLMapper.load(index_dir / "url_mapping.txt")
+    
+    # Page 19 is gone and page 5 became an exact copy of page 3
+    (data_root / "domain_1" / "019.json").unlink()
+    page_5 = data_root / "domain_2" / "005.json"
+    page = json.loads(page_5.read_text(encoding="utf-8"))
+    page["content"] = json.loads((data_root / "domain_0" / "003.json").read_text(encoding="utf-8"))["content"]
+    page_5.write_text(json.dumps(page), encoding="utf-8")
+    main(data_root=data_root, index_dir=index_dir, doc_ids="dense")
+    
+    second = URLMapper.load(index_dir / "url_mapping.txt", aliases_file=index_dir / URL_ALIASES_FILE)
+    assert "https://www.aljazeera.com/news/19" not in second.url_to_id
+    # Whichever of the two is crawled later is an alias of the other, although it had an id before
+    (copy, doc_id), = second.aliases.items()
+    assert copy not in second.url_to_id and second.get_url(doc_id) in first.url_to_id
+    assert {copy, second.get_url(doc_id)} == {"https://www.aljazeera.com/news/3", "https://www.aljazeera.com/news/5"}
+    assert all(first.url_to_id[url] == doc_id for url, doc_id in second.url_to_id.items())
+    assert len(second) == len((index_dir / "docs_hot.jsonl").read_text(encoding="utf-8").splitlines()) == 18
+
+
+def test_build_writes_profile_report(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=20)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=index_dir, profile_sample=5)
+    report = json.loads((index_dir / "build_profile.json").read_text(encoding="utf-8"))
+    assert report["documents"] == 20
+    for stage in ("json_decode", "parse", "tokenize", "stem", "simhash", "index", "offload", "merge"):
+        assert report["stages"][stage]["wall_s"] >= 0, stage
+    assert report["stages"]["parse"]["items"] == 20
+    assert report["timeline"][-1]["docs"] == 20
+    assert report["cprofile"]["profiled_documents"] == 4
+    assert (index_dir / "build_profile.prof").exists()
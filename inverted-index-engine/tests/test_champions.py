@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import search_index
+from build_index import InvertedIndex, URLMapper
+from index_the_index import load_champion_lexicon, load_lexicon_into_memory
+from postings import CHAMPIONS_FILE, CHAMPIONS_LEXICON_FILE, INDEX_FILES
+
+
+@pytest.fixture
+def pages(tmp_path, make_skewed_corpus):
+    data_root = tmp_path / "pages"
+    make_skewed_corpus(data_root)
+    return data_root
+
+
+@pytest.mark.parametrize("index_format", ["text", "binary"])
+def test_champion_tier_answers_like_the_full_lists(monkeypatch, index_format, pages, build, make_query, words):
+    reference_dir = build("reference", pages, index_format=index_format, champions=None)
+    index_dir = build("champions", pages, index_format=index_format, champions=3)
+    assert not (reference_dir / CHAMPIONS_FILE).exists()
+    assert (index_dir / INDEX_FILES[index_format]).read_bytes() == \
+        (reference_dir / INDEX_FILES[index_format]).read_bytes()
+
+    lexicon = load_lexicon_into_memory(index_dir / "lexicon.txt")
+    champion_lexicon = load_champion_lexicon(index_dir / CHAMPIONS_LEXICON_FILE)
+    assert champion_lexicon.keys() == lexicon.keys()
+    assert all(champion_lexicon[term]["complete"] == (info["df"] <= 3) for term, info in lexicon.items())
+
+    url_mapping = search_index.load_url_mapping(index_dir / "url_mapping.txt")
+    reference = make_query(reference_dir)
+    monkeypatch.setattr(search_index, "champion_lexicon", champion_lexicon)
+    query = make_query(index_dir)
+    query.champions_file_path = index_dir / CHAMPIONS_FILE
+    # A rare n-gram has a complete champion list
+    terms = words + [next(term for term, info in champion_lexicon.items() if info["complete"]), "missing"]
+    for term in terms:
+        expected = reference.get_sorted_doc_ids_by_tf_idf(term, lexicon, url_mapping)
+        for k in (1, 3, 5, 1000):
+            assert query.get_top_doc_ids_by_tf_idf(term, lexicon, url_mapping, k) == (expected[:k], len(expected))
+
+    # Up to the champion list size, the full postings are never read
+    query.index_file_path = index_dir / "missing.bin"
+    term = next(term for term, info in lexicon.items()
+                if not champion_lexicon[term]["complete"] and info["df"] < len(url_mapping))
+    assert len(query.get_top_doc_ids_by_tf_idf(term, lexicon, url_mapping, 3)[0]) == 3
+
+
+def test_impact_format_has_no_champion_tier(tmp_path, pages, build):
+    with pytest.raises(ValueError):
+        InvertedIndex(URLMapper(), index_dir=tmp_path, index_format="impact", champion_list_size=8)
+    index_dir = build("impact", pages, index_format="impact", champions=8)
+    assert not (index_dir / CHAMPIONS_FILE).exists()
@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import build_index
+from build_index import main
+from checkpoint import load_checkpoint
+
+
+def test_resume_after_crash_matches_full_build(tmp_path, monkeypatch, make_corpus, build, assert_same_index,
+                                               crash_after):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    reference_dir = build("reference", data_root, memory_budget_mb=0.01)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+
+    with monkeypatch.context() as patch:
+        crash_after(patch, 25)
+        with pytest.raises(MemoryError):
+            main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01)
+    checkpoint = load_checkpoint(index_dir)
+    assert 0 < checkpoint["progress"]["files_done"] <= 25
+    # Only the snapshot files of the latest checkpoint are kept
+    assert len(list(index_dir.glob("checkpoint_*_url_mapping.txt"))) == 1
+
+    main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01, resume=True)
+    assert_same_index(index_dir, reference_dir)
+
+
+def test_parallel_build_resumes_from_its_checkpoint(tmp_path, monkeypatch, make_corpus, build, assert_same_index,
+                                                    crash_after):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    reference_dir = build("reference", data_root)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    monkeypatch.setattr(build_index, "PARALLEL_CHECKPOINT_DOCS", 5)
+
+    with monkeypatch.context() as patch:
+        crash_after(patch, 30)
+        with pytest.raises(MemoryError):
+            main(workers=2, shard_size=5, data_root=data_root, index_dir=index_dir)
+    files_done = load_checkpoint(index_dir)["progress"]["files_done"]
+    assert files_done > 0 and files_done % 5 == 0
+
+    # A checkpoint can be resumed with a different number of workers
+    main(data_root=data_root, index_dir=index_dir, resume=True)
+    assert_same_index(index_dir, reference_dir)
+
+
+def test_build_order_does_not_depend_on_directory_listing(tmp_path, monkeypatch, make_corpus, build,
+                                                          assert_same_index):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    reference_dir = build("reference", data_root)
+
+    # Resumes rely on the crawl being read in the same order by every run
+    iterdir = Path.iterdir
+    monkeypatch.setattr(Path, "iterdir", lambda path: reversed(list(iterdir(path))))
+    index_dir = build("reversed", data_root)
+    assert_same_index(index_dir, reference_dir)
+    assert (index_dir / "url_mapping.txt").read_bytes() == (reference_dir / "url_mapping.txt").read_bytes()
+
+
+def test_resume_rejects_changed_settings_and_crawl(tmp_path, monkeypatch, make_corpus, crash_after):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    with monkeypatch.context() as patch:
+        crash_after(patch, 25)
+        with pytest.raises(MemoryError):
+            main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01)
+
+    with pytest.raises(ValueError, match="settings"):
+        main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01, resume=True, tokenizer="regex")
+
+    (data_root / load_checkpoint(index_dir)["progress"]["last_file"]).unlink()
+    with pytest.raises(ValueError, match="crawl"):
+        main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01, resume=True)
+
+
+def test_fresh_build_discards_stale_checkpoint(tmp_path, monkeypatch, make_corpus, crash_after):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    with monkeypatch.context() as patch:
+        crash_after(patch, 25)
+        with pytest.raises(MemoryError):
+            main(data_root=data_root, index_dir=index_dir, memory_budget_mb=0.01)
+
+    main(data_root=data_root, index_dir=index_dir)
+    assert load_checkpoint(index_dir) is None
+    assert not list(index_dir.glob("checkpoint_*"))
@@ -0,0 +1,59 @@
+import json
+import sys
+from pathlib import Path
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from doc_store import DocStore, DocStoreWriter, make_excerpt, open_doc_store
+
+
+def test_round_trip_with_random_access(tmp_path):
+    writer = DocStoreWriter(tmp_path)
+    articles = {}
+    # Hash doc ids arrive in no particular order
+    for doc_id in (9_000_000_000_000_000_123, 7, 512, 3):
+        articles[doc_id] = f"Article {doc_id} " + "word " * (doc_id % 300)
+        writer.add(doc_id, f"https://example.com/{doc_id}", f"Headline {doc_id}", articles[doc_id], "")
+    writer.add(8, "https://example.com/8", "No article", None, "")
+    writer.close()
+    
+    store = DocStore(tmp_path)
+    assert len(store) == 5
+    for doc_id, article in articles.items():
+        entry = store.get(str(doc_id))
+        assert entry["article"] == article
+        assert entry["headline"] == f"Headline {doc_id}"
+        assert entry["excerpt"] == make_excerpt(article)
+    assert store.get(8)["article"] == ""
+    assert store.get(4) is None and "4" not in store
+
+
+def test_excerpt_is_short_and_single_line():
+    excerpt = make_excerpt("First line\n\n" + "lorem ipsum " * 50)
+    assert "\n" not in excerpt and excerpt.endswith("...")
+    assert len(excerpt) <= 153
+    assert make_excerpt("Short one") == "Short one"
+
+
+def test_reads_legacy_metadata_json(tmp_path):
+    legacy = {"5": {"headline": "h", "article": "a", "excerpt": "a", "url": "u", "image": ""}}
+    (tmp_path / "article_metadata.json").write_text(json.dumps(legacy), encoding='utf-8')
+    assert open_doc_store(tmp_path).get("5")["article"] == "a"
+
+
+def test_rebuild_leaves_the_served_store_alone_until_closed(tmp_path):
+    writer = DocStoreWriter(tmp_path)
+    writer.add(1, "https://example.com/1", "Old", "old article", "")
+    writer.close()
+    served = DocStore(tmp_path)
+    
+    writer = DocStoreWriter(tmp_path)
+    writer.add(1, "https://example.com/1", "New", "new and longer article", "")
+    # The store being served is untouched while the new one is written
+    assert DocStore(tmp_path).get(1)["headline"] == "Old"
+    writer.close()
+    assert not list(tmp_path.glob("*.tmp"))
+    assert DocStore(tmp_path).get(1)["article"] == "new and longer article"
+    # A store opened before the swap keeps reading the articles it was opened with
+    assert served.get(1)["article"] == "old article"
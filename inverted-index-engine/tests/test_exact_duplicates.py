@@ -0,0 +1,93 @@
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import build_index
+from build_index import URL_ALIASES_FILE, URLMapper, content_digest, main
+from checkpoint import load_checkpoint
+
+
+def add_copies(root: Path, num_copies: int = 10):
+    """Copy the first pages of the crawl under other URLs, with their whitespace changed"""
+    copies = root / "domain_copies"
+    copies.mkdir()
+    for i in range(num_copies):
+        page = json.loads((root / f"domain_{i % 3}" / f"{i:03d}.json").read_text(encoding="utf-8"))
+        page["url"] = f"https://www.aljazeera.com/news/{i}?utm_source=feed"
+        page["content"] = page["content"].replace(" ", " \n  ")
+        page["headline"] = f"Copy {i}"
+        (copies / f"{i:03d}.json").write_text(json.dumps(page), encoding="utf-8")
+
+
+@pytest.fixture
+def pages(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    return data_root
+
+
+@pytest.fixture
+def pages_with_copies(tmp_path, make_corpus):
+    data_root = tmp_path / "pages_with_copies"
+    make_corpus(data_root)
+    add_copies(data_root)
+    return data_root
+
+
+def test_exact_copies_become_aliases(pages, pages_with_copies, build, assert_same_index):
+    reference_dir = build("reference", pages)
+    index_dir = build("index", pages_with_copies)
+    # The copies are never indexed, so the index is that of the crawl without them
+    assert_same_index(index_dir, reference_dir)
+    assert not (reference_dir / URL_ALIASES_FILE).exists()
+
+    url_mapper = URLMapper.load(index_dir / "url_mapping.txt", aliases_file=index_dir / URL_ALIASES_FILE)
+    assert len(url_mapper.aliases) == 10
+    for i in range(10):
+        assert url_mapper.resolve(f"https://www.aljazeera.com/news/{i}?utm_source=feed") == \
+            url_mapper.resolve(f"https://www.aljazeera.com/news/{i}")
+    assert url_mapper.resolve("https://www.aljazeera.com/news/missing") is None
+
+    # Without deduplication every copy gets its own document
+    keep_dir = build("keep", pages_with_copies, exact_dedup=False)
+    assert not (keep_dir / URL_ALIASES_FILE).exists()
+    assert len(URLMapper.load(keep_dir / "url_mapping.txt")) == len(url_mapper) + 10
+
+
+def test_parallel_build_aliases_like_serial_build(pages_with_copies, build, assert_same_index):
+    serial_dir = build("serial", pages_with_copies)
+    parallel_dir = build("parallel", pages_with_copies, workers=2, shard_size=4)
+    assert_same_index(parallel_dir, serial_dir)
+    assert (parallel_dir / URL_ALIASES_FILE).read_bytes() == (serial_dir / URL_ALIASES_FILE).read_bytes()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_resumed_build_keeps_the_content_digests(tmp_path, monkeypatch, workers, pages_with_copies, build,
+                                                  assert_same_index, crash_after):
+    reference_dir = build("reference", pages_with_copies)
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    monkeypatch.setattr(build_index, "PARALLEL_CHECKPOINT_DOCS", 5)
+
+    with monkeypatch.context() as patch:
+        # Dies while reading the copies, after checkpoints of the pages they copy
+        crash_after(patch, 44)
+        with pytest.raises(MemoryError):
+            main(data_root=pages_with_copies, index_dir=index_dir, memory_budget_mb=0.01, workers=workers, shard_size=4)
+    assert load_checkpoint(index_dir)["progress"]["files_done"] > 0
+
+    main(data_root=pages_with_copies, index_dir=index_dir, memory_budget_mb=0.01, resume=True)
+    assert_same_index(index_dir, reference_dir)
+    assert (index_dir / URL_ALIASES_FILE).read_bytes() == (reference_dir / URL_ALIASES_FILE).read_bytes()
+
+
+def test_content_digest_ignores_whitespace_only():
+    assert content_digest("<p>a  b</p>\n") == content_digest(" <p>a b</p>")
+    assert content_digest("<p>a b</p>") != content_digest("<p>ab</p>")
+    # Pages without content are never copies of each other
+    assert content_digest("") is None and content_digest(" \n ") is None
@@ -0,0 +1,105 @@
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import search_index
+from build_index import Document, InvertedIndex, URLMapper, iter_partial_index
+from index_the_index import load_lexicon_into_memory
+from postings import INDEX_FILES, format_text_postings, parse_text_postings
+
+
+def test_tokenize_splits_important_occurrences_by_field():
+    doc = Document("https://www.aljazeera.com/news/1",
+                   "<html><head><title>Gaza talks</title></head><body><h1>Gaza envoy</h1>"
+                   "<p>Talks in <b>Cairo</b> about gaza</p></body></html>", "")
+    tokens = doc.tokenize(fields=True)
+    assert doc.field_tfs["gaza"] == (1, 1)
+    assert doc.field_tfs["talk"] == (1, 0)
+    assert doc.field_tfs["cairo"] == (0, 1)
+    assert doc.field_tfs["gaza_talk"] == (1, 0)
+    # An n-gram across the end of the title is only important text
+    assert doc.field_tfs["talk_gaza"] == (0, 1)
+    # The stored weights are unchanged
+    assert all(important == 2 * sum(doc.field_tfs.get(token, (0, 0))) for token, (_, important) in tokens.items())
+
+
+def test_text_postings_with_fields_round_trip():
+    postings = [(3, 5, (1, 0)), (7, 1, (0, 0)), (9, 6, (0, 2))]
+    postings_str = format_text_postings(postings)
+    assert postings_str == "3:5:1:0,7:1,9:6:0:2"
+    assert parse_text_postings(postings_str, with_fields=True) == postings
+    assert parse_text_postings(postings_str) == [(3, 5), (7, 1), (9, 6)]
+
+
+# Spills several partial indexes, so the field tfs go through the merge
+MEMORY_BUDGET_MB = 0.005
+
+
+@pytest.fixture
+def pages(tmp_path, words):
+    """A crawl whose pages have a word in their title, another in a heading and the rest in the body"""
+    domain = tmp_path / "pages" / "domain"
+    domain.mkdir(parents=True)
+    for i in range(30):
+        body = ' '.join(words[(i * 5 + j) % len(words)] for j in range(10 + i % 7))
+        page = {
+            "url": f"https://www.aljazeera.com/news/{i}",
+            "content": f"<html><head><title>{words[i % 4]} news</title></head><body>"
+                       f"<h2>{words[(i + 1) % 6]}</h2><p>{body}</p></body></html>",
+        }
+        (domain / f"{i:03d}.json").write_text(json.dumps(page), encoding="utf-8")
+    return tmp_path / "pages"
+
+
+def test_field_aware_text_index_keeps_the_stored_tfs(pages, build):
+    reference_dir = build("reference", pages, memory_budget_mb=MEMORY_BUDGET_MB)
+    index_dir = build("fields", pages, fields=True, memory_budget_mb=MEMORY_BUDGET_MB)
+    reference = dict(iter_partial_index(reference_dir / INDEX_FILES["text"]))
+    index = dict(iter_partial_index(index_dir / INDEX_FILES["text"]))
+    assert index.keys() == reference.keys()
+    for token, postings_str in index.items():
+        postings = parse_text_postings(postings_str, with_fields=True)
+        assert [(doc_id, tf) for doc_id, tf, _ in postings] == parse_text_postings(reference[token])
+        assert all(tf >= 2 * sum(field_tfs) for _, tf, field_tfs in postings)
+
+
+@pytest.mark.parametrize("index_format", ["text", "binary"])
+def test_field_weights_rerank_at_query_time(index_format, pages, build, make_query, words):
+    reference_dir = build("reference", pages, index_format=index_format, memory_budget_mb=MEMORY_BUDGET_MB)
+    index_dir = build("fields", pages, index_format=index_format, fields=True, memory_budget_mb=MEMORY_BUDGET_MB)
+    url_mapping = search_index.load_url_mapping(index_dir / "url_mapping.txt")
+    reference_lexicon = load_lexicon_into_memory(reference_dir / "lexicon.txt")
+    lexicon = load_lexicon_into_memory(index_dir / "lexicon.txt", "fields")
+    reference = make_query(reference_dir)
+    query = make_query(index_dir)
+    query.fields_file_path = index_dir / "fields.bin"
+
+    query.set_field_weights({"body": 1})
+    for word in words + ["news", "missing"]:
+        # The default weights give back the stored tfs, and so the default ranking
+        expected = reference.get_sorted_doc_ids_by_tf_idf(word, reference_lexicon, url_mapping)
+        assert query.get_sorted_doc_ids_by_tf_idf(word, lexicon, url_mapping) == expected
+        assert query.get_top_doc_ids_by_tf_idf(word, lexicon, url_mapping, 5) == (expected[:5], len(expected))
+
+    # Headline only: the pages with the word in their title, the postings of a binary index left unread
+    query.set_field_weights({"headline": 1, "important": 0, "body": 0})
+    if index_format == "binary":
+        query.index_file_path = index_dir / "missing.bin"
+    titled = {doc_id for doc_id, url in url_mapping.items() if int(url.rsplit('/', 1)[1]) % 4 == 0}
+    assert set(query.get_sorted_doc_ids_by_tf_idf("gaza", lexicon, url_mapping)) == titled
+    assert query.get_sorted_doc_ids_by_tf_idf("envoy", lexicon, url_mapping) == []
+
+
+def test_field_weights_need_a_field_aware_index(tmp_path, pages, build, make_query):
+    with pytest.raises(ValueError):
+        InvertedIndex(URLMapper(), index_dir=tmp_path, positional=True, fields=True)
+    with pytest.raises(ValueError):
+        InvertedIndex(URLMapper(), index_dir=tmp_path, index_format="impact", fields=True)
+    query = make_query(build("binary", pages, index_format="binary", memory_budget_mb=MEMORY_BUDGET_MB))
+    with pytest.raises(ValueError):
+        query.set_field_weights({"headline": 3})
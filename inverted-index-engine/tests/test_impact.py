@@ -0,0 +1,85 @@
+import io
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import search_index
+from build_index import InvertedIndex, URLMapper
+from index_the_index import load_lexicon_into_memory
+from postings import IMPACT_BLOCK_SIZE, encode_impact_postings, encode_postings, read_impact_postings
+
+
+def impact_order(postings):
+    return sorted(postings, key=lambda posting: (-posting[1], posting[0]))
+
+
+def test_impact_round_trip_and_prefix_reads():
+    random.seed(3)
+    doc_ids = sorted(random.sample(range(1, 2**31), 400))
+    postings = [(doc_id, random.choice([1, 1, 1, 2, 2, 3, 5, 200])) for doc_id in doc_ids]
+    # Postings of another term before this one, as in an index file
+    prefix = encode_postings([(1, 1), (2, 2)])
+    encoded = encode_impact_postings(postings)
+    f = io.BytesIO(prefix + encoded + b"trailing")
+
+    doc_id_array, tf_array = read_impact_postings(f, len(prefix), len(encoded))
+    assert list(zip(doc_id_array.tolist(), tf_array.tolist())) == impact_order(postings)
+
+    # Reading the top postings stops after the block that completes them
+    doc_id_array, tf_array = read_impact_postings(f, len(prefix), len(encoded), limit=3)
+    assert list(zip(doc_id_array.tolist(), tf_array.tolist())) == impact_order(postings)[:3]
+    assert f.tell() < len(prefix) + len(encoded)
+
+
+def test_prefix_read_stops_inside_a_large_tied_run():
+    postings = [(doc_id, 2) for doc_id in range(1, 10 * IMPACT_BLOCK_SIZE)] + [(10**6, 5)]
+    encoded = encode_impact_postings(postings)
+    f = io.BytesIO(encoded)
+
+    doc_id_array, tf_array = read_impact_postings(f, 0, len(encoded))
+    assert list(zip(doc_id_array.tolist(), tf_array.tolist())) == impact_order(postings)
+
+    # The tf 5 block and the first block of the tf 2 run
+    doc_id_array, tf_array = read_impact_postings(f, 0, len(encoded), limit=3)
+    assert list(zip(doc_id_array.tolist(), tf_array.tolist())) == impact_order(postings)[:3]
+    assert f.tell() < len(encoded) / 5
+
+
+def test_empty_impact_postings():
+    assert encode_impact_postings([]) == b""
+    doc_id_array, tf_array = read_impact_postings(io.BytesIO(b""), 0, 0, limit=5)
+    assert doc_id_array.size == 0 and tf_array.size == 0
+
+
+def test_impact_index_has_no_positions(tmp_path):
+    with pytest.raises(ValueError):
+        InvertedIndex(URLMapper(), index_dir=tmp_path, index_format="impact", positional=True)
+
+
+def test_impact_top_k_matches_full_ranking(tmp_path, make_corpus, build, make_query, words):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    binary_dir = build("binary", data_root, index_format="binary")
+    impact_dir = build("impact", data_root, index_format="impact")
+    url_mapping = search_index.load_url_mapping(binary_dir / "url_mapping.txt")
+    binary_lexicon = load_lexicon_into_memory(binary_dir / "lexicon.txt")
+    impact_lexicon = load_lexicon_into_memory(impact_dir / "lexicon.txt")
+    assert {term: info["df"] for term, info in impact_lexicon.items()} == \
+        {term: info["df"] for term, info in binary_lexicon.items()}
+
+    binary_query = make_query(binary_dir)
+    full = {word: binary_query.get_sorted_doc_ids_by_tf_idf(word, binary_lexicon, url_mapping) for word in words}
+    impact_query = make_query(impact_dir)
+    for word in words + ["missing"]:
+        expected = full.get(word, [])
+        for k in (1, 5, 1000):
+            assert impact_query.get_top_doc_ids_by_tf_idf(word, impact_lexicon, url_mapping, k) == \
+                (expected[:k], len(expected))
+        # The full list, in ranking order, is still available
+        if word in full:
+            assert impact_query.get_sorted_doc_ids_by_tf_idf(word, impact_lexicon, url_mapping) == expected
@@ -0,0 +1,92 @@
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import Document
+from postings import INDEX_FILES, load_index_manifest
+
+
+BOILERPLATE = "<nav><a>subscribe</a> <a>newsletter</a></nav>\n<footer><p>cookies privacy</p></footer>\n"
+
+
+def page_html(body: str, container: str = "div class='rich-text'") -> str:
+    tag = container.split()[0]
+    return (f"<html><head><title>Page title</title></head>\n<body>{BOILERPLATE}"
+            f"<{container}><p>{body}</p></{tag}>\n<aside><p>related stories</p></aside></body></html>")
+
+
+def make_document(parser="html.parser", **data):
+    return Document(url="https://www.aljazeera.com/news/1", image="", parser=parser, content_mode="main", **data)
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_main_content_is_article_body_and_headline(parser):
+    # The crawler's extracted article is used as it is
+    doc = make_document(parser, content=page_html("ignored"), article="gaza ceasefire talks", headline="Ceasefire")
+    assert (doc.parsed_text, doc.important_text, doc.title_text) == ("gaza ceasefire talks", "Ceasefire", "Ceasefire")
+    assert doc.content_source == "article"
+
+    # Without one, the article container of the page is found
+    doc = make_document(parser, content=page_html("gaza ceasefire talks"), headline="Ceasefire")
+    assert doc.parsed_text == "gaza ceasefire talks"
+    assert doc.content_source == "extracted" and not doc.main_content_missing
+    doc = make_document(parser, content=page_html("gaza ceasefire talks", "article"), headline="Ceasefire")
+    assert doc.parsed_text == "gaza ceasefire talks"
+
+    # A page without an article body falls back to its full text
+    doc = make_document(parser, content=f"<html><body>{BOILERPLATE}<p>gaza</p></body></html>", headline="Ceasefire")
+    page_doc = Document(url="https://www.aljazeera.com/news/1", image="", parser=parser,
+                        content=f"<html><body>{BOILERPLATE}<p>gaza</p></body></html>", headline="Ceasefire")
+    assert doc.main_content_missing
+    assert (doc.parsed_text, doc.important_text) == (page_doc.parsed_text, page_doc.important_text)
+
+
+def test_unknown_content_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Document(url="https://www.aljazeera.com/news/1", content="", image="", content_mode="article")
+
+
+@pytest.fixture
+def pages(tmp_path, words):
+    """A crawl whose pages share navigation and footers; every other page has an extracted article"""
+    domain = tmp_path / "pages" / "domain"
+    domain.mkdir(parents=True)
+    for i in range(20):
+        body = ' '.join(words[(i * 3 + j) % len(words)] for j in range(10 + i))
+        page = {
+            "url": f"https://www.aljazeera.com/news/{i}",
+            "headline": f"Headline {words[i % len(words)]}",
+            "article": body if i % 2 else None,
+            "content": page_html(body) if i % 4 else f"<html><body>{BOILERPLATE}<p>{body}</p></body></html>",
+        }
+        (domain / f"{i:03d}.json").write_text(json.dumps(page), encoding="utf-8")
+    return tmp_path / "pages"
+
+
+def read_postings(index_dir):
+    postings = {}
+    for line in (index_dir / INDEX_FILES["text"]).read_text(encoding="utf-8").splitlines():
+        token, entries = line.split(":", 1)
+        postings[token] = entries.count(",") + 1
+    return postings
+
+
+def test_main_content_build_drops_boilerplate_postings(pages, build, assert_same_index):
+    page_dir = build("page", pages)
+    main_dir = build("main", pages, content_mode="main")
+    assert load_index_manifest(main_dir)["content"] == "main"
+
+    page_postings = read_postings(page_dir)
+    main_postings = read_postings(main_dir)
+    assert page_postings["subscrib"] == 20 and page_postings["relat"] == 15
+    # Only the 5 pages without an article body anywhere still have their boilerplate indexed
+    assert main_postings["subscrib"] == 5 and "relat" not in main_postings
+    assert sum(main_postings.values()) < sum(page_postings.values())
+
+    parallel_dir = build("parallel", pages, content_mode="main", workers=2, shard_size=3)
+    assert_same_index(parallel_dir, main_dir)
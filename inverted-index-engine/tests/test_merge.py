@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import InvertedIndex, URLMapper, merge_partial_runs, merge_runs_into_index
+from index_the_index import load_lexicon_into_memory, write_lexicon_into_file
+from postings import INDEX_FILES, POSITIONS_FILE, decode_positions
+
+
+def write_run(path: Path, lines):
+    path.write_text(''.join(f"{line}\n" for line in lines), encoding="utf-8")
+    return path
+
+
+def test_merge_combines_and_sorts_postings(tmp_path):
+    runs = [
+        write_run(tmp_path / "run_0.txt", ["aid:30:1,10:2", "gaza:10:4"]),
+        write_run(tmp_path / "run_1.txt", ["gaza:5:1,10:1", "talk:7:3"]),
+        write_run(tmp_path / "run_2.txt", ["ceasefir:1:1", "gaza:2:2"]),
+    ]
+    output = tmp_path / "merged.txt"
+    
+    assert merge_partial_runs(runs, output) == 4
+    assert output.read_text(encoding="utf-8").splitlines() == [
+        "aid:10:2,30:1",
+        "ceasefir:1:1",
+        "gaza:2:2,5:1,10:5",
+        "talk:7:3",
+    ]
+
+
+def test_multi_pass_merge_matches_single_pass(tmp_path):
+    lines = [[f"term{t:02d}:{run * 100 + t}:{run + 1}" for t in range(run, 30, 3)] for run in range(12)]
+    
+    single_dir = tmp_path / "single"
+    multi_dir = tmp_path / "multi"
+    results = []
+    for index_dir, max_open_runs in ((single_dir, 256), (multi_dir, 3)):
+        index_dir.mkdir()
+        index = InvertedIndex(URLMapper(), index_dir=index_dir, max_open_runs=max_open_runs)
+        index.partial_index_files = [write_run(index_dir / f"partial_index_{i}.txt", run_lines)
+                                     for i, run_lines in enumerate(lines)]
+        index._merge_partial_indexes()
+        results.append((index_dir / "inverted_index.txt").read_text(encoding="utf-8"))
+        # Intermediate merge files are removed once used
+        assert not list(index_dir.glob("partial_merge_*"))
+    
+    assert results[0] == results[1]
+
+
+def test_merge_writes_the_lexicon_of_the_final_index(tmp_path):
+    runs = [
+        write_run(tmp_path / "run_0.txt", ["aid:30:1,10:2", "gaza:10:4"]),
+        write_run(tmp_path / "run_1.txt", ["gaza:5:1,10:1", "talk:7:3"]),
+    ]
+    assert merge_runs_into_index(runs, tmp_path / "index")["terms"] == 3
+    index_file = tmp_path / "index" / INDEX_FILES["text"]
+    lexicon = load_lexicon_into_memory(tmp_path / "index" / "lexicon.txt")
+    assert lexicon["gaza"] == {"offset": 14, "length": 14, "df": 2, "max_tf": 5, "total_tf": 6}
+    with open(index_file, "rb") as f:
+        f.seek(lexicon["gaza"]["offset"])
+        assert f.read(lexicon["gaza"]["length"]) == b"gaza:5:1,10:5\n"
+    
+    # The lexicon rebuilt from the index alone is the same file
+    write_lexicon_into_file(index_file, tmp_path / "repaired.txt")
+    assert (tmp_path / "repaired.txt").read_bytes() == (tmp_path / "index" / "lexicon.txt").read_bytes()
+
+
+def test_binary_lexicon_locates_positions_and_old_lexicons_still_load(tmp_path):
+    runs = [write_run(tmp_path / "run_0.txt", ["gaza:2:2:1;5,9:1:3", "talk:2:1:4"])]
+    merge_runs_into_index(runs, tmp_path / "index", index_format="binary", positional=True)
+    entry = load_lexicon_into_memory(tmp_path / "index" / "lexicon.txt")["gaza"]
+    assert (entry["df"], entry["max_tf"], entry["total_tf"]) == (2, 2, 3)
+    with open(tmp_path / "index" / POSITIONS_FILE, "rb") as f:
+        f.seek(entry["positions_offset"])
+        assert [p.tolist() for p in decode_positions(f.read(entry["positions_length"]))] == [[1, 5], [3]]
+    
+    # Lexicons of earlier builds have no header and no tf statistics
+    (tmp_path / "old_lexicon.txt").write_text("gaza 0 4 2 0 6\ntalk 4 2 1\n", encoding="utf-8")
+    lexicon = load_lexicon_into_memory(tmp_path / "old_lexicon.txt", "fields")
+    assert lexicon["gaza"] == {"offset": 0, "length": 4, "df": 2, "fields_offset": 0, "fields_length": 6}
+    assert lexicon["talk"] == {"offset": 4, "length": 2, "df": 1}
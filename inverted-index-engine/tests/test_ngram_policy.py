@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import Document, main
+from text_analysis import NgramPolicy, is_ngram
+
+
+HTML = "<html><body><p>The Bank of America reported profits</p></body></html>"
+
+
+def tokenize(policy=None):
+    return Document("https://example.com/a", HTML, image="").tokenize(ngram_policy=policy)
+
+
+def test_default_policy_indexes_bigrams_and_trigrams():
+    tokens = tokenize()
+    assert "bank_of_america" in tokens
+    assert "of_america_report" in tokens
+    assert not any(token.count("_") > 2 for token in tokens)
+
+
+def test_max_n_and_stopword_spanning():
+    assert not any(is_ngram(token) for token in tokenize(NgramPolicy(max_n=1)))
+    
+    tokens = tokenize(NgramPolicy(max_n=4, span_stopwords=False))
+    assert "america_report_profit" in tokens
+    assert "bank_of" not in tokens and "bank_of_america" not in tokens
+    assert "the_bank" not in tokens
+    # Unigram stopwords are still indexed
+    assert "the" in tokens
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        NgramPolicy(max_n=0)
+    with pytest.raises(ValueError):
+        NgramPolicy(min_df=0)
+
+
+def test_min_df_prunes_rare_ngrams_at_merge(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    full_dir = tmp_path / "full"
+    pruned_dir = tmp_path / "pruned"
+    full_dir.mkdir()
+    pruned_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=full_dir)
+    main(data_root=data_root, index_dir=pruned_dir, ngram_policy=NgramPolicy(min_df=3))
+    
+    def read(index_dir):
+        lines = (index_dir / "inverted_index.txt").read_text(encoding="utf-8").splitlines()
+        return dict(line.split(":", 1) for line in lines)
+    
+    full = read(full_dir)
+    pruned = read(pruned_dir)
+    expected = {token: postings for token, postings in full.items()
+                if not is_ngram(token) or len(postings.split(",")) >= 3}
+    assert pruned == expected
+    assert len(pruned) < len(full)
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import Document, parse_html_content
+
+
+# Pages covering the cases the two backends have to agree on
+HTML_SAMPLES = {
+    "simple_page": """
+    <html>
+        <head><title>AI Club at UCI Test Page</title></head>
+        <body>
+            <h1>Artificial Intelligence Club</h1>
+            <p>We are the <strong>AI Club</strong> at UCI. We focus on machine learning and AI research.</p>
+            <h2>Our Activities</h2>
+            <p>Machine learning workshops, AI seminars, and coding sessions.</p>
+        </body>
+    </html>
+    """,
+    "nested_important_tags": """
+    <html><head><title>Gaza ceasefire</title></head>
+    <body><h1>Talks <b>resume</b> in Cairo</h1><h3>Update</h3><p>Envoys <b>met</b> on <strong>Monday</strong>.</p></body></html>
+    """,
+    "scripts_styles_comments": """
+    <html><head><style>p { color: red; }</style><script>var x = "hidden";</script></head>
+    <body><p>visible<script>document.write("no")</script> text</p><!-- a comment --><p>after comment</p></body></html>
+    """,
+    "broken_html": "<p>broken <b>unclosed <i>italic</p> trailing text <h2>heading",
+    "entities": "<html><body><p>Fish &amp; chips &lt;3 &quot;quoted&quot;</p></body></html>",
+    "xml_declaration": "<?xml version='1.0' encoding='utf-8'?><html><body><h1>Declared</h1><p>body</p></body></html>",
+    "arabic_text": "<html><head><title>الجزيرة</title></head><body><p>غزة اليوم</p></body></html>",
+    "plain_text": "no markup at all",
+}
+
+
+@pytest.mark.parametrize("name", sorted(HTML_SAMPLES))
+def test_lxml_backend_matches_html_parser(name):
+    """The lxml backend must produce the same normal and important text as html.parser"""
+    html_content = HTML_SAMPLES[name]
+    reference = Document("http://test.example.com", html_content, "", parser="html.parser")
+    candidate = Document("http://test.example.com", html_content, "", parser="lxml")
+    
+    assert candidate.parsed_text == reference.parsed_text
+    assert candidate.important_text == reference.important_text
+    assert candidate.title_text == reference.title_text
+
+
+@pytest.mark.parametrize("name", sorted(HTML_SAMPLES))
+def test_parse_html_content_backends_match(name):
+    html_content = HTML_SAMPLES[name]
+    assert parse_html_content(html_content, parser="lxml") == parse_html_content(html_content)
+
+
+def test_important_text_order():
+    """Title first, then headings, then bold text, in document order"""
+    doc = Document("http://test.example.com", HTML_SAMPLES["nested_important_tags"], "", parser="lxml")
+    assert doc.important_text == "Gaza ceasefire Talks resume in Cairo Update resume met Monday"
+
+
+def test_empty_content():
+    doc = Document("http://test.example.com", "   ", "", parser="lxml")
+    assert doc.parsed_text == ""
+    assert doc.important_text == ""
+
+
+def test_unknown_parser_rejected():
+    with pytest.raises(ValueError):
+        Document("http://test.example.com", "<p>x</p>", "", parser="html5lib")
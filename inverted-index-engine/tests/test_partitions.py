@@ -0,0 +1,147 @@
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import search_index
+from build_index import InvertedIndex, URLMapper, iter_partial_index, main
+from index_the_index import load_champion_lexicon, load_lexicon_into_memory
+from partitions import PARTITIONS_DIR, PartitionedLexicon, partition_dir, term_partition
+from postings import CHAMPIONS_FILE, CHAMPIONS_LEXICON_FILE, INDEX_FILES, POSITIONS_FILE, load_index_manifest
+
+
+# A small memory budget makes several partial files for each partition
+BUILD_OPTIONS = {"memory_budget_mb": 0.005, "champions": 3}
+
+
+@pytest.fixture
+def pages(tmp_path, make_skewed_corpus):
+    data_root = tmp_path / "pages"
+    make_skewed_corpus(data_root)
+    return data_root
+
+
+def partitioned_lexicons(index_dir):
+    manifest = load_index_manifest(index_dir)
+    lexicon = PartitionedLexicon(index_dir, manifest["partitions"], "lexicon.txt", load_lexicon_into_memory,
+                                 {"index_file": manifest["index_file"], "positions_file": POSITIONS_FILE},
+                                 manifest["partition_terms"])
+    champion_lexicon = PartitionedLexicon(index_dir, manifest["partitions"], CHAMPIONS_LEXICON_FILE,
+                                          load_champion_lexicon, {"postings_file": CHAMPIONS_FILE})
+    return lexicon, champion_lexicon
+
+
+def test_partitions_split_the_terms_of_the_full_index(pages, build):
+    reference_dir = build("reference", pages, **BUILD_OPTIONS)
+    index_dir = build("partitioned", pages, partitions=3, merge_workers=2, **BUILD_OPTIONS)
+    assert not (index_dir / INDEX_FILES["text"]).exists()
+
+    manifest = load_index_manifest(index_dir)
+    assert manifest["partitions"] == 3
+    lines = {}
+    for partition in range(3):
+        partition_lines = dict(iter_partial_index(partition_dir(index_dir, partition) / INDEX_FILES["text"]))
+        assert len(partition_lines) == manifest["partition_terms"][partition]
+        assert all(term_partition(term, 3) == partition for term in partition_lines)
+        lines.update(partition_lines)
+    assert lines == dict(iter_partial_index(reference_dir / INDEX_FILES["text"]))
+
+    # Rebuilding unpartitioned into the same directory removes the partitions
+    main(data_root=pages, index_dir=index_dir)
+    assert not (index_dir / PARTITIONS_DIR).exists()
+    assert (index_dir / INDEX_FILES["text"]).read_bytes() == (reference_dir / INDEX_FILES["text"]).read_bytes()
+
+
+@pytest.mark.parametrize("index_format", ["text", "binary"])
+def test_partitioned_search_matches_unpartitioned(monkeypatch, index_format, pages, build, make_query, words):
+    reference_dir = build("reference", pages, index_format=index_format, **BUILD_OPTIONS)
+    index_dir = build("partitioned", pages, index_format=index_format, partitions=4, **BUILD_OPTIONS)
+    url_mapping = search_index.load_url_mapping(reference_dir / "url_mapping.txt")
+
+    reference_lexicon = load_lexicon_into_memory(reference_dir / "lexicon.txt")
+    reference = make_query(reference_dir)
+    expected = {word: reference.get_sorted_doc_ids_by_tf_idf(word, reference_lexicon, url_mapping)
+                for word in words + ["missing"]}
+
+    lexicon, champion_lexicon = partitioned_lexicons(index_dir)
+    assert len(lexicon) == len(reference_lexicon)
+    monkeypatch.setattr(search_index, "champion_lexicon", champion_lexicon)
+    query = make_query(index_dir)
+    # Every file is found through the lexicon entries, never at the top of the index directory
+    query.index_file_path = query.champions_file_path = index_dir / "missing.bin"
+    for word, doc_ids in expected.items():
+        assert query.get_sorted_doc_ids_by_tf_idf(word, lexicon, url_mapping) == doc_ids
+        assert query.get_top_doc_ids_by_tf_idf(word, lexicon, url_mapping, 3) == (doc_ids[:3], len(doc_ids))
+
+
+def test_positional_partitions_answer_phrases(pages, build, make_query):
+    reference_dir = build("reference", pages, index_format="binary", positional=True, **BUILD_OPTIONS)
+    index_dir = build("partitioned", pages, index_format="binary", positional=True, partitions=2, **BUILD_OPTIONS)
+    url_mapping = search_index.load_url_mapping(reference_dir / "url_mapping.txt")
+    reference_lexicon = load_lexicon_into_memory(reference_dir / "lexicon.txt")
+    lexicon, _ = partitioned_lexicons(index_dir)
+
+    reference = make_query(reference_dir)
+    reference.positions_file_path = reference_dir / POSITIONS_FILE
+    expected = reference.get_sorted_doc_ids_by_phrase("gaza ceasefire", reference_lexicon, url_mapping, window=5)
+    query = make_query(index_dir)
+    query.positions_file_path = index_dir / "missing.bin"
+    assert expected
+    assert query.get_sorted_doc_ids_by_phrase("gaza ceasefire", lexicon, url_mapping, window=5) == expected
+
+
+def test_partition_lexicons_load_on_first_use(pages, build):
+    index_dir = build("partitioned", pages, partitions=8, **BUILD_OPTIONS)
+    lexicon, _ = partitioned_lexicons(index_dir)
+    assert lexicon.loaded_partitions == 0
+    assert "gaza" in lexicon and "missing" not in lexicon
+    assert lexicon.loaded_partitions == len({term_partition("gaza", 8), term_partition("missing", 8)})
+    entry = lexicon["gaza"]
+    assert entry["index_file"] == partition_dir(index_dir, term_partition("gaza", 8)) / INDEX_FILES["text"]
+    assert lexicon.get("missing") is None
+
+
+def partition_files(index_dir, partitions):
+    """(inode, mtime) of each partition's postings, lexicon and champion files"""
+    return [{path.name: (path.stat().st_ino, path.stat().st_mtime_ns)
+             for path in partition_dir(index_dir, partition).iterdir() if path.suffix != ".json"}
+            for partition in range(partitions)]
+
+
+def test_rebuild_touches_only_the_changed_partitions(pages, build):
+    # Without a memory budget each partition has a single run, unchanged unless its terms are
+    index_dir = build("partitioned", pages, partitions=8, champions=3)
+    before = partition_files(index_dir, 8)
+
+    # The same crawl merges nothing again
+    main(data_root=pages, index_dir=index_dir, partitions=8, champions=3)
+    assert partition_files(index_dir, 8) == before
+
+    # A new word on a page no other page copies changes only the partitions of the new terms
+    page_file = pages / "domain" / "010.json"
+    page = json.loads(page_file.read_text(encoding="utf-8"))
+    page["content"] = page["content"].replace("</p>", " hebron</p>")
+    page_file.write_text(json.dumps(page), encoding="utf-8")
+    main(data_root=pages, index_dir=index_dir, partitions=8, champions=3)
+    after = partition_files(index_dir, 8)
+    changed = {partition for partition in range(8) if after[partition] != before[partition]}
+    assert changed == {term_partition("hebron", 8)}
+
+    reference_dir = build("reference", pages, partitions=8, champions=3)
+    for partition in range(8):
+        for name in after[partition]:
+            assert (partition_dir(index_dir, partition) / name).read_bytes() == \
+                (partition_dir(reference_dir, partition) / name).read_bytes()
+
+    # Other runs that merge into the same files leave the partitions in place
+    main(data_root=pages, index_dir=index_dir, partitions=8, champions=3, memory_budget_mb=0.005)
+    assert partition_files(index_dir, 8) == after
+
+
+def test_partitions_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        InvertedIndex(URLMapper(), index_dir=tmp_path, partitions=0)
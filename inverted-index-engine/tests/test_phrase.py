@@ -0,0 +1,72 @@
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import main
+from postings import parse_text_postings
+from search_index import load_url_mapping, phrase_frequency, proximity_frequency
+
+
+def test_phrase_frequency():
+    gaza = np.array([1, 10, 20])
+    ceasefire = np.array([2, 11, 30])
+    talks = np.array([3, 40])
+    
+    assert phrase_frequency([gaza, ceasefire]) == 2
+    assert phrase_frequency([gaza, ceasefire, talks]) == 1
+    assert phrase_frequency([ceasefire, gaza]) == 0
+
+
+def test_proximity_frequency():
+    gaza = np.array([1, 10, 20])
+    talks = np.array([3, 40])
+    
+    assert proximity_frequency([gaza, talks], window=2) == 1
+    assert proximity_frequency([gaza, talks], window=20) == 3
+    assert proximity_frequency([gaza, np.array([], dtype=np.int64)], window=20) == 0
+
+
+def read_index(index_file, with_positions=False):
+    index = {}
+    with open(index_file, encoding="utf-8") as f:
+        for line in f:
+            token, postings_str = line.rstrip("\n").split(":", 1)
+            index[token] = parse_text_postings(postings_str, with_positions)
+    return index
+
+
+def test_phrases_from_positions_match_indexed_ngrams(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    ngram_dir = tmp_path / "ngrams"
+    positional_dir = tmp_path / "positional"
+    ngram_dir.mkdir()
+    positional_dir.mkdir()
+    
+    main(data_root=data_root, index_dir=ngram_dir)
+    main(data_root=data_root, index_dir=positional_dir, positional=True)
+    
+    ngrams = read_index(ngram_dir / "inverted_index.txt")
+    positional = read_index(positional_dir / "inverted_index.txt", with_positions=True)
+    assert not any("_" in token for token in positional)
+    assert len(positional) < len(ngrams)
+    
+    # Pages sharing a URL share a doc_id, so their positions are interleaved; leave them out
+    url_counts = Counter(f"https://www.aljazeera.com/news/{i % 35}" for i in range(40))
+    url_mapping = load_url_mapping(ngram_dir / "url_mapping.txt")
+    single = {int(doc_id) for doc_id, url in url_mapping.items() if url_counts[url] == 1}
+    
+    for ngram, postings in ngrams.items():
+        if "_" not in ngram:
+            continue
+        term_postings = [{doc_id: np.array(positions) for doc_id, _, positions in positional[term]}
+                         for term in ngram.split("_")]
+        matches = {doc_id for doc_id in single
+                   if all(doc_id in p for p in term_postings)
+                   and phrase_frequency([p[doc_id] for p in term_postings])}
+        assert matches == {doc_id for doc_id, _ in postings if doc_id in single}, ngram
@@ -0,0 +1,56 @@
+import sys
+import random
+from pathlib import Path
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from postings import (decode_positions, decode_postings, decode_postings_numpy, encode_positions, encode_postings,
+                      format_text_postings, parse_text_postings)
+
+
+def test_varint_round_trip():
+    random.seed(7)
+    doc_ids = sorted(random.sample(range(1, 2**31), 500))
+    postings = [(doc_id, random.choice([1, 2, 3, 127, 128, 300, 70000])) for doc_id in doc_ids]
+    
+    encoded = encode_postings(postings)
+    
+    assert decode_postings(encoded) == postings
+    doc_id_array, tf_array = decode_postings_numpy(encoded)
+    assert list(zip(doc_id_array.tolist(), tf_array.tolist())) == postings
+
+
+def test_gaps_keep_encoding_small():
+    postings = [(1_000_000 + i, 1) for i in range(100)]
+    # First doc_id takes 3 bytes, every later gap of 1 and every tf take 1 byte
+    assert len(encode_postings(postings)) == 3 + 1 + 99 * 2
+
+
+def test_empty_postings():
+    assert encode_postings([]) == b""
+    assert decode_postings(b"") == []
+    doc_id_array, tf_array = decode_postings_numpy(b"")
+    assert doc_id_array.size == 0 and tf_array.size == 0
+
+
+def test_positions_round_trip():
+    postings = [(3, 2, [0, 17]), (9, 1, []), (12, 4, [5, 6, 7, 300])]
+    
+    positions = decode_positions(encode_positions(postings))
+    
+    assert [p.tolist() for p in positions] == [[0, 17], [], [5, 6, 7, 300]]
+    doc_id_array, tf_array = decode_postings_numpy(encode_postings(postings))
+    assert doc_id_array.tolist() == [3, 9, 12] and tf_array.tolist() == [2, 1, 4]
+
+
+def test_text_postings_round_trip():
+    positional = [(3, 2, [0, 17]), (9, 1, []), (12, 4, [5, 6, 7, 300])]
+    
+    text = format_text_postings(positional)
+    
+    assert text == "3:2:0;17,9:1:,12:4:5;6;7;300"
+    assert parse_text_postings(text, with_positions=True) == positional
+    # Readers that only want tfs skip the positions
+    assert parse_text_postings(text) == [(3, 2), (9, 1), (12, 4)]
+    assert format_text_postings([(3, 2), (9, 1)]) == "3:2,9:1"
@@ -0,0 +1,158 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import compact_segments, main, update_segments
+from text_analysis import NgramPolicy
+from postings import load_index_manifest
+from search_index import load_url_mapping
+from segments import SegmentedIndex, load_segment_catalog
+
+
+def live_postings_by_url(index, url_mapping, terms):
+    """term -> {url: tf} over the live documents of a segmented index"""
+    result = {}
+    for term in terms:
+        doc_ids, tfs = index.get_postings(term)
+        if len(doc_ids):
+            result[term] = {url_mapping[str(doc_id)]: tf for doc_id, tf in zip(doc_ids.tolist(), tfs.tolist())}
+    return result
+
+
+def full_postings_by_url(index_dir):
+    """term -> {url: tf} of a full build"""
+    url_mapping = load_url_mapping(index_dir / "url_mapping.txt")
+    result = {}
+    with open(index_dir / "inverted_index.txt", encoding="utf-8") as f:
+        for line in f:
+            token, postings_str = line.rstrip("\n").split(":", 1)
+            result[token] = {}
+            for entry in postings_str.split(","):
+                doc_id, tf = entry.split(":")
+                result[token][url_mapping[doc_id]] = int(tf)
+    return result
+
+
+def test_first_segment_matches_full_dense_build(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    main(data_root=data_root, index_dir=full_dir, doc_ids="dense")
+    
+    segmented_dir = tmp_path / "segmented"
+    segment = update_segments(data_root, segmented_dir)
+    
+    assert (segmented_dir / "segments" / segment / "inverted_index.txt").read_bytes() == \
+        (full_dir / "inverted_index.txt").read_bytes()
+    assert (segmented_dir / "url_mapping.txt").read_bytes() == (full_dir / "url_mapping.txt").read_bytes()
+    assert load_index_manifest(segmented_dir)["format"] == "segmented"
+    assert update_segments(data_root, segmented_dir) is None
+
+
+def test_updates_and_compaction_match_a_rebuild(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=30)
+    segmented_dir = tmp_path / "segmented"
+    update_segments(data_root, segmented_dir, index_format="binary")
+    
+    # Re-crawl one page, delete another, crawl a new one
+    make_corpus(data_root, num_pages=31)
+    changed = data_root / "domain_1" / "010.json"
+    changed.write_text(changed.read_text(encoding="utf-8").replace("Headline 10", "Headline 10 updated"), encoding="utf-8")
+    (data_root / "domain_2" / "020.json").unlink()
+    update_segments(data_root, segmented_dir, index_format="binary")
+    
+    catalog = load_segment_catalog(segmented_dir)
+    assert len(catalog["segments"]) == 2
+    assert catalog["segments"][1]["docs"] == 2
+    assert catalog["segments"][1]["tombstones"] == 2
+    
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    main(data_root=data_root, index_dir=full_dir)
+    expected = full_postings_by_url(full_dir)
+    
+    url_mapping = load_url_mapping(segmented_dir / "url_mapping.txt")
+    assert sorted(url_mapping.values()) == sorted(load_url_mapping(full_dir / "url_mapping.txt").values())
+    index = SegmentedIndex(segmented_dir)
+    assert live_postings_by_url(index, url_mapping, expected) == expected
+    metadata = index.load_metadata()
+    assert {entry["url"] for entry in metadata.values()} == set(url_mapping.values())
+    headlines = {entry["url"]: entry["headline"] for entry in metadata.values()}
+    assert headlines["https://www.aljazeera.com/news/10"] == "Headline 10 updated"
+    
+    compact_segments(segmented_dir)
+    catalog = load_segment_catalog(segmented_dir)
+    assert len(catalog["segments"]) == 1
+    assert len(catalog["retired"]) == 2
+    # The view opened before the compaction still reads the retired segments, until it refreshes
+    assert live_postings_by_url(index, url_mapping, expected) == expected
+    assert index.refresh() and not index.refresh()
+    assert [segment.segment_dir.name for segment in index.segments] == [segment["name"] for segment in catalog["segments"]]
+    assert live_postings_by_url(index, url_mapping, expected) == expected
+    compacted = SegmentedIndex(segmented_dir)
+    assert len(compacted.tombstones) == 0
+    assert live_postings_by_url(compacted, url_mapping, expected) == expected
+    assert len(compacted) == len(expected)
+
+
+def test_serving_view_refreshes_across_updates_and_compactions(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=10)
+    segmented_dir = tmp_path / "segmented"
+    update_segments(data_root, segmented_dir)
+    index = SegmentedIndex(segmented_dir)
+    assert not index.refresh()
+    
+    # A new segment becomes visible on refresh
+    make_corpus(data_root, num_pages=12)
+    update_segments(data_root, segmented_dir)
+    assert index.refresh()
+    assert len(index.segments) == 2
+    url_mapping = load_url_mapping(segmented_dir / "url_mapping.txt")
+    assert len(index.load_metadata()) == len(url_mapping) == 12
+    
+    # An update that finds nothing new keeps the same segments
+    assert update_segments(data_root, segmented_dir) is None
+    assert not index.refresh()
+    
+    first = compact_segments(segmented_dir)
+    assert index.refresh()
+    make_corpus(data_root, num_pages=13)
+    latest = update_segments(data_root, segmented_dir)
+    # The next compaction deletes the segments the previous one retired
+    compact_segments(segmented_dir)
+    catalog = load_segment_catalog(segmented_dir)
+    assert catalog["retired"] == [first, latest]
+    assert sorted(path.name for path in (segmented_dir / "segments").iterdir()) == \
+        sorted(catalog["retired"] + [segment["name"] for segment in catalog["segments"]])
+    # Not yet refreshed: still reads the retired segments
+    assert len(index.load_metadata()) == 12
+    assert index.refresh()
+    assert len(index.load_metadata()) == 13
+
+
+def test_first_segment_fixes_the_analysis_settings(tmp_path, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root, num_pages=10)
+    segmented_dir = tmp_path / "segmented"
+    update_segments(data_root, segmented_dir, ngram_policy=NgramPolicy(max_n=1), content_mode="main")
+    catalog = load_segment_catalog(segmented_dir)
+    assert catalog["ngram_policy"] == NgramPolicy(max_n=1).to_dict() and catalog["content"] == "main"
+    assert load_index_manifest(segmented_dir)["content"] == "main"
+    index = SegmentedIndex(segmented_dir)
+    assert not any("_" in term for segment in index.segments for term in segment.lexicon)
+    
+    make_corpus(data_root, num_pages=12)
+    with pytest.raises(ValueError):
+        update_segments(data_root, segmented_dir, content_mode="main")
+    with pytest.raises(ValueError):
+        update_segments(data_root, segmented_dir, ngram_policy=NgramPolicy(max_n=1))
+    with pytest.raises(ValueError):
+        update_segments(data_root, segmented_dir, ngram_policy=NgramPolicy(max_n=1, min_df=2), content_mode="main")
+    assert update_segments(data_root, segmented_dir, ngram_policy=NgramPolicy(max_n=1), content_mode="main")
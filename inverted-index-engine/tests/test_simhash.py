@@ -0,0 +1,79 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from build_index import Document, NearDuplicateDetector
+
+
+HTML = ("<html><head><title>Campus news</title></head><body>"
+        "<p>The library opens late on Fridays and the library cafe stays open too</p>"
+        "</body></html>")
+
+
+def reference_simhash(tokens, token_hash, hash_bits=64):
+    """Bit-by-bit SimHash loop the vectorized version must agree with"""
+    feature_vector = [0] * hash_bits
+    for token, (normal_count, important_count) in tokens.items():
+        weight = normal_count + important_count
+        if token_hash == "md5":
+            value = int(hashlib.md5(token.encode('utf-8')).hexdigest(), 16)
+        else:
+            value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        for i in range(hash_bits):
+            feature_vector[i] += weight if value & (1 << i) else -weight
+    return sum(1 << i for i in range(hash_bits) if feature_vector[i] > 0)
+
+
+@pytest.mark.parametrize("token_hash", ["md5", "blake2b"])
+@pytest.mark.parametrize("hash_bits", [64, 32])
+def test_vectorized_simhash_matches_loop(token_hash, hash_bits):
+    doc = Document("https://example.com/a", HTML, image="")
+    doc.tokenize()
+    assert doc.compute_simhash(hash_bits, token_hash) == reference_simhash(doc.tokens, token_hash, hash_bits)
+
+
+def test_unknown_token_hash():
+    doc = Document("https://example.com/a", HTML, image="")
+    with pytest.raises(ValueError):
+        doc.compute_simhash(token_hash="sha1")
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(token_hash="sha1")
+
+
+def test_banded_lookup_matches_linear_scan(tmp_path):
+    rng = np.random.default_rng(7)
+    base = rng.integers(0, 2**63, size=50, dtype=np.uint64).tolist()
+    detector = NearDuplicateDetector(similarity_threshold=3)
+    fingerprints = {}
+    for doc_id in range(400):
+        fingerprint = base[doc_id % len(base)]
+        # Flip up to 5 random bits so some copies fall inside the threshold and some outside
+        for bit in rng.choice(64, size=rng.integers(0, 6), replace=False):
+            fingerprint ^= 1 << int(bit)
+        fingerprints[doc_id] = fingerprint
+        detector.add_document(doc_id, fingerprint)
+    
+    for query in base:
+        expected = sorted(doc_id for doc_id, fp in fingerprints.items() if bin(fp ^ query).count('1') <= 3)
+        assert sorted(detector.find_near_duplicates(query)) == expected
+    
+    fingerprint_file = tmp_path / "fingerprints.bin"
+    detector.save_fingerprints(fingerprint_file)
+    loaded = NearDuplicateDetector(similarity_threshold=3)
+    loaded.load_fingerprints(fingerprint_file)
+    assert loaded.doc_to_fingerprint == detector.doc_to_fingerprint
+    assert sorted(loaded.find_near_duplicates(base[0])) == sorted(detector.find_near_duplicates(base[0]))
+
+
+def test_load_legacy_text_fingerprints(tmp_path):
+    fingerprint_file = tmp_path / "fingerprints.txt"
+    fingerprint_file.write_text(f"1:{2**64 - 1}\n2:{2**64 - 2}\n3:0\n", encoding='utf-8')
+    detector = NearDuplicateDetector(similarity_threshold=1)
+    detector.load_fingerprints(fingerprint_file)
+    assert sorted(detector.find_near_duplicates(2**64 - 1)) == [1, 2]
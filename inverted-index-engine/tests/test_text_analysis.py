@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import search_index
+from build_index import Document, main
+from postings import load_index_manifest
+from search_index import Query
+from text_analysis import Analyzer, get_analyzer, regex_tokenize
+
+
+def test_analyze_stems_and_preserves_acronyms():
+    analyzer = Analyzer()
+    assert analyzer.analyze("NASA is running the US tests, again!") == ["nasa", "is", "run", "the", "us", "test", "again"]
+    # "US" keeps its acronym form; lowercase "us" is just short
+    assert analyzer.stem("us", "US") == "us"
+
+
+def test_stem_cache_counts_hits():
+    analyzer = Analyzer(cache_size=2)
+    for token in ["running", "running", "jumps", "running"]:
+        analyzer.stem(token)
+    stats = analyzer.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_documents_and_queries_share_one_analyzer():
+    doc = Document("https://example.com/a", "<p>Running tests</p>", image="")
+    assert doc.analyzer is get_analyzer()
+    assert Query().analyzer is get_analyzer()
+    doc.tokenize()
+    assert set(Query().stem_all_query_terms("Running tests")) <= set(doc.tokens)
+
+
+def test_regex_tokenizer_matches_nltk_alphanumeric_tokens():
+    text = ("Don't stop: it's a well-known U.S. policy, costing $1,000.50 and/or 3.5% more. "
+            "I'm sure O'Neil can't (and won't) go to AT&T's \"office\" -- e.g. today.")
+    nltk_tokens = [t for t in Analyzer(tokenizer="nltk").tokenize(text) if t.isalnum()]
+    regex_tokens = [t for t in regex_tokenize(text) if t.isalnum()]
+    assert regex_tokens == nltk_tokens
+
+
+def test_regex_tokenizer_keeps_arabic_words_and_acronyms():
+    analyzer = Analyzer(tokenizer="regex")
+    # Vowel marks and the attached Arabic comma do not break words apart
+    assert analyzer.analyze("يزور القاهرة، وقال «مرحباً»") == ["يزور", "القاهرة", "وقال", "مرحبا"]
+    assert analyzer.analyze("NASA and the US") == Analyzer().analyze("NASA and the US")
+
+
+def test_queries_use_the_tokenizer_the_index_was_built_with(tmp_path, monkeypatch, make_corpus):
+    data_root = tmp_path / "pages"
+    make_corpus(data_root)
+    main(data_root=data_root, index_dir=tmp_path / "index", tokenizer="regex")
+    manifest = load_index_manifest(tmp_path / "index")
+    assert manifest["tokenizer"] == "regex"
+    monkeypatch.setattr(search_index, "index_manifest", manifest)
+    assert Query().analyzer is get_analyzer("regex")